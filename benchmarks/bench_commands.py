@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+    saractl - S.A.R.A.'s userspace utilities.
+    Copyright (C) 2017  Salvatore Mesoraca <s.mesoraca16@gmail.com>
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+# Wall-clock time of whole saractl commands against an emulated
+# securityfs ("-S emu:DIR"), for policies of a few sizes. Rule paths
+# don't exist, so no time is spent checking binaries.
+# Usage: bench_commands.py [RUNS [RULES...]]
+
+import sys
+from os.path import join
+from statistics import median
+from subprocess import DEVNULL, run
+from tempfile import TemporaryDirectory
+from time import perf_counter
+
+from bench_startup import MAIN, environment
+
+COMMANDS = (['load', '--force'],
+            ['load'],
+            ['status'],
+            ['test'])
+
+
+def setup(tmp, rules):
+    with open(join(tmp, 'wxprot.conf'), 'w') as fd:
+        for i in range(rules):
+            if i % 4:
+                fd.write('/nonexistent/{}/bin/prog{} MPROTECT\n'.format(i % 97, i))
+            else:
+                fd.write('/nonexistent/{}/lib{}/* NONE\n'.format(i % 97, i))
+
+
+def wallclock(argv, env, runs):
+    times = []
+    for _ in range(runs):
+        start = perf_counter()
+        run([sys.executable] + argv, env=env, stdout=DEVNULL, stderr=DEVNULL, check=True)
+        times.append(perf_counter() - start)
+    return median(times)
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    sizes = [int(n) for n in sys.argv[2:]] or [10, 100, 1000]
+    for rules in sizes:
+        with TemporaryDirectory() as tmp:
+            setup(tmp, rules)
+            env = environment(tmp)
+            base = ['-c', MAIN, 'saractl', '-c', tmp, '-S', 'emu:' + tmp,
+                    '--cache-dir', join(tmp, 'cache')]
+            print('{} rules'.format(rules))
+            for argv in COMMANDS:
+                print('{:>24}: {:.1f}ms'.format(' '.join(argv),
+                                                wallclock(base + argv, env, runs) * 1000))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+    saractl - S.A.R.A.'s userspace utilities.
+    Copyright (C) 2017  Salvatore Mesoraca <s.mesoraca16@gmail.com>
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+# Tokenizes a synthetic wxprot config with shlex.split and with
+# sara.lexer.split_line and compares the results and the timings.
+# Usage: bench_lexer.py [LINES]
+
+import sys
+from os.path import abspath, dirname
+from shlex import split
+from time import perf_counter
+
+sys.path.insert(0, dirname(dirname(abspath(__file__))))
+from sara.lexer import split_line
+
+
+FLAGS = ('FULL', 'MPROTECT', 'NONE', 'MPROTECT, EMUTRAMP', 'FULL, VERBOSE, COMPLAIN')
+
+
+def make_lines(n):
+    lines = []
+    for i in range(n):
+        if i % 50 == 0:
+            lines.append('# section {}\n'.format(i // 50))
+        elif i % 97 == 0:
+            lines.append("'/opt/app {}/bin/run' {}\n".format(i, FLAGS[i % len(FLAGS)]))
+        else:
+            lines.append('/usr/lib/pkg{}/bin/tool{}{} {}\n'.format(i % 1000, i, '*' if i % 7 == 0 else '',
+                                                                FLAGS[i % len(FLAGS)]))
+    return lines
+
+
+def bench(name, fn, lines):
+    start = perf_counter()
+    tokens = [fn(line) for line in lines]
+    elapsed = perf_counter() - start
+    print('{:>12}: {:.2f}s ({:.0f} lines/s)'.format(name, elapsed, len(lines) / elapsed))
+    return tokens
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    lines = make_lines(n)
+    a = bench('shlex', lambda line: split(line, comments=True), lines)
+    b = bench('split_line', split_line, lines)
+    if a != b:
+        print('MISMATCH')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+    saractl - S.A.R.A.'s userspace utilities.
+    Copyright (C) 2017  Salvatore Mesoraca <s.mesoraca16@gmail.com>
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+# Measures the cold start of saractl: what "import sara.CLI" costs
+# according to -X importtime, and the wall-clock time of a few commands
+# run against a fake securityfs. Bytecode is cached in a temporary
+# directory, as it would be for an installed package.
+# Usage: bench_startup.py [RUNS]
+
+import os
+import sys
+from os.path import abspath, dirname, join
+from statistics import median
+from subprocess import DEVNULL, PIPE, run
+from tempfile import TemporaryDirectory
+from time import perf_counter
+
+ROOT = dirname(dirname(abspath(__file__)))
+
+FILES = {'main/enabled': '1\n',
+         'main/locked': '0\n',
+         'wxprot/enabled': '1\n',
+         'wxprot/hash': '0' * 40 + '\n',
+         'wxprot/version': '1\n',
+         'wxprot/default_flags': '79\n',
+         'wxprot/emutramp_available': '1\n',
+         'wxprot/xattr_enabled': '0\n',
+         'wxprot/xattr_user_allowed': '0\n',
+         'wxprot/.load': '',
+         'wxprot/.dump': ''}
+
+COMMANDS = (['--help'],
+            ['status'],
+            ['-v', 'status'],
+            ['load'],
+            ['generate', '{tmp}/empty'])
+
+MAIN = 'import sys; from sara.main import _main; sys.exit(_main(sys.argv[1:]))'
+
+
+def environment(tmp):
+    env = dict(os.environ)
+    env.pop('PYTHONDONTWRITEBYTECODE', None)
+    env['PYTHONPYCACHEPREFIX'] = join(tmp, 'pycache')
+    env['PYTHONPATH'] = ROOT
+    return env
+
+
+def setup(tmp):
+    for name, value in FILES.items():
+        os.makedirs(join(tmp, 'sara', dirname(name)), exist_ok=True)
+        with open(join(tmp, 'sara', name), 'w') as fd:
+            fd.write(value)
+    os.makedirs(join(tmp, 'empty'))
+    with open(join(tmp, 'wxprot.conf'), 'w') as fd:
+        fd.write('/usr/bin/* MPROTECT\n/opt/app FULL\n')
+
+
+def importtime(env):
+    p = run([sys.executable, '-X', 'importtime', '-c', 'import sara.CLI'],
+            env=env, stdout=DEVNULL, stderr=PIPE, universal_newlines=True, check=True)
+    modules = []
+    for line in p.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        modules.append((int(cumulative), name.strip()))
+    return modules
+
+
+def wallclock(argv, env, runs):
+    times = []
+    for _ in range(runs):
+        start = perf_counter()
+        run([sys.executable] + argv, env=env, stdout=DEVNULL, stderr=DEVNULL, check=True)
+        times.append(perf_counter() - start)
+    return median(times)
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    with TemporaryDirectory() as tmp:
+        setup(tmp)
+        env = environment(tmp)
+        importtime(env)
+        modules = importtime(env)
+        print('import sara.CLI: {} modules, {:.1f}ms'.format(len(modules), max(modules)[0] / 1000))
+        for cumulative, name in sorted(modules, reverse=True)[1:11]:
+            print('{:>10.1f}ms {}'.format(cumulative / 1000, name))
+        base = wallclock(['-c', 'pass'], env, runs)
+        print('{:>24}: {:.1f}ms'.format('python -c pass', base * 1000))
+        for argv in COMMANDS:
+            argv = [a.format(tmp=tmp) for a in argv]
+            full = ['-c', MAIN, 'saractl', '-c', tmp, '-S', tmp, '--cache-dir', join(tmp, 'cache')] + argv
+            print('{:>24}: {:.1f}ms'.format(' '.join(argv).replace(tmp, '$TMP'),
+                                            wallclock(full, env, runs) * 1000))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,191 @@
+"""
+    saractl - S.A.R.A.'s userspace utilities.
+    Copyright (C) 2017  Salvatore Mesoraca <s.mesoraca16@gmail.com>
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import logging
+from os import chmod, fstat, geteuid, lstat, makedirs, rename, rmdir, stat, unlink, walk
+from os.path import dirname, join, normpath
+from stat import S_IWGRP, S_IWOTH
+from struct import unpack_from
+from tempfile import NamedTemporaryFile
+from time import time
+
+from sara.Tracer import tracer as default_tracer
+
+TMP_PREFIX = '.saractl'
+# temporary files older than this were left behind by a crash
+STALE_TMP = 3600
+
+HEADER = 40
+
+
+# Only what can't be in a file name is escaped, names stay readable
+# and different profiles can't end up in the same file.
+def _escape(s):
+    s = str(s).replace('%', '%25').replace('/', '%2F')
+    if s.startswith('.'):
+        s = '%2E' + s[1:]
+    return s
+
+
+def profile_name(profile):
+    return _escape(','.join('{}={}'.format(k, v) for k, v in sorted(profile.items())))
+
+
+# Compiled policies ("SARADFAT" binaries), stored as
+# <store>/<submodule>/<config hash>/<kernel feature profile>. Whoever
+# compiles a policy once can publish it, every host with the same
+# config and kernel features can load it without compiling it again.
+# Files are replaced atomically, a reader sees either a whole policy
+# or nothing, so the store can be shared, e.g. over NFS.
+class ArtifactStore(object):
+    def __init__(self, path, tracer=None):
+        self.path = path
+        self.tracer = tracer if tracer is not None else default_tracer
+        self.stats = {'hits': 0, 'misses': 0, 'invalid': 0}
+
+    def artifact_path(self, submodule, xhash, profile):
+        return join(self.path, _escape(submodule), _escape(xhash), profile_name(profile))
+
+    # The header carries the hash of the config it was compiled from
+    # and says how big the tables are: a policy published for another
+    # config, truncated or padded is never loaded.
+    @staticmethod
+    def verify(binary, xhash):
+        if len(binary) < HEADER or binary[:8] != b'SARADFAT':
+            return False
+        try:
+            if binary[20:40] != bytes.fromhex(xhash):
+                return False
+        except ValueError:
+            return False
+        snum, snumn = unpack_from('<LL', binary, 12)
+        return len(binary) == HEADER + 4 * (3 * snum + 2 * snumn * 255)
+
+    def get(self, submodule, xhash, profile):
+        path = self.artifact_path(submodule, xhash, profile)
+        with self.tracer.span('store.get', path=path) as span:
+            binary = self.__read(path)
+            if binary is not None and not self.verify(binary, xhash):
+                self.stats['invalid'] += 1
+                logging.warning('"{}" is corrupted, it will be ignored.'.format(path))
+                binary = None
+            if binary is None:
+                self.stats['misses'] += 1
+            else:
+                self.stats['hits'] += 1
+            span.set(hit=binary is not None)
+        return binary
+
+    def __read(self, path):
+        try:
+            # what gets loaded in the kernel can't be replaced by anyone
+            # else: neither the policy nor the directories it's in
+            d = dirname(path)
+            while True:
+                if not self.__trusted(d, stat(d), path):
+                    return None
+                if normpath(d) == normpath(self.path):
+                    break
+                d = dirname(d)
+            with open(path, 'rb') as f:
+                if not self.__trusted(path, fstat(f.fileno()), path):
+                    return None
+                return f.read()
+        except OSError:
+            return None
+
+    @staticmethod
+    def __trusted(path, st, policy):
+        if st.st_uid not in (0, geteuid()):
+            logging.warning('"{}" is owned by uid {}, "{}" will be ignored.'.format(path, st.st_uid, policy))
+            return False
+        if st.st_mode & (S_IWGRP | S_IWOTH):
+            logging.warning('"{}" is writable by group or others, "{}" will be ignored.'.format(path, policy))
+            return False
+        return True
+
+    def put(self, submodule, xhash, profile, binary):
+        if not self.verify(binary, xhash):
+            raise ValueError('refusing to store a policy that doesn\'t match its config hash.')
+        path = self.artifact_path(submodule, xhash, profile)
+        d = join(self.path, _escape(submodule), _escape(xhash))
+        with self.tracer.span('store.put', path=path, bytes=len(binary)):
+            try:
+                makedirs(d, exist_ok=True)
+                fd = NamedTemporaryFile(dir=d, prefix=TMP_PREFIX, delete=False)
+            except FileNotFoundError:
+                # a concurrent gc removed the directory just created
+                makedirs(d, exist_ok=True)
+                fd = NamedTemporaryFile(dir=d, prefix=TMP_PREFIX, delete=False)
+            with fd:
+                fd.write(binary)
+            try:
+                chmod(fd.name, 0o644)
+                rename(fd.name, path)
+            except OSError:
+                unlink(fd.name)
+                raise
+        return path
+
+    # Drops the policies published more than max_age seconds ago, then
+    # the oldest ones until the rest fit in max_size bytes.
+    def gc(self, max_age=None, max_size=None, now=None):
+        if now is None:
+            now = time()
+        stats = {'removed': 0, 'freed': 0, 'kept': 0, 'size': 0}
+        artifacts = []
+        for root, _, files in walk(self.path):
+            for f in files:
+                path = join(root, f)
+                try:
+                    st = lstat(path)
+                except OSError:
+                    continue
+                age = now - st.st_mtime
+                if f.startswith(TMP_PREFIX):
+                    if age > STALE_TMP:
+                        self.__remove(path, st.st_size, stats)
+                elif max_age is not None and age > max_age:
+                    self.__remove(path, st.st_size, stats)
+                else:
+                    artifacts.append((st.st_mtime, st.st_size, path))
+        artifacts.sort()
+        size = sum(a[1] for a in artifacts)
+        while artifacts and max_size is not None and size > max_size:
+            _, s, path = artifacts.pop(0)
+            self.__remove(path, s, stats)
+            size -= s
+        stats['kept'] = len(artifacts)
+        stats['size'] = size
+        # only the empty ones can be removed
+        for root, _, _ in walk(self.path, topdown=False):
+            if root != self.path:
+                try:
+                    rmdir(root)
+                except OSError:
+                    pass
+        return stats
+
+    @staticmethod
+    def __remove(path, size, stats):
+        try:
+            unlink(path)
+        except FileNotFoundError:
+            return
+        stats['removed'] += 1
+        stats['freed'] += size
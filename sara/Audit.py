@@ -0,0 +1,111 @@
+"""
+    saractl - S.A.R.A.'s userspace utilities.
+    Copyright (C) 2017  Salvatore Mesoraca <s.mesoraca16@gmail.com>
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+
+from csv import writer as csv_writer
+from json import dumps
+from os import getxattr
+from os.path import isdir, realpath
+
+from sara.Generator import default_roots
+from sara.Scanner import Scanner
+from sara.submodules import wxprot
+
+
+XATTR_NAME = 'security.sara.' + wxprot.xattr_name
+USER_XATTR_NAME = 'user.sara.' + wxprot.xattr_name
+FIELDS = ('path', 'flags', 'text', 'source')
+
+
+def read_xattr(path, name=XATTR_NAME):
+    try:
+        value = getxattr(path, name, follow_symlinks=False)
+    except OSError:
+        return None
+    value = value.decode('ascii', errors='ignore').strip('\0').strip().lower()
+    base = 10
+    if value.startswith('0x'):
+        base = 16
+    elif value.startswith('0'):
+        base = 8
+    try:
+        return int(value, base)
+    except ValueError:
+        return None
+
+
+# Effective WX protection flags of every executable under a set of
+# directories: xattrs win over rules, and files matched by no rule get
+# the default flags. As in the kernel, user xattrs are only read when
+# they are allowed and the file has no security xattr.
+class Auditor(object):
+    def __init__(self, matcher, roots=None, jobs=0, xattr=True, default=None, user_xattr=False):
+        if roots is None:
+            roots = default_roots()
+        self.matcher = matcher
+        self.roots = sorted(set(realpath(r) for r in roots if isdir(r)))
+        self.jobs = jobs
+        self.xattr = xattr
+        self.user_xattr = xattr and user_xattr
+        self.default = default
+        self.stats = {'files': 0, 'rule': 0, 'xattr': 0, 'default': 0}
+
+    def records(self):
+        matcher = self.matcher
+        scanner = Scanner(self.jobs)
+        last_dir = None
+        state = 0
+        for path in scanner.scan([r if r.endswith('/') else r + '/' for r in self.roots]):
+            head, _, name = path.rpartition('/')
+            # the scanner returns all the files of a directory together
+            if head != last_dir:
+                last_dir = head
+                state = matcher.walk((head + '/').encode('utf8', 'surrogateescape'))
+            flags = None
+            if self.xattr:
+                flags = read_xattr(path)
+            if flags is None and self.user_xattr:
+                flags = read_xattr(path, USER_XATTR_NAME)
+            if flags is not None:
+                source = 'xattr'
+            else:
+                flags = matcher.match(name.encode('utf8', 'surrogateescape'), state)
+                source = 'rule' if flags is not None else 'default'
+            self.stats['files'] += 1
+            self.stats[source] += 1
+            yield path, flags, source
+
+    def text(self, flags):
+        if flags is None:
+            return self.default if self.default is not None else ''
+        try:
+            return wxprot.Config.flags_to_text(flags)
+        except wxprot.WXPBinaryException:
+            return 'invalid'
+
+    def write(self, fd, fmt='csv'):
+        if fmt == 'csv':
+            w = csv_writer(fd)
+            w.writerow(FIELDS)
+            for path, flags, source in self.records():
+                w.writerow((path, '' if flags is None else flags, self.text(flags), source))
+        elif fmt == 'jsonl':
+            for path, flags, source in self.records():
+                fd.write(dumps(dict(zip(FIELDS, (path, flags, self.text(flags), source)))) + '\n')
+        else:
+            raise ValueError('unknown format "{}"'.format(fmt))
@@ -17,29 +17,33 @@
 """
 
 import logging
+import sys
 from argparse import ArgumentParser
 from os import geteuid
-from sara.Sara import Sara
+from sara.SecurityFS import EMULATED
 from sara.submodules import submodules_names
 
-try:
-    from prctl import cap_effective
-except ImportError:
-    cap_effective = lambda: None
-    cap_effective.mac_admin = not bool(geteuid())
-    cap_effective.sys_admin = not bool(geteuid())
+# Everything else is imported by the commands that need it: saractl
+# runs at boot and in package hooks, where startup time matters.
+
+
+def _cap_effective():
+    try:
+        from prctl import cap_effective
+    except ImportError:
+        cap_effective = lambda: None
+        cap_effective.mac_admin = not bool(geteuid())
+        cap_effective.sys_admin = not bool(geteuid())
+    return cap_effective
 
-try:
-    from xattr import getxattr, listxattr, removexattr, setxattr
-    XATTR_AVAILABLE = True
-except ImportError:
-    XATTR_AVAILABLE = False
 
 VERSION = '0.3'
 
 
 class CLI(object):
     prog = 'saractl'
+    # commands that don't touch the kernel
+    offline_cmds = ('generate', 'violations', 'store-gc')
 
     def __init__(self, argv):
         self.argv = argv
@@ -60,7 +64,28 @@ class CLI(object):
         self.securityfs = self.parsed_args.securityfs
         self.submodule = self.parsed_args.submodule
         self.cmd = self.parsed_args.cmd_name
-        self.sara = self._safe_call(Sara, self.config_dir, self.securityfs)
+        self.tracer = None
+        self.__sara = None
+
+    # S.A.R.A.'s state is read only by the commands that need it
+    @property
+    def sara(self):
+        if self.__sara is None:
+            from sara.Sara import Sara
+            self.__sara = self._safe_call(Sara, self.config_dir, self.securityfs,
+                                          getattr(self.parsed_args, 'cache_dir', None) or None,
+                                          self.tracer,
+                                          getattr(self.parsed_args, 'store', None))
+        return self.__sara
+
+    @property
+    def offline(self):
+        return self.cmd in self.offline_cmds or \
+            (self.cmd == 'audit' and self.parsed_args.binary is not None)
+
+    @property
+    def emulated(self):
+        return self.securityfs.startswith(EMULATED)
 
     def _safe_call(self, fname, *args, **kwargs):
         try:
@@ -72,9 +97,75 @@ class CLI(object):
                 logging.error(e)
                 exit(1)
 
+    # --profile, --trace-malloc, --timings and --trace wrap the whole
+    # command and report even when it fails.
+    def run(self):
+        profile = getattr(self.parsed_args, 'profile', None)
+        trace_malloc = getattr(self.parsed_args, 'trace_malloc', False)
+        show_timings = getattr(self.parsed_args, 'timings', False)
+        trace = getattr(self.parsed_args, 'trace', None)
+        if not (profile or trace_malloc or show_timings or trace):
+            return self.do_cmd()
+        from time import perf_counter
+        from sara.Tracer import Tracer
+        self.tracer = Tracer()
+        if show_timings:
+            from sara.Timings import Timings
+            timings = Timings()
+            self.tracer.sinks.append(timings)
+        if trace:
+            from sara.Tracer import JSONLinesSink
+            try:
+                trace_fd = open(trace, 'w')
+            except OSError as e:
+                logging.error(e)
+                return 1
+            self.tracer.sinks.append(JSONLinesSink(trace_fd))
+        if trace_malloc:
+            import tracemalloc
+            tracemalloc.start()
+        if profile:
+            from cProfile import Profile
+            profiler = Profile()
+            profiler.enable()
+        start = perf_counter()
+        try:
+            return self.do_cmd()
+        finally:
+            elapsed = perf_counter() - start
+            if profile:
+                profiler.disable()
+            if trace:
+                trace_fd.close()
+            if trace_malloc:
+                self.__malloc_report(tracemalloc)
+            if profile:
+                profiler.dump_stats(profile)
+                print('profile written to "{}", read it with "python -m pstats {}".'.format(profile, profile),
+                      file=sys.stderr)
+            if show_timings:
+                from sara.SecurityFS import IO
+                print(timings.report(), file=sys.stderr)
+                print('{:>10.4f} {:>8}  total'.format(elapsed, 1), file=sys.stderr)
+                print('securityfs: {syscalls} syscalls, {bytes_read} bytes read, '
+                      '{bytes_written} bytes written'.format(**IO), file=sys.stderr)
+
+    @staticmethod
+    def __malloc_report(tracemalloc):
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print('memory: {:.1f} KiB peak, {:.1f} KiB at exit'.format(peak / 1024, current / 1024),
+              file=sys.stderr)
+        for stat in snapshot.statistics('lineno')[:10]:
+            print('{:>10.1f} KiB {:>8}  {}'.format(stat.size / 1024, stat.count, stat.traceback),
+                  file=sys.stderr)
+
     def do_cmd(self):
-        if not cap_effective.mac_admin and \
-           self.cmd != 'config_to_file':
+        if self.cmd != 'config_to_file' and \
+           not self.offline and \
+           not self.emulated and \
+           not _cap_effective().mac_admin:
             logging.error('you need CAP_MAC_ADMIN to access SARA\'s config.')
             return 1
         if self.cmd == 'load':
@@ -99,6 +190,13 @@ class CLI(object):
             if self.parsed_args.log_level is not None and self.parsed_args.log_level >= 1:
                 verbose = True
             ret = self._safe_call(self.sara.status, verbose=verbose)
+            if self.parsed_args.format == 'json':
+                from json import dumps
+                if self.submodule != 'main':
+                    for k in ret:
+                        ret[k] = {self.submodule: ret[k][self.submodule]}
+                print(dumps(ret, indent=2, sort_keys=True))
+                return 0
             if self.submodule == 'main':
                 if ret['extras']['main']['enabled'] == '1':
                     print('SARA: enabled')
@@ -110,6 +208,10 @@ class CLI(object):
                     print('Configuration: unlocked')
             if self.submodule == 'main' or self.submodule == 'wxprot':
                 self.__status_helper(ret, 'wxprot')
+        elif self.cmd == 'export-metrics':
+            return self._safe_call(self.sara.export_metrics,
+                                   self.parsed_args.output,
+                                   self.parsed_args.interval)
         elif self.cmd == 'lock':
             self._safe_call(self.sara.lock)
         elif self.cmd == 'config_to_file':
@@ -128,8 +230,168 @@ class CLI(object):
                 if dest is None:
                     dest = './output.c'
                 self._safe_call(self.sara.make_bin_config_c, dest)
+            elif self.parsed_args.output_format == 'c-write':
+                if dest is None:
+                    dest = './output.c'
+                self._safe_call(self.sara.make_bin_config_c, dest, single_write=True)
         elif self.cmd == 'test':
-            return int(not self._safe_call(self.sara.test))
+            return int(not self._safe_call(self.sara.test,
+                                           probes=self.parsed_args.probes,
+                                           rules=self.parsed_args.rules,
+                                           seed=self.parsed_args.seed))
+        elif self.cmd == 'watch':
+            return self._safe_call(self.sara.watch,
+                                   debounce=self.parsed_args.debounce,
+                                   max_delay=self.parsed_args.max_delay,
+                                   poll=self.parsed_args.poll,
+                                   interval=self.parsed_args.interval)
+        elif self.cmd == 'serve':
+            return self._safe_call(self.sara.serve, self.parsed_args.socket)
+        elif self.cmd == 'generate':
+            return self._safe_call(self.__generate)
+        elif self.cmd == 'audit':
+            return self._safe_call(self.__audit)
+        elif self.cmd == 'prune':
+            return self._safe_call(self.__prune)
+        elif self.cmd == 'violations':
+            return self._safe_call(self.__violations)
+        elif self.cmd == 'store-gc':
+            return self._safe_call(self.__store_gc)
+        return 0
+
+    def __store_gc(self):
+        from sara.ArtifactStore import ArtifactStore
+        if self.parsed_args.store is None:
+            logging.error('--store is required.')
+            return 1
+        max_age = self.parsed_args.max_age
+        max_size = self.parsed_args.max_size
+        stats = ArtifactStore(self.parsed_args.store).gc(max_age * 86400 if max_age > 0 else None,
+                                                         max_size * 2**20 if max_size > 0 else None)
+        logging.info('{removed} policies removed ({freed} bytes), '
+                     '{kept} kept ({size} bytes).'.format(**stats))
+        return 0
+
+    def __current_flags(self):
+        from sara.DFA import Matcher
+        from sara.Sara import Sara
+        binary = None
+        if self.parsed_args.binary is not None:
+            with open(self.parsed_args.binary[0], 'rb') as fd:
+                binary = fd.read()
+        else:
+            try:
+                binary = Sara(self.config_dir, self.securityfs).policy_binary('wxprot', loaded=True)
+            except Exception:
+                pass
+        if not binary:
+            return None
+        matcher = Matcher.from_binary(binary)
+        return lambda path: matcher.match(path.encode('utf8', 'surrogateescape'))
+
+    def __violations(self):
+        from sara.Violations import ViolationAggregator, messages
+        from sara.submodules import wxprot
+        a = ViolationAggregator(self.parsed_args.capacity)
+        try:
+            a.feed(messages(self.parsed_args.source,
+                            self.parsed_args.input_format,
+                            self.parsed_args.follow))
+        except KeyboardInterrupt:
+            pass
+        print('Violations: {} ({} suppressed by rate limiting)'.format(a.total, a.suppressed))
+        if a.duration:
+            print('Time span: {:.1f}s, average rate: {:.3f}/s, peak: {}/min'.format(a.duration, a.rate(), a.peak))
+        top = a.top(self.parsed_args.top)
+        if top:
+            print('{:>10} {:>8} {:<6} {}'.format('count', 'error', 'type', 'path'))
+            for (path, t), count, error in top:
+                print('{:>10} {:>8} {:<6} {}'.format(count, error, t, path))
+        if self.parsed_args.suggest:
+            for path, old, new in a.suggestions(self.parsed_args.top, self.__current_flags()):
+                print('# was: {}'.format(wxprot.Config.flags_to_text(old)))
+                print(wxprot.Config.rule_to_text(path, True, new))
+        return 0
+
+    def __prune(self):
+        from sara.RuleAnalyzer import RuleAnalyzer, UNREACHED
+        config = self.sara.config_object('wxprot')
+        if config is None:
+            logging.error('WX protection config not available.')
+            return 1
+        ra = RuleAnalyzer(config,
+                          jobs=self.parsed_args.jobs,
+                          timeout=self.parsed_args.timeout or None)
+        reasons = ra.analyze()
+        if not ra.complete:
+            logging.warning('scan incomplete: unreached prefix rules have not been checked.')
+        removed = {i for i, r in reasons.items()
+                   if r != UNREACHED or self.parsed_args.prune_unreached}
+        order = sorted(reasons)
+        for i, line in zip(order, ra.lines(ra.rules[i] for i in order)):
+            print('{}: {}'.format(reasons[i], line))
+        s = ra.savings(removed)
+        print('rules: {} -> {}, DFA states: {} -> {}, bytes: {} -> {}'.format(*(s['rules'] +
+                                                                               s['states'] +
+                                                                               s['bytes'])))
+        if self.parsed_args.output is not None:
+            with open(self.parsed_args.output[0], 'w', encoding='utf8') as fd:
+                for line in ra.lines(ra.pruned(removed)):
+                    fd.write(line + '\n')
+        return 0
+
+    def __audit(self):
+        from sara.Audit import Auditor
+        from sara.DFA import Matcher
+        default = None
+        xattr = self.parsed_args.xattr
+        user_xattr = False
+        if self.parsed_args.binary is not None:
+            with open(self.parsed_args.binary[0], 'rb') as fd:
+                binary = fd.read()
+        else:
+            loaded = self.parsed_args.policy == 'loaded'
+            binary = self.sara.policy_binary('wxprot', loaded=loaded)
+            status = self.sara.status()
+            default = status['default_values'].get('wxprot')
+            # xattrs count only as much as the kernel lets them
+            extras = status['extras'].get('wxprot', {})
+            xattr = xattr and extras.get('xattr_enabled') == '1'
+            user_xattr = extras.get('xattr_user_allowed') == '1'
+        if not binary:
+            logging.error('no WX protection policy available.')
+            return 1
+        a = Auditor(Matcher.from_binary(binary),
+                    roots=self.parsed_args.roots or None,
+                    jobs=self.parsed_args.jobs,
+                    xattr=xattr,
+                    default=default,
+                    user_xattr=user_xattr)
+        if self.parsed_args.output is None:
+            sys.stdout.reconfigure(errors='surrogateescape')
+            a.write(sys.stdout, self.parsed_args.output_format)
+        else:
+            with open(self.parsed_args.output[0], 'w', encoding='utf8',
+                      errors='surrogateescape', newline='') as fd:
+                a.write(fd, self.parsed_args.output_format)
+        logging.info('{files} executables: {rule} matched by rules, {xattr} by xattrs, '
+                     '{default} by the default flags.'.format(**a.stats))
+        return 0
+
+    def __generate(self):
+        from sara.Generator import Generator
+        g = Generator(roots=self.parsed_args.roots or None,
+                      jobs=self.parsed_args.jobs,
+                      collapse=self.parsed_args.collapse)
+        lines = list(g.lines())
+        if self.parsed_args.output is None:
+            print('\n'.join(lines))
+        else:
+            with open(self.parsed_args.output[0], 'w', encoding='utf8') as fd:
+                fd.write('# generated by {} from: {}\n'.format(self.prog, ' '.join(g.roots)))
+                for line in lines:
+                    fd.write(line + '\n')
+        logging.info('{binaries} binaries found in {files} files, {rules} rules generated.'.format(**g.stats))
         return 0
 
     def __status_helper(self, data, submodule):
@@ -198,7 +460,28 @@ class CLI(object):
         parser.add_argument('-S',
                             '--securityfs',
                             default='/sys/kernel/security',
-                            help='The mount point of the securityfs. Defaults to "/sys/kernel/security".')
+                            help='The mount point of the securityfs, or "emu:DIR" to emulate it in DIR. Defaults to "/sys/kernel/security".')
+        parser.add_argument('--profile',
+                            metavar='FILE',
+                            default=None,
+                            help='Profile the command with cProfile and write the stats to FILE.')
+        parser.add_argument('--trace-malloc',
+                            action='store_true',
+                            help='Trace memory allocations and report the peak and the top allocation sites.')
+        parser.add_argument('--timings',
+                            action='store_true',
+                            help='Report the time spent in each phase of the command and the securityfs I/O.')
+        parser.add_argument('--trace',
+                            metavar='FILE',
+                            default=None,
+                            help='Write a JSON object for every traced span of the command to FILE, one per line.')
+        parser.add_argument('--cache-dir',
+                            default=None,
+                            help='Where to cache parsed config files, e.g. "/var/cache/saractl". Disabled by default.')
+        parser.add_argument('--store',
+                            metavar='STORE_DIR',
+                            default=None,
+                            help='Store of compiled policies: load and startup look for the config in it before compiling, config_to_file publishes to it.')
         parser.add_argument('-s',
                             '--submodule',
                             choices=['main'] + submodules,
@@ -216,21 +499,185 @@ class CLI(object):
         subparsers.add_parser('startup', help='Load configurations for the first time at boot (-s is ignored).')
         subparsers.add_parser('enable', help='Enable S.A.R.A.')
         subparsers.add_parser('disable', help='Disable S.A.R.A.')
-        subparsers.add_parser('status', help='Get S.A.R.A. status.')
+        st = subparsers.add_parser('status', help='Get S.A.R.A. status.')
+        st.add_argument('--format',
+                        choices=['text', 'json'],
+                        default='text',
+                        help='Output format. Defaults to "text".')
+        em = subparsers.add_parser('export-metrics',
+                                   help='Write S.A.R.A. status as Prometheus metrics, for the node exporter\'s textfile collector.')
+        em.add_argument('-o',
+                        '--output',
+                        default='-',
+                        help='Output file, it is replaced atomically. Defaults to "-", the standard output.')
+        em.add_argument('--interval',
+                        type=float,
+                        default=0,
+                        help='Keep running and write the metrics again every this many seconds. Defaults to 0, write them once.')
         subparsers.add_parser('lock', help='Prevent changing the config until next reboot.')
         ctf = subparsers.add_parser('config_to_file',
                                     help='Generate various binary formats to import the configuration without {} (-s is ignored).'.format(prog))
         ctf.add_argument('-F',
                          '--output-format',
-                         choices=['binary', 'sh', 'c'],
+                         choices=['binary', 'sh', 'c', 'c-write'],
                          default='binary',
-                         help='Select the desired output format. Available formats: "binary", "sh" and "c". Defaults to "binary".')
+                         help='Select the desired output format. Available formats: "binary", "sh", "c" and "c-write" (C source that writes every file with a single write(2)). Defaults to "binary".')
         ctf.add_argument('-o',
                          '--output',
                          nargs=1,
                          default=None,
-                         help='Output file or directory. Defaults to "./output/" directory for "binary" format, "./output.sh" file for "sh" format and "./output.c" file for "c" format.')
-        subparsers.add_parser('test', help='Run some self-tests.')
+                         help='Output file or directory. Defaults to "./output/" directory for "binary" format, "./output.sh" file for "sh" format and "./output.c" file for "c" and "c-write" formats.')
+        sg = subparsers.add_parser('store-gc',
+                                   help='Remove old policies from the store given with --store.')
+        sg.add_argument('--max-age',
+                        type=float,
+                        default=30,
+                        help='Remove the policies published more than this many days ago, 0 keeps them all. Defaults to 30.')
+        sg.add_argument('--max-size',
+                        type=float,
+                        default=0,
+                        help='Then remove the oldest ones until the store fits in this many MiB, 0 means unlimited. Defaults to 0.')
+        te = subparsers.add_parser('test', help='Run some self-tests.')
+        te.add_argument('--probes',
+                        type=int,
+                        default=0,
+                        help='Also check the kernel matcher against this many random lookups, on random rule sets. Defaults to 0.')
+        te.add_argument('--rules',
+                        type=int,
+                        default=100,
+                        help='Rules in each random rule set. Defaults to 100.')
+        te.add_argument('--seed',
+                        type=int,
+                        default=None,
+                        help='Seed for the random rule sets and lookups. A random one is used by default.')
+        wa = subparsers.add_parser('watch',
+                                   help='Keep running and load the configurations again whenever they, or the binaries named by their rules, change (-s is ignored).')
+        wa.add_argument('--debounce',
+                        type=float,
+                        default=1.0,
+                        help='Wait until nothing changed for this many seconds before reloading. Defaults to 1.')
+        wa.add_argument('--max-delay',
+                        type=float,
+                        default=30.0,
+                        help='Never delay a reload more than this many seconds after the first change. Defaults to 30.')
+        wa.add_argument('--poll',
+                        action='store_true',
+                        help='Poll the filesystem instead of using inotify.')
+        wa.add_argument('--interval',
+                        type=float,
+                        default=2.0,
+                        help='Polling interval in seconds, also used when inotify is not available. Defaults to 2.')
+        se = subparsers.add_parser('serve',
+                                   help='Keep the compiled configurations in memory and answer queries on a Unix socket (-s is ignored).')
+        se.add_argument('--socket',
+                        default=None,
+                        help='Path of the socket. Defaults to "/run/saractl.sock".')
+        gen = subparsers.add_parser('generate',
+                                    help='Scan executables and print the strongest compatible WX protection rules for each one of them (-s is ignored).')
+        gen.add_argument('roots',
+                         nargs='*',
+                         help='Directories to scan. Defaults to $PATH and the library directories.')
+        gen.add_argument('-o',
+                         '--output',
+                         nargs=1,
+                         default=None,
+                         help='Output file. Defaults to stdout.')
+        gen.add_argument('-j',
+                         '--jobs',
+                         type=int,
+                         default=0,
+                         help='Number of parallel workers. Defaults to automatic.')
+        gen.add_argument('--collapse',
+                         choices=['none', 'uniform', 'majority'],
+                         default='uniform',
+                         help='Merge directories into prefix rules when all of their binaries ("uniform") or most of them ("majority") share the same flags. Defaults to "uniform".')
+        au = subparsers.add_parser('audit',
+                                   help='Report the effective WX protection flags of every executable (-s is ignored).')
+        au.add_argument('roots',
+                        nargs='*',
+                        help='Directories to scan. Defaults to $PATH and the library directories.')
+        au.add_argument('-o',
+                        '--output',
+                        nargs=1,
+                        default=None,
+                        help='Output file. Defaults to stdout.')
+        au.add_argument('-F',
+                        '--output-format',
+                        choices=['csv', 'jsonl'],
+                        default='csv',
+                        help='Select the desired output format. Available formats: "csv" and "jsonl". Defaults to "csv".')
+        au.add_argument('-j',
+                        '--jobs',
+                        type=int,
+                        default=0,
+                        help='Number of parallel workers. Defaults to automatic.')
+        au.add_argument('-p',
+                        '--policy',
+                        choices=['loaded', 'config'],
+                        default='loaded',
+                        help='Use the policy loaded in the kernel or the one compiled from the config files. Defaults to "loaded".')
+        au.add_argument('-b',
+                        '--binary',
+                        nargs=1,
+                        default=None,
+                        help='Use a binary policy file (e.g. from config_to_file) instead. S.A.R.A. isn\'t needed in this case.')
+        au.add_argument('--no-xattr',
+                        dest='xattr',
+                        action='store_false',
+                        help='Ignore xattrs.')
+        pr = subparsers.add_parser('prune',
+                                   help='Find WX protection rules that are missing on disk, redundant or never reached (-s is ignored).')
+        pr.add_argument('-o',
+                        '--output',
+                        nargs=1,
+                        default=None,
+                        help='Write the pruned config to this file.')
+        pr.add_argument('-u',
+                        '--prune-unreached',
+                        action='store_true',
+                        help='Remove unreached rules too, they could still match files created in the future.')
+        pr.add_argument('-j',
+                        '--jobs',
+                        type=int,
+                        default=0,
+                        help='Number of parallel workers. Defaults to automatic.')
+        pr.add_argument('-t',
+                        '--timeout',
+                        type=float,
+                        default=60,
+                        help='Time budget in seconds for the filesystem scan, 0 means unlimited. Defaults to 60.')
+        vi = subparsers.add_parser('violations',
+                                   help='Summarize the WX protection violations reported in the kernel log (-s is ignored).')
+        vi.add_argument('source',
+                        nargs='?',
+                        default='/dev/kmsg',
+                        help='A log file, a journal export or "/dev/kmsg". Defaults to "/dev/kmsg".')
+        vi.add_argument('-F',
+                        '--input-format',
+                        choices=['auto', 'kmsg', 'journal', 'plain'],
+                        default='auto',
+                        help='Format of the source. Defaults to "auto".')
+        vi.add_argument('-k',
+                        '--top',
+                        type=int,
+                        default=20,
+                        help='Number of executables to report. Defaults to 20.')
+        vi.add_argument('--capacity',
+                        type=int,
+                        default=1024,
+                        help='Maximum number of counters kept in memory. Defaults to 1024.')
+        vi.add_argument('-f',
+                        '--follow',
+                        action='store_true',
+                        help='Keep reading "/dev/kmsg" until interrupted.')
+        vi.add_argument('--suggest',
+                        action='store_true',
+                        help='Print the rules that would allow the reported violations.')
+        vi.add_argument('-b',
+                        '--binary',
+                        nargs=1,
+                        default=None,
+                        help='Binary policy used to get the current flags. Defaults to the loaded one, if available.')
         return parser
 
 
@@ -239,12 +686,14 @@ class CLI_xattr(CLI):
     xattr_prefix = 'sara.'
 
     def do_cmd(self):
-        if not XATTR_AVAILABLE:
+        try:
+            from xattr import getxattr, listxattr, removexattr, setxattr
+        except ImportError:
             logging.error('please install pyxattr to use this functionality.')
             return 1
         if self.cmd != 'get' and \
            not self.parsed_args.user and \
-           not cap_effective.sys_admin:
+           not _cap_effective().sys_admin:
             logging.error('you need CAP_SYS_ADMIN to modify security xattrs.')
             return 1
         fname = self.parsed_args.filename[0]
@@ -332,7 +781,7 @@ class CLI_xattr(CLI):
         parser.add_argument('-S',
                             '--securityfs',
                             default='/sys/kernel/security',
-                            help='The mount point of the securityfs. Defaults to "/sys/kernel/security".')
+                            help='The mount point of the securityfs, or "emu:DIR" to emulate it in DIR. Defaults to "/sys/kernel/security".')
         parser.add_argument('-s',
                             '--submodule',
                             choices=submodules,
@@ -21,7 +21,11 @@ from collections.abc import Iterable
 from functools import total_ordering
 from itertools import chain
 import logging
+import random
 import struct
+from time import perf_counter
+
+from sara.Tracer import tracer as default_tracer
 
 
 SARA_DFA_VERSION = 2
@@ -29,34 +33,38 @@ SARA_DFA_VERSION = 2
 
 @total_ordering
 class DictKey(object):
+    __slots__ = ('path', 'exact')
+
     def __init__(self, obj, *args):
-        self.obj = {'path': obj[0], 'exact': obj[2]}
+        self.path = obj[0]
+        self.exact = obj[2]
 
     def __gt__(self, other):
-        if len(self.obj['path']) < len(other.obj['path']):
+        if len(self.path) < len(other.path):
             return False
-        elif len(self.obj['path']) > len(other.obj['path']):
+        elif len(self.path) > len(other.path):
             return True
         else:
-            if self.obj['exact'] == other.obj['exact']:
-                return self.obj['path'] < other.obj['path']
-            elif self.obj['exact']:
+            if self.exact == other.exact:
+                return self.path < other.path
+            elif self.exact:
                 return False
             else:
                 return True
 
     def __eq__(self, other):
-        return self.obj['path'] == other.obj['path'] and \
-            self.obj['exact'] == other.obj['exact']
+        return self.path == other.path and \
+            self.exact == other.exact
 
 
 class DFA:
 
     NR = 255
 
-    def __init__(self, encoding='UTF-8', encoding_error='strict'):
+    def __init__(self, encoding='UTF-8', encoding_error='strict', tracer=None):
         self.encoding = encoding
         self.encoding_error = encoding_error
+        self.tracer = tracer if tracer is not None else default_tracer
         self.init()
 
     def init(self):
@@ -277,14 +285,29 @@ class DFA:
 
     def build(self, ss, debug=False):
         self.init()
-        self.add_strings(ss)
-        self.finalize()
-        self.simplify()
-        g = self.make_compressed_tables(debug=debug)
+        tracer = self.tracer
+        with tracer.span('dfa.build'):
+            with tracer.span('dfa.add_strings', strings=len(ss)) as span:
+                self.add_strings(ss)
+                span.set(states=len(self.dfa))
+            self.finalize()
+            with tracer.span('dfa.simplify', states=len(self.dfa)) as span:
+                self.simplify()
+                span.set(simplified_states=len(self.dfa))
+            with tracer.span('dfa.compress') as span:
+                g = self.make_compressed_tables(debug=debug)
+                span.set(states=len(self.compressed_tables['default']),
+                         rows=len(self.compressed_tables['next']))
         if debug:
             return g
 
     def serialize(self, ha):
+        with self.tracer.span('dfa.serialize') as span:
+            output = self.__serialize(ha)
+            span.set(bytes=len(output))
+        return output
+
+    def __serialize(self, ha):
         assert len(self.dfa) < (2**32-1)
         assert len(ha) == 20
         output = b'SARADFAT'
@@ -399,27 +422,58 @@ class DFA:
             return True, self.outputs[i]
         return False, None
 
-def dfa_malformed_test(b):
+# Read-only matcher over the compressed tables, as loaded by the kernel.
+# States can be saved and resumed, so paths sharing a directory only
+# walk it once.
+class Matcher(object):
+    NR = DFA.NR
+
+    def __init__(self, tables):
+        self.default = tables['default']
+        self.base = [b * self.NR for b in tables['base']]
+        self.next = list(chain.from_iterable(tables['next']))
+        self.check = list(chain.from_iterable(tables['check']))
+        self.outputs = tables['outputs']
+
+    @classmethod
+    def from_binary(cls, b):
+        return cls(DFA().deserialize(b))
+
+    def walk(self, s, i=0):
+        default, base, nxt, check = self.default, self.base, self.next, self.check
+        for c in s:
+            if i < 0:
+                break
+            j = base[i] + c - 1
+            i = nxt[j] if check[j] == i else default[i]
+        return i
+
+    def output(self, i):
+        if i < 0 or self.outputs[i] < 0:
+            return None
+        return self.outputs[i]
+
+    def match(self, s, i=0):
+        return self.output(self.walk(s, i))
+
+
+def dfa_malformed_test(securityfs, b):
     try:
-        with open('/sys/kernel/security/sara/dfa_test/.load', 'wb') as f:
-            f.write(b)
+        securityfs.write('dfa_test/.load', b)
         return False
     except OSError:
         return True
 
-def dfa_kernel_test():
-    for i, t in enumerate(TEST_SETS):
-        d = DFA()
-        d.build(t)
-        s = d.serialize(b'\xAA'*20)
-        with open('/sys/kernel/security/sara/dfa_test/.load', 'wb') as f:
-            f.write(s)
-        for t1 in t:
-            for t2 in t1[3]:
-                with open('/sys/kernel/security/sara/dfa_test/test', 'wb') as f:
-                    f.write(t2[0])
-                with open('/sys/kernel/security/sara/dfa_test/result', 'rb') as f:
-                    result = int(f.read().strip())
+def dfa_kernel_test(securityfs):
+    with securityfs.channel('dfa_test/test', 'dfa_test/result') as c:
+        for i, t in enumerate(TEST_SETS):
+            d = DFA()
+            d.build(t)
+            s = d.serialize(b'\xAA'*20)
+            securityfs.write('dfa_test/.load', s)
+            for t1 in t:
+                for t2 in t1[3]:
+                    result = int(c.ask(t2[0]).strip())
                     if t2[1]:
                         if result != t1[1]:
                             logging.error('DFA test: {} {}'.format(i, t2[0]))
@@ -429,11 +483,74 @@ def dfa_kernel_test():
                             logging.error('DFA test: {} {}'.format(i, t2[0]))
                             return False
     for i, b in enumerate(MALFORMED_TESTS):
-        if not dfa_malformed_test(b):
+        if not dfa_malformed_test(securityfs, b):
             logging.error('DFA malformed test: {}'.format(i))
             return False
     return True
 
+# Few symbols, so that random paths share a lot of prefixes.
+STRESS_ALPHABET = b'/abcz.-\x01\xc3\xff'
+
+def _random_path(rng, size):
+    return bytes(rng.choice(STRESS_ALPHABET) for _ in range(size))
+
+def random_rules(rng, n):
+    rules = {}
+    while len(rules) < n:
+        path = _random_path(rng, rng.randint(0, 16))
+        rules[(path, rng.random() < 0.3)] = rng.randint(0, 0xfffffffe)
+    return [(path, value, prefix) for (path, prefix), value in rules.items()]
+
+# Rule paths, their prefixes and extensions, single byte mutations and
+# plain random strings.
+def random_probes(rng, rules, n):
+    for _ in range(n):
+        k = rng.random()
+        path = rng.choice(rules)[0]
+        if k < 0.2:
+            yield path
+        elif k < 0.4:
+            yield path + _random_path(rng, rng.randint(1, 8))
+        elif k < 0.6:
+            yield path[:rng.randint(0, len(path))]
+        elif k < 0.8 and path:
+            i = rng.randrange(len(path))
+            yield path[:i] + _random_path(rng, 1) + path[i+1:]
+        else:
+            yield _random_path(rng, rng.randint(0, 24))
+
+# Differential test of the kernel matcher against DFA.match on random
+# rule sets. Only the lookups are timed.
+def dfa_stress_test(securityfs, probes, rules=100, sets=4, seed=None):
+    if seed is None:
+        seed = random.randrange(2**32)
+    rng = random.Random(seed)
+    elapsed = 0
+    done = 0
+    with securityfs.channel('dfa_test/test', 'dfa_test/result') as c:
+        for i in range(sets):
+            ss = random_rules(rng, rules)
+            d = DFA()
+            d.build(ss)
+            securityfs.write('dfa_test/.load', d.serialize(b'\xAA'*20))
+            n = probes // sets + (i < probes % sets)
+            corpus = list(random_probes(rng, ss, n))
+            expected = []
+            for p in corpus:
+                v = d.match(p)[1]
+                expected.append(0xffffffff if v is None else v)
+            ask = c.ask
+            start = perf_counter()
+            results = [ask(p) for p in corpus]
+            elapsed += perf_counter() - start
+            for p, e, r in zip(corpus, expected, results):
+                if int(r.strip()) != e:
+                    logging.error('DFA stress test: set {} (seed {}) {}'.format(i, seed, p))
+                    return False
+            done += n
+    logging.info('DFA stress test: {} probes, {:.0f} probes/s.'.format(done, done / elapsed if elapsed else 0))
+    return True
+
 MALFORMED_TESTS = [b'idjsdg',
                    b'SARADFAT\x01\x00\x00\x00\x01\x00\x00\x00\x01\x00\x00\x00\xfe\x03^\xed\xf9\xa1\xea\x97wx_%;[ZN\xc3\x84\xec\xe7\xff\xff\xff\xff\x00\x00\x00\x00' + b'\xff'*1020 + b'\x00'*1020 + b'\x0f\x00\x00\x00',
                    b'SARZDFAT\x02\x00\x00\x00\x01\x00\x00\x00\x01\x00\x00\x00\xfe\x03^\xed\xf9\xa1\xea\x97wx_%;[ZN\xc3\x84\xec\xe7\xff\xff\xff\xff\x00\x00\x00\x00' + b'\xff'*1020 + b'\x00'*1020 + b'\x0f\x00\x00\x00',
@@ -0,0 +1,395 @@
+"""
+    saractl - S.A.R.A.'s userspace utilities.
+    Copyright (C) 2017  Salvatore Mesoraca <s.mesoraca16@gmail.com>
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from collections import OrderedDict, deque
+from mmap import mmap, ACCESS_READ
+from os import stat
+from os.path import dirname, isfile, join, normpath, realpath
+from struct import Struct, error as StructError, unpack_from
+from threading import Lock
+
+
+ELFCLASS32 = 1
+ELFCLASS64 = 2
+ET_EXEC = 2
+ET_DYN = 3
+PT_LOAD = 1
+PT_DYNAMIC = 2
+PT_INTERP = 3
+PT_GNU_STACK = 0x6474e551
+PT_GNU_RELRO = 0x6474e552
+PF_X = 0x1
+PF_W = 0x2
+PF_R = 0x4
+DT_NULL = 0
+DT_NEEDED = 1
+DT_HASH = 4
+DT_STRTAB = 5
+DT_SYMTAB = 6
+DT_STRSZ = 10
+DT_SYMENT = 11
+DT_RPATH = 15
+DT_RUNPATH = 29
+DT_GNU_HASH = 0x6ffffef5
+SHT_DYNSYM = 11
+SHN_UNDEF = 0
+
+LD_SO_CACHE = '/etc/ld.so.cache'
+LD_SO_CACHE_OLD = b'ld.so-1.7.0'
+LD_SO_CACHE_NEW = b'glibc-ld.so.cache1.1'
+DEFAULT_LIB_DIRS = {ELFCLASS32: ('/lib32', '/usr/lib32', '/lib', '/usr/lib'),
+                    ELFCLASS64: ('/lib64', '/usr/lib64', '/lib', '/usr/lib')}
+
+INTERESTING_SYMBOLS = frozenset(('dlopen', 'dlmopen', 'mprotect', 'pkey_mprotect'))
+DLOPEN_SYMBOLS = frozenset(('dlopen', 'dlmopen'))
+JIT_LIBRARIES = ('libLLVM',
+                 'libgccjit.so',
+                 'libjavascriptcoregtk-',
+                 'libjvm.so',
+                 'libluajit-',
+                 'libmono-',
+                 'libmonosgen-',
+                 'libmozjs-',
+                 'libnode.so',
+                 'libQt5Qml.so',
+                 'libQt6Qml.so',
+                 'libv8.so')
+
+_LAYOUTS = {}
+for _e, _c in (('<', ELFCLASS32), ('>', ELFCLASS32), ('<', ELFCLASS64), ('>', ELFCLASS64)):
+    if _c == ELFCLASS32:
+        _LAYOUTS[(_e, _c)] = {'ehdr': Struct(_e + '16xHHIIIIIHHHHHH'),
+                              'phdr': Struct(_e + 'IIIIIIII'),
+                              'shdr': Struct(_e + 'IIIIIIIIII'),
+                              'dyn': Struct(_e + 'iI'),
+                              'sym': Struct(_e + 'IIIBBH'),
+                              'word': 4}
+    else:
+        _LAYOUTS[(_e, _c)] = {'ehdr': Struct(_e + '16xHHIQQQIHHHHHH'),
+                              'phdr': Struct(_e + 'IIQQQQQQ'),
+                              'shdr': Struct(_e + 'IIQQQQIIQQ'),
+                              'dyn': Struct(_e + 'qQ'),
+                              'sym': Struct(_e + 'IBBHQQ'),
+                              'word': 8}
+
+
+class ELFError(Exception):
+    pass
+
+
+class ELFInfo(object):
+    __slots__ = ('elfclass', 'machine', 'type', 'interp', 'execstack',
+                 'relro', 'needed', 'rpath', 'runpath', 'imports')
+
+    def __init__(self):
+        self.elfclass = None
+        self.machine = None
+        self.type = None
+        self.interp = None
+        self.execstack = False
+        self.relro = False
+        self.needed = ()
+        self.rpath = ()
+        self.runpath = ()
+        self.imports = frozenset()
+
+    @property
+    def dlopen(self):
+        return bool(self.imports & DLOPEN_SYMBOLS) or \
+            any(n.startswith('libdl.so') for n in self.needed)
+
+    @property
+    def jit(self):
+        return tuple(n for n in self.needed if n.startswith(JIT_LIBRARIES))
+
+    @property
+    def executable(self):
+        return self.type == ET_EXEC or self.interp is not None
+
+
+def _parse(m):
+    if m[:4] != b'\x7fELF':
+        raise ELFError('not an ELF file')
+    if m[5] == 1:
+        endian = '<'
+    elif m[5] == 2:
+        endian = '>'
+    else:
+        raise ELFError('unknown data encoding')
+    layout = _LAYOUTS.get((endian, m[4]))
+    if layout is None:
+        raise ELFError('unknown ELF class')
+    info = ELFInfo()
+    info.elfclass = m[4]
+    ehdr = layout['ehdr'].unpack_from(m, 0)
+    info.type, info.machine = ehdr[0], ehdr[1]
+    phoff, shoff, phentsize, phnum = ehdr[4], ehdr[5], ehdr[8], ehdr[9]
+    shentsize, shnum = ehdr[10], ehdr[11]
+    elf64 = info.elfclass == ELFCLASS64
+    loads = []
+    dynamic = None
+    for i in range(phnum):
+        p = layout['phdr'].unpack_from(m, phoff + i * phentsize)
+        if elf64:
+            p_type, p_flags, p_offset, p_vaddr, _, p_filesz = p[:6]
+        else:
+            p_type, p_offset, p_vaddr, _, p_filesz, _, p_flags = p[:7]
+        if p_type == PT_LOAD:
+            loads.append((p_vaddr, p_offset, p_filesz))
+        elif p_type == PT_DYNAMIC:
+            dynamic = (p_offset, p_filesz)
+        elif p_type == PT_INTERP:
+            info.interp = bytes(m[p_offset:p_offset + p_filesz]).rstrip(b'\0').decode('utf8', 'replace')
+        elif p_type == PT_GNU_STACK:
+            info.execstack = (p_flags & (PF_R | PF_W | PF_X)) == (PF_R | PF_W | PF_X)
+        elif p_type == PT_GNU_RELRO:
+            info.relro = True
+    if dynamic is None:
+        return info
+
+    def offset(vaddr):
+        for start, off, size in loads:
+            if start <= vaddr < start + size:
+                return vaddr - start + off
+        raise ELFError('address not mapped')
+
+    dyn = layout['dyn']
+    tags = {}
+    needed, rpath, runpath = [], [], []
+    for i in range(dynamic[1] // dyn.size):
+        tag, val = dyn.unpack_from(m, dynamic[0] + i * dyn.size)
+        if tag == DT_NULL:
+            break
+        elif tag == DT_NEEDED:
+            needed.append(val)
+        elif tag == DT_RPATH:
+            rpath.append(val)
+        elif tag == DT_RUNPATH:
+            runpath.append(val)
+        else:
+            tags[tag] = val
+    if DT_STRTAB not in tags:
+        raise ELFError('missing DT_STRTAB')
+    strtab = offset(tags[DT_STRTAB])
+
+    def string(i):
+        end = m.find(b'\0', strtab + i)
+        if end < 0:
+            raise ELFError('unterminated string')
+        return m[strtab + i:end].decode('utf8', 'replace')
+
+    info.needed = tuple(string(i) for i in needed)
+    info.rpath = tuple(p for i in rpath for p in string(i).split(':') if p)
+    info.runpath = tuple(p for i in runpath for p in string(i).split(':') if p)
+    if DT_SYMTAB in tags:
+        info.imports = _scan_imports(m, layout, tags, offset, string, shoff, shentsize, shnum)
+    return info
+
+
+def _scan_imports(m, layout, tags, offset, string, shoff, shentsize, shnum):
+    sym = layout['sym']
+    symtab = offset(tags[DT_SYMTAB])
+    syment = tags.get(DT_SYMENT, sym.size)
+    if DT_GNU_HASH in tags:
+        # Undefined symbols are never hashed, the linker places them
+        # before the first hashed one, so they are all below symoffset.
+        symnum = Struct(sym.format[0] + 'I').unpack_from(m, offset(tags[DT_GNU_HASH]) + 4)[0]
+    elif DT_HASH in tags:
+        symnum = Struct(sym.format[0] + 'I').unpack_from(m, offset(tags[DT_HASH]) + 4)[0]
+    else:
+        symnum = 0
+        shdr = layout['shdr']
+        for i in range(shnum if shoff else 0):
+            s = shdr.unpack_from(m, shoff + i * shentsize)
+            if s[1] == SHT_DYNSYM:
+                symnum = s[5] // (s[9] or sym.size)
+                break
+    elf64 = layout['word'] == 8
+    ret = set()
+    for i in range(1, symnum):
+        s = sym.unpack_from(m, symtab + i * syment)
+        if (s[3] if elf64 else s[5]) != SHN_UNDEF:
+            continue
+        name = string(s[0])
+        if name in INTERESTING_SYMBOLS:
+            ret.add(name)
+    return frozenset(ret)
+
+
+def parse_elf(path):
+    with open(path, 'rb') as f:
+        try:
+            m = mmap(f.fileno(), 0, access=ACCESS_READ)
+        except ValueError:
+            raise ELFError('empty file')
+        try:
+            return _parse(m)
+        except (StructError, IndexError, OverflowError) as e:
+            raise ELFError(str(e))
+        finally:
+            m.close()
+
+
+class ELFCache(object):
+    def __init__(self, maxsize=65536):
+        self.maxsize = maxsize
+        self.stats = {'hits': 0, 'misses': 0}
+        self.__cache = OrderedDict()
+        self.__lock = Lock()
+
+    def get(self, path):
+        return self.lookup(path)[0]
+
+    # (info, whether it came from the cache)
+    def lookup(self, path):
+        try:
+            st = stat(path)
+        except OSError:
+            return None, False
+        key = (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns)
+        with self.__lock:
+            if key in self.__cache:
+                self.stats['hits'] += 1
+                self.__cache.move_to_end(key)
+                return self.__cache[key], True
+            self.stats['misses'] += 1
+        try:
+            info = parse_elf(path)
+        except (OSError, ELFError):
+            info = None
+        with self.__lock:
+            self.__cache[key] = info
+            if len(self.__cache) > self.maxsize:
+                self.__cache.popitem(last=False)
+        return info, False
+
+
+elf_cache = ELFCache()
+
+
+def elf_info(path):
+    return elf_cache.get(path)
+
+
+def read_ld_so_cache(path=LD_SO_CACHE):
+    ret = {}
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except OSError:
+        return ret
+    base = 0
+    try:
+        if data.startswith(LD_SO_CACHE_OLD):
+            base = 16 + unpack_from('=I', data, 12)[0] * 12
+            base = (base + 7) & ~7
+        if data[base:base + len(LD_SO_CACHE_NEW)] != LD_SO_CACHE_NEW:
+            return ret
+        nlibs = unpack_from('=I', data, base + 20)[0]
+        for i in range(nlibs):
+            _, key, value, _, _ = unpack_from('=iIIIQ', data, base + 48 + i * 24)
+            key = data[base + key:data.index(b'\0', base + key)].decode('utf8', 'replace')
+            value = data[base + value:data.index(b'\0', base + value)].decode('utf8', 'replace')
+            ret.setdefault(key, []).append(value)
+    except (StructError, ValueError):
+        pass
+    return ret
+
+
+# Memoized view of the DT_NEEDED graph: every library is parsed at most
+# once (through the ELFCache) and every (library, inherited RPATH) pair
+# is resolved at most once, no matter how many rules share it.
+class LibraryGraph(object):
+    def __init__(self, cache=None, ld_so_cache=LD_SO_CACHE):
+        self.cache = cache if cache is not None else elf_cache
+        self.ld_so_cache_path = ld_so_cache
+        self.__ld_so_cache = None
+        self.__deps = {}
+
+    @property
+    def ld_so_cache(self):
+        if self.__ld_so_cache is None:
+            self.__ld_so_cache = read_ld_so_cache(self.ld_so_cache_path)
+        return self.__ld_so_cache
+
+    def closure(self, path, info=None):
+        if info is None:
+            info = self.cache.get(path)
+        if info is None:
+            return
+        rpath = () if info.runpath else self.__expand(info.rpath, path)
+        seen = {path}
+        queue = deque([(path, info)])
+        while queue:
+            lib, linfo = queue.popleft()
+            for dep in self.dependencies(lib, linfo, rpath):
+                if dep in seen:
+                    continue
+                seen.add(dep)
+                dinfo = self.cache.get(dep)
+                if dinfo is not None:
+                    yield dep, dinfo
+                    queue.append((dep, dinfo))
+
+    def execstack_library(self, path, info=None):
+        for lib, linfo in self.closure(path, info):
+            if linfo.execstack:
+                return lib
+        return None
+
+    def dependencies(self, path, info, inherited_rpath=()):
+        key = (path, inherited_rpath)
+        deps = self.__deps.get(key)
+        if deps is None:
+            deps = self.__deps.setdefault(key, tuple(
+                d for d in (self.resolve(n, path, info, inherited_rpath) for n in info.needed)
+                if d is not None))
+        return deps
+
+    def resolve(self, name, path, info, inherited_rpath=()):
+        if '/' in name:
+            return realpath(name) if isfile(name) else None
+        dirs = []
+        if not info.runpath:
+            dirs.extend(self.__expand(info.rpath, path))
+            dirs.extend(inherited_rpath)
+        dirs.extend(self.__expand(info.runpath, path))
+        candidates = [join(d, name) for d in dirs]
+        candidates.extend(self.ld_so_cache.get(name, ()))
+        candidates.extend(join(d, name) for d in DEFAULT_LIB_DIRS.get(info.elfclass, ()))
+        for c in candidates:
+            if not isfile(c):
+                continue
+            c = realpath(c)
+            cinfo = self.cache.get(c)
+            if cinfo is not None and \
+               cinfo.elfclass == info.elfclass and \
+               cinfo.machine == info.machine:
+                return c
+        return None
+
+    @staticmethod
+    def __expand(dirs, path):
+        ret = []
+        origin = dirname(realpath(path))
+        for d in dirs:
+            if '$PLATFORM' in d or '${PLATFORM}' in d:
+                continue
+            d = d.replace('${ORIGIN}', origin).replace('$ORIGIN', origin)
+            ret.append(normpath(d))
+        return tuple(ret)
@@ -0,0 +1,158 @@
+"""
+    saractl - S.A.R.A.'s userspace utilities.
+    Copyright (C) 2017  Salvatore Mesoraca <s.mesoraca16@gmail.com>
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from errno import EACCES, EINVAL, ENOENT, EPERM
+from os import makedirs, strerror
+from os.path import exists, join
+from struct import unpack_from
+
+from sara.DFA import DFA, Matcher, SARA_DFA_VERSION
+from sara.SecurityFS import IO, SecurityFS, _read
+
+HEADER_SIZE = 40
+NONE = 0xffffffff
+
+FILES = {'main/enabled': '1\n',
+         'main/locked': '0\n',
+         'wxprot/enabled': '1\n',
+         'wxprot/hash': '0' * 40 + '\n',
+         'wxprot/version': '1\n',
+         'wxprot/default_flags': '79\n',
+         'wxprot/emutramp_available': '1\n',
+         'wxprot/xattr_enabled': '0\n',
+         'wxprot/xattr_user_allowed': '0\n',
+         'wxprot/.dump': '',
+         'dfa_test/.dump': '',
+         'dfa_test/result': '',
+         'dfa_test/test': ''}
+
+# files userspace can turn on and off
+FLAGS = ('main/enabled', 'main/locked', 'wxprot/enabled',
+         'wxprot/xattr_enabled', 'wxprot/xattr_user_allowed')
+
+
+def _error(errno, name):
+    return OSError(errno, strerror(errno), name)
+
+
+# The checks the kernel does before accepting a DFA: the header, the
+# exact size of the tables and every state and row index in range.
+def parse_dfa(b):
+    if len(b) < HEADER_SIZE or b[:8] != b'SARADFAT':
+        raise _error(EINVAL, '.load')
+    version, snum, snumn = unpack_from('<III', b, 8)
+    if version != SARA_DFA_VERSION or snum == 0 or snumn == 0:
+        raise _error(EINVAL, '.load')
+    if len(b) != HEADER_SIZE + 4 * (3 * snum + 2 * DFA.NR * snumn):
+        raise _error(EINVAL, '.load')
+    tables = unpack_from('<{}I'.format(2 * snum + 2 * DFA.NR * snumn), b, HEADER_SIZE)
+    default = tables[:snum]
+    base = tables[snum:2 * snum]
+    transitions = tables[2 * snum:]
+    if any(s >= snum and s != NONE for s in default) or \
+       any(r >= snumn for r in base) or \
+       any(s >= snum and s != NONE for s in transitions):
+        raise _error(EINVAL, '.load')
+    return b[20:40]
+
+
+# Stand-in for <securityfs>/sara backed by a plain directory, for tests
+# and benchmarks on machines without S.A.R.A.. Writes go through the
+# same checks the kernel does and update what the kernel would: .dump,
+# hash and, for dfa_test, the result of the last lookup.
+class EmulatedSecurityFS(SecurityFS):
+    def __init__(self, path, tracer=None):
+        super().__init__(path, tracer)
+        self.__matcher = None
+        self.__result = None
+
+    @classmethod
+    def create(cls, path, tracer=None):
+        for name, value in FILES.items():
+            if not exists(join(path, name)):
+                makedirs(join(path, name.split('/')[0]), exist_ok=True)
+                with open(join(path, name), 'w') as f:
+                    f.write(value)
+        return cls(path, tracer)
+
+    def __store(self, name, data):
+        with open(join(self.path, name), 'wb') as f:
+            f.write(data)
+        IO['syscalls'] += 3
+        IO['bytes_written'] += len(data)
+
+    def _read(self, name):
+        if name.endswith('/.load'):
+            raise _error(EACCES, name)
+        if name == 'dfa_test/result' and self.__result is not None:
+            return self.__result
+        return _read(join(self.path, name))
+
+    def _write(self, name, data):
+        d, _, f = name.partition('/')
+        if d != 'dfa_test' and self._read('main/locked').strip() == b'1':
+            raise _error(EPERM, name)
+        if f == '.load':
+            if not exists(join(self.path, d, '.dump')):
+                raise _error(ENOENT, name)
+            ha = parse_dfa(data)
+            self.__store(join(d, '.dump'), data)
+            if d == 'dfa_test':
+                self.__matcher = Matcher.from_binary(data)
+            else:
+                self.__store(join(d, 'hash'), ha.hex().encode('ascii') + b'\n')
+        elif name == 'dfa_test/test':
+            if self.__matcher is None:
+                dump = self._read('dfa_test/.dump')
+                if not dump:
+                    raise _error(EINVAL, name)
+                self.__matcher = Matcher.from_binary(dump)
+            result = self.__matcher.match(data)
+            # kept in memory, lookups are asked for by the million
+            self.__result = b'%d\n' % (NONE if result is None else result)
+        elif name in FLAGS:
+            if data.strip() not in (b'0', b'1'):
+                raise _error(EINVAL, name)
+            self.__store(name, data.strip() + b'\n')
+        elif exists(join(self.path, name)):
+            raise _error(EACCES, name)
+        else:
+            raise _error(ENOENT, name)
+
+    def channel(self, query, answer):
+        return EmulatedChannel(self, query, answer)
+
+
+class EmulatedChannel(object):
+    def __init__(self, securityfs, query, answer):
+        self.securityfs = securityfs
+        self.query = query
+        self.answer = answer
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def close(self):
+        pass
+
+    def ask(self, data):
+        self.securityfs._write(self.query, data)
+        return self.securityfs._read(self.answer)
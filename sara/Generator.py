@@ -0,0 +1,157 @@
+"""
+    saractl - S.A.R.A.'s userspace utilities.
+    Copyright (C) 2017  Salvatore Mesoraca <s.mesoraca16@gmail.com>
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+from os import environ, pathsep
+from os.path import dirname, isdir, realpath
+
+from sara.ELF import DEFAULT_LIB_DIRS, LibraryGraph, elf_info
+from sara.Scanner import Scanner
+from sara.submodules import wxprot
+
+
+def default_roots():
+    roots = [p for p in environ.get('PATH', '').split(pathsep) if p]
+    for dirs in DEFAULT_LIB_DIRS.values():
+        roots.extend(dirs)
+    return roots
+
+
+# Builds a wxprot configuration from the executables found under a set
+# of directories, giving each one the strongest flags it is compatible
+# with.
+class Generator(object):
+    def __init__(self, roots=None, jobs=0, collapse='uniform'):
+        if roots is None:
+            roots = default_roots()
+        self.roots = sorted(set(realpath(r) for r in roots if isdir(r)))
+        self.jobs = jobs
+        self.collapse = collapse
+        self.graph = LibraryGraph()
+        self.stats = {'files': 0, 'binaries': 0, 'rules': 0}
+
+    def prefixes(self):
+        return [r if r.endswith('/') else r + '/' for r in self.roots]
+
+    def classify(self, path):
+        info = elf_info(path)
+        if info is None or not info.executable:
+            return None
+        libs = list(self.graph.closure(path, info))
+        if info.jit or any(linfo.jit for _, linfo in libs):
+            return wxprot.SARA_WXP_NONE
+        if info.relro and not info.dlopen:
+            flags = wxprot.SARA_WXP_FULL
+        else:
+            flags = wxprot.SARA_WXP_MPROTECT | wxprot.SARA_WXP_WXORX
+        if info.execstack or any(linfo.execstack for _, linfo in libs):
+            flags |= wxprot.SARA_WXP_EMUTRAMP
+        if info.imports & {'mprotect', 'pkey_mprotect'}:
+            flags |= wxprot.SARA_WXP_COMPLAIN
+        return flags
+
+    def scan(self):
+        results = {}
+        scanner = Scanner(self.jobs)
+        executor = ThreadPoolExecutor(max_workers=scanner.jobs)
+        pending = deque()
+        try:
+            for path in scanner.scan(self.prefixes()):
+                pending.append((path, executor.submit(self.classify, path)))
+                while len(pending) >= scanner.jobs * 4 or \
+                        (pending and pending[0][1].done()):
+                    self.__collect(results, *pending.popleft())
+            while pending:
+                self.__collect(results, *pending.popleft())
+        finally:
+            # binaries still queued when the scan fails aren't classified
+            for item in pending:
+                item[1].cancel()
+            executor.shutdown(wait=True)
+        return results
+
+    def __collect(self, results, path, future):
+        self.stats['files'] += 1
+        flags = future.result()
+        if flags is not None:
+            self.stats['binaries'] += 1
+            results[path] = flags
+
+    # Returns (path, exact, flags) tuples. A directory whose binaries,
+    # subdirectories included, all got the same flags becomes a single
+    # prefix rule. With 'majority' the most common flags of a directory
+    # become a prefix rule too, and only the other binaries get their
+    # own exact rule.
+    def rules(self, results):
+        if self.collapse == 'none':
+            return [(p, True, f) for p, f in sorted(results.items())]
+        tops = [p[:-1] or '/' for p in Scanner.roots(self.prefixes())]
+        files = {}
+        for path, flags in results.items():
+            files.setdefault(dirname(path), {})[path] = flags
+        subdirs = {}
+        for d in files:
+            while d not in tops and d != '/':
+                children = subdirs.setdefault(dirname(d), set())
+                if d in children:
+                    break
+                children.add(d)
+                d = dirname(d)
+        uniform = {}
+        counts = {}
+
+        def visit(d):
+            values = set(files.get(d, {}).values())
+            counts[d] = len(files.get(d, ()))
+            for c in subdirs.get(d, ()):
+                visit(c)
+                values.add(uniform[c])
+                counts[d] += counts[c]
+            uniform[d] = values.pop() if len(values) == 1 else None
+
+        def emit(d, inherited):
+            prefix = d.rstrip('/') + '/'
+            if uniform[d] is not None and counts[d] > 1:
+                if uniform[d] != inherited:
+                    ret.append((prefix, False, uniform[d]))
+                return
+            if self.collapse == 'majority':
+                common = Counter(files.get(d, {}).values()).most_common(1)
+                if common and common[0][1] > 1 and common[0][0] != inherited:
+                    inherited = common[0][0]
+                    ret.append((prefix, False, inherited))
+            for p, f in files.get(d, {}).items():
+                if f != inherited:
+                    ret.append((p, True, f))
+            for c in subdirs.get(d, ()):
+                emit(c, inherited)
+
+        ret = []
+        for d in tops:
+            visit(d)
+            emit(d, None)
+        ret.sort()
+        return ret
+
+    def lines(self):
+        rules = self.rules(self.scan())
+        self.stats['rules'] = len(rules)
+        for path, exact, flags in rules:
+            yield wxprot.Config.rule_to_text(path, exact, flags)
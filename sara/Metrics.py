@@ -0,0 +1,171 @@
+"""
+    saractl - S.A.R.A.'s userspace utilities.
+    Copyright (C) 2017  Salvatore Mesoraca <s.mesoraca16@gmail.com>
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import logging
+import sys
+from os import chmod, rename, unlink
+from os.path import abspath, dirname
+from tempfile import NamedTemporaryFile
+from time import monotonic, sleep
+
+NOT_LOADED = '0' * 40
+
+# extras that aren't plain 0/1 flags
+NOT_FLAGS = ('long_name', 'enabled', 'hash', 'version')
+
+HELP = {'sara_enabled': 'Whether S.A.R.A. is enabled.',
+        'sara_locked': 'Whether S.A.R.A.\'s configuration is locked.',
+        'sara_submodule_enabled': 'Whether the submodule is enabled.',
+        'sara_submodule_info': 'Version, default flags and hash of the loaded policy.',
+        'sara_policy_loaded': 'Whether a policy has been loaded.',
+        'sara_policy_size_bytes': 'Size of the loaded policy.',
+        'sara_wxprot_emutramp_available': 'Whether trampoline emulation is available.',
+        'sara_wxprot_xattr_enabled': 'Whether WX Protection security xattrs are enabled.',
+        'sara_wxprot_xattr_user_allowed': 'Whether WX Protection user xattrs are enabled.',
+        'sara_exporter_read_errors': 'Attributes that couldn\'t be read in the last run.'}
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join('{}="{}"'.format(k, _escape(v)) for k, v in sorted(labels.items())) + '}'
+
+
+class Sample(object):
+    __slots__ = ('name', 'labels', 'value')
+
+    def __init__(self, name, value, **labels):
+        self.name = name
+        self.labels = labels
+        self.value = value
+
+
+# Prometheus text exposition format, every metric is a gauge. The
+# samples of a metric must be next to each other.
+def render(samples):
+    metrics = {}
+    for s in samples:
+        metrics.setdefault(s.name, []).append(s)
+    out = []
+    for name, group in metrics.items():
+        out.append('# HELP {} {}\n'.format(name, HELP.get(name, name.replace('_', ' ') + '.')))
+        out.append('# TYPE {} gauge\n'.format(name))
+        for s in group:
+            out.append('{}{} {}\n'.format(name, _labels(s.labels), s.value))
+    return ''.join(out)
+
+
+# The node exporter could read the file while it's being written:
+# write a new one and rename it over the old one.
+def write_textfile(path, text):
+    with NamedTemporaryFile('w', dir=dirname(abspath(path)), prefix='.saractl', delete=False) as fd:
+        fd.write(text)
+    try:
+        chmod(fd.name, 0o644)
+        rename(fd.name, path)
+    except OSError:
+        unlink(fd.name)
+        raise
+
+
+def _flag(value):
+    if value is None or not value.strip().isdigit():
+        return None
+    return int(value)
+
+
+class Exporter(object):
+    def __init__(self, loader, path='-', interval=0):
+        self.loader = loader
+        self.path = path
+        self.interval = interval
+        self.stats = {'runs': 0, 'dumps': 0}
+        self.__sizes = {}
+
+    # .dump files can be big, they are read only when the hash changes
+    def __policy_size(self, submodule, h):
+        if self.__sizes.get(submodule, (None,))[0] != h:
+            self.stats['dumps'] += 1
+            size = len(self.loader.securityfs.read('{}/.dump'.format(submodule), fresh=True) or b'')
+            self.__sizes[submodule] = (h, size)
+        return self.__sizes[submodule][1]
+
+    def collect(self):
+        self.loader.securityfs.snapshot()
+        extras = self.loader.get_extras()
+        defaults = self.loader.get_default_values()
+        samples = []
+        errors = 0
+        for name in ('enabled', 'locked'):
+            v = _flag(extras['main'][name])
+            if v is None:
+                errors += 1
+            else:
+                samples.append(Sample('sara_' + name, v))
+        for sm, e in sorted(extras.items()):
+            if sm == 'main':
+                continue
+            v = _flag(e['enabled'])
+            if v is None:
+                errors += 1
+            else:
+                samples.append(Sample('sara_submodule_enabled', v, submodule=sm))
+            h = (e['hash'] or '').strip()
+            samples.append(Sample('sara_submodule_info', 1, submodule=sm, hash=h,
+                                  version=e['version'] or '', default=defaults.get(sm) or ''))
+            samples.append(Sample('sara_policy_loaded', int(h not in ('', NOT_LOADED)), submodule=sm))
+            samples.append(Sample('sara_policy_size_bytes', self.__policy_size(sm, h), submodule=sm))
+            for name, value in sorted(e.items()):
+                if name in NOT_FLAGS:
+                    continue
+                v = _flag(value)
+                if v is None:
+                    errors += 1
+                else:
+                    samples.append(Sample('sara_{}_{}'.format(sm, name), v))
+        samples.append(Sample('sara_exporter_read_errors', errors))
+        return samples
+
+    def export(self):
+        text = render(self.collect())
+        if self.path == '-':
+            sys.stdout.write(text)
+            sys.stdout.flush()
+        else:
+            write_textfile(self.path, text)
+        self.stats['runs'] += 1
+
+    def run(self):
+        if not self.interval:
+            self.export()
+            return 0
+        try:
+            while True:
+                start = monotonic()
+                try:
+                    self.export()
+                except OSError as e:
+                    logging.error(e)
+                sleep(max(0, self.interval - (monotonic() - start)))
+        except KeyboardInterrupt:
+            pass
+        return 0
@@ -0,0 +1,158 @@
+"""
+    saractl - S.A.R.A.'s userspace utilities.
+    Copyright (C) 2017  Salvatore Mesoraca <s.mesoraca16@gmail.com>
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from importlib.util import MAGIC_NUMBER
+from marshal import dumps, loads
+from os import fstat, geteuid, makedirs, rename, stat, unlink
+from os.path import dirname
+from stat import S_IWGRP, S_IWOTH
+from tempfile import NamedTemporaryFile
+
+import logging
+
+from sara.lexer import split_line
+from sara.Tracer import tracer as default_tracer
+from sara.submodules.BaseConfig import Location
+
+
+CACHE_MAGIC = b'SARAPC01' + MAGIC_NUMBER
+
+
+def parse_file(path):
+    lines = []
+    with open(path, 'r', encoding='utf8') as fd:
+        for ln, line in enumerate(fd, 1):
+            line = split_line(line)
+            if line:
+                lines.append((ln, line))
+    return lines
+
+
+def _parse(path, tracer=default_tracer, parent=None):
+    with tracer.span('config.read', parent, path=path, cache='miss') as span:
+        try:
+            lines = parse_file(path)
+        except IOError:
+            return None, None
+        except ValueError as e:
+            return None, e
+        span.set(lines=len(lines))
+        return lines, None
+
+
+# Tokenized config files, keyed by path and checked against
+# (mtime_ns, size, inode). Only files that changed are read again, in
+# parallel; lines are returned in the original order with the original
+# locations. Without a path nothing is persisted. Every complete pass
+# becomes the reference for the next one, so a long-lived instance
+# keeps its entries in memory.
+class ParseCache(object):
+    def __init__(self, path=None, jobs=0, tracer=None):
+        self.path = path
+        self.jobs = jobs if jobs > 0 else 8
+        self.tracer = tracer if tracer is not None else default_tracer
+        self.stats = {'hits': 0, 'misses': 0}
+        self.__entries = {}
+        self.__seen = {}
+        self.__dirty = False
+        if path is not None:
+            self.__load()
+
+    def __load(self):
+        try:
+            with open(self.path, 'rb') as fd:
+                st = fstat(fd.fileno())
+                # never trust a cache someone else could have written
+                if st.st_uid != geteuid() or st.st_mode & (S_IWGRP | S_IWOTH):
+                    return
+                data = fd.read()
+        except OSError:
+            return
+        if not data.startswith(CACHE_MAGIC):
+            return
+        try:
+            entries = loads(data[len(CACHE_MAGIC):])
+        except (EOFError, ValueError, TypeError):
+            return
+        if isinstance(entries, dict):
+            self.__entries = entries
+
+    def save(self):
+        if self.path is None or \
+           not self.__dirty and len(self.__seen) == len(self.__entries):
+            return
+        try:
+            makedirs(dirname(self.path), mode=0o700, exist_ok=True)
+            with NamedTemporaryFile(dir=dirname(self.path), delete=False) as fd:
+                fd.write(CACHE_MAGIC + dumps(self.__seen))
+            try:
+                rename(fd.name, self.path)
+            except OSError:
+                unlink(fd.name)
+                raise
+        except OSError as e:
+            logging.debug('parse cache not saved: {}'.format(e))
+
+    def parse_files(self, files):
+        self.__seen = {}
+        self.__dirty = False
+        executor = None
+        pending = deque()
+        try:
+            for path in files:
+                try:
+                    st = stat(path)
+                except OSError:
+                    continue
+                key = (st.st_mtime_ns, st.st_size, st.st_ino)
+                entry = self.__entries.get(path)
+                if entry is not None and entry[0] == key:
+                    self.stats['hits'] += 1
+                    with self.tracer.span('config.read', path=path, cache='hit', lines=len(entry[1])):
+                        pass
+                    pending.append((path, key, entry[1], None))
+                    continue
+                self.stats['misses'] += 1
+                if executor is None:
+                    executor = ThreadPoolExecutor(max_workers=self.jobs)
+                pending.append((path, key, None,
+                                executor.submit(_parse, path, self.tracer, self.tracer.current())))
+            while pending:
+                path, key, lines, future = pending.popleft()
+                if future is not None:
+                    lines, error = future.result()
+                    if error is not None:
+                        raise error
+                    if lines is None:
+                        continue
+                    self.__dirty = True
+                self.__seen[path] = (key, lines)
+                for ln, line in lines:
+                    yield Location(path, ln), list(line)
+        finally:
+            if executor is not None:
+                # what's still queued is not needed any more
+                for item in pending:
+                    if item[3] is not None:
+                        item[3].cancel()
+                executor.shutdown(wait=True)
+        self.save()
+        self.__entries = self.__seen
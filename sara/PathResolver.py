@@ -0,0 +1,112 @@
+"""
+    saractl - S.A.R.A.'s userspace utilities.
+    Copyright (C) 2017  Salvatore Mesoraca <s.mesoraca16@gmail.com>
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from os import lstat, readlink
+from os.path import islink, realpath
+from stat import S_ISLNK
+
+
+class _Loop(Exception):
+    pass
+
+
+class _Node(object):
+    __slots__ = ('parent', 'path', 'children', 'link', 'target')
+
+    def __init__(self, parent, path, link=False):
+        self.parent = parent if parent is not None else self
+        self.path = path
+        self.children = {}
+        self.link = link
+        self.target = None
+
+
+# Replacement for os.path.realpath and os.path.islink that keeps every
+# component it has already looked at in a trie of canonical paths.
+# It assumes that the filesystem doesn't change while it is in use, so
+# it must not outlive a single config load.
+class PathResolver(object):
+    def __init__(self):
+        self.root = _Node(None, '/')
+        self.stats = {'lookups': 0, 'lstat': 0, 'readlink': 0, 'saved': 0}
+
+    def realpath(self, path):
+        self.stats['lookups'] += 1
+        if not path.startswith('/'):
+            return realpath(path)
+        try:
+            return self.__join(self.root, path, set()).path
+        except _Loop:
+            return realpath(path)
+
+    def islink(self, path):
+        self.stats['lookups'] += 1
+        head, _, name = path.rpartition('/')
+        if not path.startswith('/') or \
+           '..' in path.split('/') or \
+           name in ('', '.'):
+            return islink(path)
+        try:
+            node = self.__join(self.root, head, set())
+        except _Loop:
+            return islink(path)
+        return self.__child(node, name).link
+
+    def summary(self):
+        return 'path resolution: {lookups} lookups, {lstat} lstat, ' \
+               '{readlink} readlink, {saved} syscalls saved'.format(**self.stats)
+
+    def __child(self, node, name):
+        child = node.children.get(name)
+        if child is not None:
+            self.stats['saved'] += 1
+            return child
+        path = node.path + name if node.path == '/' else node.path + '/' + name
+        self.stats['lstat'] += 1
+        try:
+            link = S_ISLNK(lstat(path).st_mode)
+        except OSError:
+            link = False
+        return node.children.setdefault(name, _Node(node, path, link))
+
+    def __join(self, node, rest, seen):
+        # Same walk as posixpath._joinrealpath, but every step starts
+        # from an already canonical node.
+        if rest.startswith('/'):
+            node = self.root
+        for name in rest.split('/'):
+            if not name or name == '.':
+                continue
+            if name == '..':
+                node = node.parent
+                continue
+            child = self.__child(node, name)
+            if not child.link:
+                node = child
+                continue
+            if child.target is not None:
+                self.stats['saved'] += 1
+                node = child.target
+                continue
+            if child in seen:
+                raise _Loop()
+            seen.add(child)
+            self.stats['readlink'] += 1
+            child.target = self.__join(node, readlink(child.path), seen)
+            node = child.target
+        return node
@@ -0,0 +1,140 @@
+"""
+    saractl - S.A.R.A.'s userspace utilities.
+    Copyright (C) 2017  Salvatore Mesoraca <s.mesoraca16@gmail.com>
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+
+from os import lstat, scandir
+from os.path import dirname, lexists
+from stat import S_ISREG
+from struct import unpack_from
+
+from sara.DFA import DFA
+from sara.Scanner import Scanner, S_IXANY
+from sara.submodules import wxprot
+
+
+MISSING = 'missing'
+REDUNDANT = 'redundant'
+UNREACHED = 'unreached'
+
+
+def prefix_exists(prefix):
+    if prefix.endswith('/'):
+        return lexists(prefix)
+    head = dirname(prefix)
+    try:
+        with scandir(head or '/') as it:
+            return any(e.path.startswith(prefix) for e in it)
+    except OSError:
+        return False
+
+
+def is_executable(path):
+    try:
+        st = lstat(path)
+    except OSError:
+        return False
+    return S_ISREG(st.st_mode) and bool(st.st_mode & S_IXANY)
+
+
+def dfa_states(binary):
+    return unpack_from('<L', binary, 12)[0]
+
+
+# Finds the rules of a wxprot config that can be removed:
+# - "missing": nothing on disk matches them
+# - "redundant": the rule they would fall back to has the same flags
+# - "unreached": no existing executable is actually matched by them
+class RuleAnalyzer(object):
+    def __init__(self, config, jobs=0, timeout=None):
+        self.config = config
+        self.rules = list(config.dicts.iter_tuples())
+        self.jobs = jobs
+        self.timeout = timeout
+        self.complete = True
+        self.exact = {}
+        self.prefixes = {}
+        for i, (path, _, exact) in enumerate(self.rules):
+            (self.exact if exact else self.prefixes)[path] = i
+
+    # Index of the prefix rule that matches path when the rule at
+    # index 'own' isn't there.
+    def fallback(self, path, own=None):
+        for i in range(len(path), -1, -1):
+            j = self.prefixes.get(path[:i])
+            if j is not None and j != own:
+                return j
+        return None
+
+    def analyze(self):
+        ret = {}
+        for i, (path, flags, exact) in enumerate(self.rules):
+            if exact and not lexists(path) or \
+               not exact and path and not prefix_exists(path):
+                ret[i] = MISSING
+                continue
+            j = self.fallback(path, i)
+            if j is not None and self.rules[j][1] == flags:
+                ret[i] = REDUNDANT
+        redundant = {i for i, r in ret.items() if r == REDUNDANT}
+        for i in self.unreached(redundant):
+            ret.setdefault(i, UNREACHED)
+        return ret
+
+    # Files matched by a redundant rule will reach its fallback once
+    # it is removed.
+    def __reach(self, reached, redundant, i):
+        reached.add(i)
+        while i in redundant:
+            i = self.fallback(self.rules[i][0], i)
+            if i is None:
+                break
+            reached.add(i)
+
+    def unreached(self, redundant=()):
+        reached = set()
+        for path, i in self.exact.items():
+            if is_executable(path):
+                self.__reach(reached, redundant, i)
+        scanner = Scanner(self.jobs, self.timeout)
+        # the catch-all rule would mean scanning the whole filesystem
+        for path in scanner.scan(p for p in self.prefixes if p):
+            if path in self.exact:
+                continue
+            self.__reach(reached, redundant, self.fallback(path))
+        self.complete = scanner.complete
+        if not self.complete:
+            return [i for i in self.exact.values() if i not in reached]
+        return [i for i, (path, _, _) in enumerate(self.rules)
+                if i not in reached and path]
+
+    def pruned(self, removed):
+        return [r for i, r in enumerate(self.rules) if i not in removed]
+
+    def lines(self, rules):
+        for path, flags, exact in rules:
+            yield wxprot.Config.rule_to_text(path, exact, flags)
+
+    def savings(self, removed):
+        before = self.config.binary
+        d = DFA()
+        d.build([(path.encode('utf8'), flags, not exact)
+                 for path, flags, exact in self.pruned(removed)])
+        after = d.serialize(b'\0' * 20)
+        return {'rules': (len(self.rules), len(self.rules) - len(removed)),
+                'states': (dfa_states(before), dfa_states(after)),
+                'bytes': (len(before), len(after))}
@@ -17,18 +17,19 @@
 """
 
 import logging
-from base64 import encodebytes
 from os import makedirs
-from os.path import join
-from sara.DFA import dfa_kernel_test
+from os.path import dirname, join
 from sara.SubModLoader import SubModLoader
-from sara.templates import SH_TEMPLATE, C_TEMPLATE, c_array
+from sara.Tracer import tracer as default_tracer
 
 
 class Sara(object):
-    def __init__(self, config_path, sysfs_path):
+    def __init__(self, config_path, sysfs_path, cache_dir=None, tracer=None, store_dir=None):
+        self.config_path = config_path
         self.sysfs_path = sysfs_path
-        self.__sml = SubModLoader(config_path, self.sysfs_path)
+        self.cache_dir = cache_dir
+        self.tracer = tracer if tracer is not None else default_tracer
+        self.__sml = SubModLoader(config_path, self.sysfs_path, cache_dir, self.tracer, store_dir)
 
     def enable(self, subm='main'):
         self.__sml.enable(subm=subm)
@@ -44,19 +45,41 @@ class Sara(object):
         return self.__sml.is_locked
 
     def startup(self):
-        if self.__sml.load_config(force=True):
-            self.__sml.call_startup()
-        else:
-            return False
+        with self.tracer.span('sara.startup'):
+            if self.__sml.load_config(force=True):
+                self.__sml.call_startup()
+            else:
+                return False
         return True
 
     def load(self, force=False):
-        return self.__sml.load_config(force=force)
-
-    def test(self):
-        if not dfa_kernel_test():
+        with self.tracer.span('sara.load'):
+            return self.__sml.load_config(force=force)
+
+    # Commands that are used once in a while import what they need
+    # when they run, to keep the common ones fast.
+    def watch(self, debounce=1.0, max_delay=30.0, poll=False, interval=2.0):
+        from sara.Watcher import Watcher
+        return Watcher(self.__sml,
+                       debounce=debounce,
+                       max_delay=max_delay,
+                       poll=poll,
+                       interval=interval).run()
+
+    def serve(self, socket_path=None):
+        from sara.Service import SOCKET, Service
+        if socket_path is None:
+            socket_path = SOCKET
+        return Service(self.config_path, self.sysfs_path, socket_path, self.cache_dir).run()
+
+    def test(self, probes=0, rules=100, seed=None):
+        from sara.DFA import dfa_kernel_test, dfa_stress_test
+        if not dfa_kernel_test(self.__sml.securityfs):
             logging.error('DFA test failed.')
             return False
+        if probes and not dfa_stress_test(self.__sml.securityfs, probes, rules, seed=seed):
+            logging.error('DFA stress test failed.')
+            return False
         if not self.__sml.test_config():
             logging.error('config test failed.')
             return False
@@ -70,6 +93,18 @@ class Sara(object):
             ret['configs'] = self.__sml.get_current_configs()
         return ret
 
+    def export_metrics(self, path='-', interval=0):
+        from sara.Metrics import Exporter
+        return Exporter(self.__sml, path, interval).run()
+
+    def config_object(self, submodule):
+        return self.__sml.get_config_objects().get(submodule)
+
+    def policy_binary(self, submodule, loaded=False):
+        if loaded:
+            return self.__sml.get_loaded_binaries().get(submodule)
+        return self.__sml.get_config_binaries().get(submodule)
+
     def xattr_encode(self, submodule, value, filename=None):
         return self.__sml.xattr_encode(submodule, value, filename=filename)
 
@@ -80,35 +115,70 @@ class Sara(object):
         return self.__sml.xattr_names()
 
     def make_bin_config_files(self, dest_dir, config=None):
-        configs = self.__sml.get_config_binaries(config, {'emutramp_available': '1'})
-        configs['wxprot_noemutramp'] = self.__sml.get_config_binaries(config, {'emutramp_available': '2'})['wxprot']
+        with self.tracer.span('sara.config_to_file', format='binary'):
+            self.__make_bin_config_files(dest_dir, config)
+
+    # Policies for kernels with and without trampoline emulation, also
+    # published to the store when there is one.
+    def __bin_configs(self, config):
+        configs = self.__sml.get_config_binaries(config, {'emutramp_available': '1'}, publish=True)
+        configs['wxprot_noemutramp'] = \
+            self.__sml.get_config_binaries(config, {'emutramp_available': '0'}, publish=True)['wxprot']
+        return configs
+
+    def __make_bin_config_files(self, dest_dir, config):
+        configs = self.__bin_configs(config)
         makedirs(dest_dir, exist_ok=True)
         for k, v in configs.items():
             with open(join(dest_dir, k), 'wb') as fd:
                 fd.write(v)
 
-    def make_bin_config_sh(self, dest, config=None):
-        configs = self.__sml.get_config_binaries(config, {'emutramp_available': '1'})
-        configs['wxprot_noemutramp'] = self.__sml.get_config_binaries(config, {'emutramp_available': '2'})['wxprot']
-        for k in configs:
-            configs[k] = encodebytes(configs[k]).decode('ascii')
+    def __bin_config_template(self, config=None):
+        configs = self.__bin_configs(config)
         for k in ('sara_locked', 'sara_enabled', 'wxprot_enabled',
                   'wxprot_xattr_enabled', 'wxprot_xattr_user_allowed'):
             configs[k] = self.__sml.main_options[k]
-        configs['sysfs_path'] = self.sysfs_path
+        configs['sysfs_path'] = dirname(self.__sml.sysfs_path)
+        configs['wxprot_size'] = len(configs['wxprot'])
+        configs['wxprot_noemutramp_size'] = len(configs['wxprot_noemutramp'])
+        return configs
+
+    def make_bin_config_sh(self, dest, config=None):
+        with self.tracer.span('sara.config_to_file', format='sh'):
+            self.__make_bin_config_sh(dest, config)
+
+    def __make_bin_config_sh(self, dest, config):
+        from base64 import encodebytes
+        from sara.templates import SH_TEMPLATE, split_common
+        configs = self.__bin_config_template(config)
+        # base64 text can be concatenated only at multiples of 3 bytes
+        head, tail, tailn = split_common(configs['wxprot'], configs['wxprot_noemutramp'], 3)
+        configs['wxprot_head'] = encodebytes(head).decode('ascii')
+        configs['wxprot'] = encodebytes(tail).decode('ascii')
+        configs['wxprot_noemutramp'] = encodebytes(tailn).decode('ascii')
         shscript = SH_TEMPLATE.format(**configs)
         with open(dest, 'w') as fd:
             fd.write(shscript)
 
-    def make_bin_config_c(self, dest, config=None):
-        configs = self.__sml.get_config_binaries(config, {'emutramp_available': '1'})
-        configs['wxprot_noemutramp'] = self.__sml.get_config_binaries(config, {'emutramp_available': '2'})['wxprot']
-        for k in configs:
-            configs[k] = c_array(configs[k])
-        for k in ('sara_locked', 'sara_enabled', 'wxprot_enabled',
-                  'wxprot_xattr_enabled', 'wxprot_xattr_user_allowed'):
-            configs[k] = self.__sml.main_options[k]
-        configs['sysfs_path'] = self.sysfs_path
-        csource = C_TEMPLATE.format(**configs)
+    def make_bin_config_c(self, dest, config=None, single_write=False):
+        with self.tracer.span('sara.config_to_file', format='c-write' if single_write else 'c'):
+            self.__make_bin_config_c(dest, config, single_write)
+
+    def __make_bin_config_c(self, dest, config, single_write):
+        from sara.templates import C_TEMPLATE, C_WRITE_TEMPLATE, c_array, split_common
+        configs = self.__bin_config_template(config)
+        # WXPROT has room for either variant: when the other one is
+        # needed its tail is copied over
+        head, _, tailn = split_common(configs['wxprot'], configs['wxprot_noemutramp'])
+        configs['wxprot_head_size'] = len(head)
+        configs['wxprot_size_max'] = max(configs['wxprot_size'], configs['wxprot_noemutramp_size'])
+        configs['wxprot'] = c_array(configs['wxprot'])
+        configs['wxprot_noemutramp_tail_size'] = len(tailn)
+        # C arrays can't be empty
+        configs['wxprot_noemutramp'] = c_array(tailn or b'\x00')
+        if single_write:
+            csource = C_WRITE_TEMPLATE.format(**configs)
+        else:
+            csource = C_TEMPLATE.format(**configs)
         with open(dest, 'w') as fd:
             fd.write(csource)
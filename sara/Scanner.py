@@ -0,0 +1,117 @@
+"""
+    saractl - S.A.R.A.'s userspace utilities.
+    Copyright (C) 2017  Salvatore Mesoraca <s.mesoraca16@gmail.com>
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from os import cpu_count, scandir
+from os.path import dirname
+from stat import S_IXUSR, S_IXGRP, S_IXOTH
+from time import monotonic
+
+
+S_IXANY = S_IXUSR | S_IXGRP | S_IXOTH
+
+
+def _scandir(path, prefix):
+    files = []
+    dirs = []
+    # only the first directory of a prefix like '/usr/bin/py' needs filtering
+    inside = (path.rstrip('/') + '/').startswith(prefix)
+    try:
+        with scandir(path) as it:
+            for e in it:
+                if not inside and \
+                   not e.path.startswith(prefix) and \
+                   not prefix.startswith(e.path + '/'):
+                    continue
+                try:
+                    if e.is_dir(follow_symlinks=False):
+                        dirs.append(e.path)
+                    elif e.is_file(follow_symlinks=False) and \
+                            (inside or e.path.startswith(prefix)) and \
+                            e.stat(follow_symlinks=False).st_mode & S_IXANY:
+                        files.append(e.path)
+                except OSError:
+                    pass
+    except OSError:
+        pass
+    files.sort()
+    dirs.sort()
+    return files, dirs
+
+
+# Parallel enumeration of the executable regular files whose path starts
+# with one of the given prefixes. Directories are listed by a thread pool
+# but results are returned in a stable breadth-first order.
+# Symlinks are never followed: the kernel only sees canonical paths.
+class Scanner(object):
+    def __init__(self, jobs=0, timeout=None):
+        if jobs <= 0:
+            jobs = min(32, (cpu_count() or 1) + 4)
+        self.jobs = jobs
+        self.deadline = None if timeout is None else monotonic() + timeout
+        self.complete = True
+        self.stats = {'dirs': 0, 'files': 0}
+
+    def expired(self):
+        if self.deadline is not None and monotonic() >= self.deadline:
+            self.complete = False
+        return not self.complete
+
+    def remaining(self):
+        if self.deadline is None:
+            return None
+        return max(0, self.deadline - monotonic())
+
+    @staticmethod
+    def roots(prefixes):
+        roots = []
+        for p in sorted(set(prefixes)):
+            if not p.startswith('/'):
+                continue
+            if roots and p.startswith(roots[-1]):
+                continue
+            roots.append(p)
+        return roots
+
+    def scan(self, prefixes):
+        executor = ThreadPoolExecutor(max_workers=self.jobs)
+        pending = deque()
+        try:
+            for prefix in self.roots(prefixes):
+                path = prefix[:-1] if prefix.endswith('/') else dirname(prefix)
+                pending.append((prefix, executor.submit(_scandir, path or '/', prefix)))
+            while pending and not self.expired():
+                prefix, future = pending.popleft()
+                try:
+                    files, dirs = future.result(self.remaining())
+                except TimeoutError:
+                    self.complete = False
+                    break
+                self.stats['dirs'] += 1
+                for d in dirs:
+                    pending.append((prefix, executor.submit(_scandir, d, prefix)))
+                for f in files:
+                    self.stats['files'] += 1
+                    yield f
+        finally:
+            # directories still queued when time is up aren't listed
+            for item in pending:
+                item[1].cancel()
+            executor.shutdown(wait=True)
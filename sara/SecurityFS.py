@@ -0,0 +1,193 @@
+"""
+    saractl - S.A.R.A.'s userspace utilities.
+    Copyright (C) 2017  Salvatore Mesoraca <s.mesoraca16@gmail.com>
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+
+from os import O_RDONLY, O_WRONLY, close, open as os_open, pread, pwrite, read, scandir, write
+from os.path import dirname, join
+
+from sara.Tracer import tracer as default_tracer
+
+
+EMULATED = 'emu:'
+
+# Every syscall made on securityfs files by this process, for --timings.
+IO = {'syscalls': 0, 'bytes_read': 0, 'bytes_written': 0}
+
+
+def _read(path):
+    fd = os_open(path, O_RDONLY)
+    IO['syscalls'] += 1
+    try:
+        chunks = []
+        while True:
+            chunk = read(fd, 65536)
+            IO['syscalls'] += 1
+            if not chunk:
+                break
+            chunks.append(chunk)
+        data = b''.join(chunks)
+        IO['bytes_read'] += len(data)
+        return data
+    finally:
+        close(fd)
+        IO['syscalls'] += 1
+
+
+def _write(path, data):
+    fd = os_open(path, O_WRONLY)
+    IO['syscalls'] += 1
+    try:
+        # securityfs files want everything in a single write
+        n = write(fd, data)
+        IO['syscalls'] += 1
+        IO['bytes_written'] += n
+        if n != len(data):
+            raise IOError('short write to "{}"'.format(path))
+    finally:
+        close(fd)
+        IO['syscalls'] += 1
+
+
+# A query file and the file holding its answer, both kept open to ask
+# one question after another without paying for open() and close()
+# every time.
+class Channel(object):
+    def __init__(self, query, answer):
+        self.query = query
+        self.fds = []
+        self.fds.append(os_open(query, O_WRONLY))
+        IO['syscalls'] += 1
+        try:
+            self.fds.append(os_open(answer, O_RDONLY))
+            IO['syscalls'] += 1
+        except OSError:
+            self.close()
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        while self.fds:
+            close(self.fds.pop())
+            IO['syscalls'] += 1
+
+    def ask(self, data):
+        n = pwrite(self.fds[0], data, 0)
+        IO['bytes_written'] += n
+        if n != len(data):
+            raise IOError('short write to "{}"'.format(self.query))
+        answer = pread(self.fds[1], 4096, 0)
+        IO['syscalls'] += 2
+        IO['bytes_read'] += len(answer)
+        return answer
+
+
+# Snapshot of <securityfs>/sara: every flag file is read once, the first
+# time something is asked, and every lookup after that is served from
+# memory. Files starting with a dot (.load, .dump) are only read on
+# demand. A write drops just the keys it can change: the file itself
+# or, for a .load, its whole directory.
+class SecurityFS(object):
+    def __init__(self, path, tracer=None):
+        self.path = path
+        self.tracer = tracer if tracer is not None else default_tracer
+        self.stats = {'reads': 0, 'writes': 0}
+        self.__cache = None
+
+    def snapshot(self):
+        self.__cache = {}
+        dirs = ['']
+        while dirs:
+            d = dirs.pop()
+            try:
+                with scandir(join(self.path, d)) as it:
+                    entries = list(it)
+            except OSError:
+                continue
+            for e in entries:
+                name = join(d, e.name) if d else e.name
+                if e.is_dir(follow_symlinks=False):
+                    dirs.append(name)
+                elif not e.name.startswith('.'):
+                    self.__load(name)
+
+    def __load(self, name):
+        self.stats['reads'] += 1
+        try:
+            value = self._read(name)
+        except OSError:
+            value = None
+        self.__cache[name] = value
+        return value
+
+    def _read(self, name):
+        return _read(join(self.path, name))
+
+    def _write(self, name, data):
+        _write(join(self.path, name), data)
+
+    # fresh skips the snapshot, for files that change on their own
+    def read(self, name, fresh=False):
+        if self.__cache is None:
+            self.snapshot()
+        if name in self.__cache and not fresh:
+            return self.__cache[name]
+        return self.__load(name)
+
+    def get(self, name):
+        value = self.read(name)
+        if value is None:
+            return None
+        return value.decode('ascii', errors='replace').strip()
+
+    def write(self, name, data):
+        if isinstance(data, str):
+            data = data.encode('ascii')
+        self.stats['writes'] += 1
+        try:
+            with self.tracer.span('securityfs.write', file=name, bytes=len(data)):
+                self._write(name, data)
+        finally:
+            self.invalidate(name)
+
+    # answers don't go through the snapshot
+    def channel(self, query, answer):
+        return Channel(join(self.path, query), join(self.path, answer))
+
+    def invalidate(self, name):
+        if self.__cache is None:
+            return
+        if name.rpartition('/')[2] == '.load':
+            d = dirname(name) + '/'
+            for k in [k for k in self.__cache if k.startswith(d)]:
+                del self.__cache[k]
+        else:
+            self.__cache.pop(name, None)
+
+
+# "emu:DIR" selects the emulation in sara.EmulatedSecurityFS, backed by
+# DIR, instead of the securityfs mounted at DIR.
+def open_securityfs(path, tracer=None):
+    if path.startswith(EMULATED):
+        from sara.EmulatedSecurityFS import EmulatedSecurityFS
+        return EmulatedSecurityFS.create(join(path[len(EMULATED):], 'sara'), tracer)
+    return SecurityFS(join(path, 'sara'), tracer)
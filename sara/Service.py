@@ -0,0 +1,349 @@
+"""
+    saractl - S.A.R.A.'s userspace utilities.
+    Copyright (C) 2017  Salvatore Mesoraca <s.mesoraca16@gmail.com>
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import asyncio
+import logging
+import signal
+import socket
+from json import dumps, loads
+from os import lstat, umask, unlink
+from stat import S_ISSOCK
+from struct import Struct, error as StructError
+from threading import Event
+
+from sara.DFA import Matcher
+from sara.SubModLoader import SubModLoader
+from sara.submodules import submodules
+from sara.submodules.BaseConfig import ConfigException
+
+SOCKET = '/run/saractl.sock'
+HEADER = Struct('!I')
+MAX_MESSAGE = 64 * 1024 * 1024
+
+
+class ServiceError(Exception):
+    pass
+
+
+# Messages are JSON objects preceded by their length as a 32 bit
+# big-endian integer.
+def encode(obj):
+    data = dumps(obj).encode('utf8')
+    if len(data) > MAX_MESSAGE:
+        raise ServiceError('message too big')
+    return HEADER.pack(len(data)) + data
+
+
+def decode(data):
+    try:
+        obj = loads(data.decode('utf8'))
+    except ValueError as e:
+        raise ServiceError('malformed message: {}'.format(e))
+    if not isinstance(obj, dict):
+        raise ServiceError('malformed message: not an object')
+    return obj
+
+
+async def read_message(reader):
+    size, = HEADER.unpack(await reader.readexactly(HEADER.size))
+    if size > MAX_MESSAGE:
+        raise ServiceError('message too big')
+    return decode(await reader.readexactly(size))
+
+
+def _matcher(binary):
+    if not binary:
+        return None
+    try:
+        return Matcher.from_binary(binary)
+    except (AssertionError, StructError):
+        return None
+
+
+# Everything compiled by a single reload. It's never modified after it
+# has been built, so requests can keep using the one they started with
+# while a new one is being compiled.
+class Policy(object):
+    def __init__(self, loader, loaded=None):
+        self.loader = loader
+        self.loaded = loaded
+        self.rules = {}
+        self.errors = {}
+        self.hashes = {}
+        self.matchers = {}
+        self.binaries = {}
+        for k, v in loader.config_objects().items():
+            if v is None:
+                continue
+            try:
+                binary = v.binary
+            except ConfigException as e:
+                self.errors[k] = str(e)
+                continue
+            self.hashes[k] = v.xhash
+            self.binaries[k] = binary
+            self.matchers[k] = _matcher(binary)
+            self.rules[k] = [path for path, _, _ in v.dicts.iter_tuples()]
+        self.kernel = loader.get_loaded_binaries()
+        self.kernel_matchers = {k: _matcher(v) for k, v in self.kernel.items()}
+        self.status = {'extras': loader.get_extras(),
+                       'default_values': loader.get_default_values()}
+
+    def matcher(self, submodule, policy):
+        if policy == 'config':
+            m = self.matchers.get(submodule)
+        elif policy == 'loaded':
+            m = self.kernel_matchers.get(submodule)
+        else:
+            raise ServiceError('unknown policy "{}"'.format(policy))
+        if m is None:
+            raise ServiceError('no {} policy for "{}"'.format(policy, submodule))
+        return m
+
+    @staticmethod
+    def match(matcher, paths):
+        # paths in the same directory share the walk up to it
+        states = {}
+        ret = []
+        for path in paths:
+            head, sep, name = path.rpartition('/')
+            head += sep
+            i = states.get(head)
+            if i is None:
+                i = states[head] = matcher.walk(head.encode('utf8', 'surrogateescape'))
+            ret.append(matcher.match(name.encode('utf8', 'surrogateescape'), i))
+        return ret
+
+    def diff(self, submodule, paths=None):
+        if paths is None:
+            paths = self.rules.get(submodule, [])
+        config = self.match(self.matcher(submodule, 'config'), paths)
+        kernel = self.kernel_matchers.get(submodule)
+        if kernel is None:
+            loaded = [None] * len(paths)
+        else:
+            loaded = self.match(kernel, paths)
+        return {'config_hash': self.hashes.get(submodule),
+                'loaded_hash': self.status['extras'][submodule]['hash'],
+                'identical': self.binaries.get(submodule) == self.kernel.get(submodule),
+                'changes': [[p, c, l] for p, c, l in zip(paths, config, loaded) if c != l]}
+
+
+# Resident process that keeps the compiled policy in memory and answers
+# queries over a Unix socket. Compiles run in an executor and the new
+# Policy replaces the old one in a single assignment.
+class Service(object):
+    def __init__(self, config_path, sysfs_path, socket_path=SOCKET, cache_dir=None):
+        self.config_path = config_path
+        self.sysfs_path = sysfs_path
+        self.socket_path = socket_path
+        self.cache_dir = cache_dir
+        self.policy = None
+        self.stats = {'requests': 0, 'reloads': 0, 'clients': 0}
+        self.loop = None
+        # set once the socket accepts connections
+        self.ready = Event()
+        self.__lock = None
+        self.__stop = None
+        self.__ops = {'status': self.op_status,
+                      'match': self.op_match,
+                      'reload': self.op_reload,
+                      'diff': self.op_diff,
+                      'xattr_encode': self.op_xattr_encode,
+                      'xattr_decode': self.op_xattr_decode}
+        self.__submodules = {sm.sysfs_name: sm for sm in submodules}
+
+    def build(self, load=False, force=False):
+        loader = SubModLoader(self.config_path, self.sysfs_path, self.cache_dir)
+        loaded = None
+        if load:
+            loaded = loader.load_config(force=force)
+        if not loaded:
+            loader.get_config_objects(lazy=True)
+        return Policy(loader, loaded)
+
+    async def reload(self, load=False, force=False):
+        async with self.__lock:
+            policy = await self.loop.run_in_executor(None, self.build, load, force)
+            self.policy = policy
+            self.stats['reloads'] += 1
+        return policy
+
+    def stop(self):
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self.__stop.set)
+
+    def run(self):
+        return asyncio.run(self.main())
+
+    async def main(self):
+        self.loop = asyncio.get_running_loop()
+        self.__lock = asyncio.Lock()
+        self.__stop = asyncio.Event()
+        await self.reload()
+        try:
+            if S_ISSOCK(lstat(self.socket_path).st_mode):
+                unlink(self.socket_path)
+        except OSError:
+            pass
+        # only root can talk to the service: it can load policies
+        mask = umask(0o077)
+        try:
+            server = await asyncio.start_unix_server(self.handle, path=self.socket_path)
+        finally:
+            umask(mask)
+        self.ready.set()
+        signals = []
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                self.loop.add_signal_handler(sig, self.__stop.set)
+            except (ValueError, RuntimeError):
+                continue
+            signals.append(sig)
+        logging.info('listening on "{}".'.format(self.socket_path))
+        try:
+            await self.__stop.wait()
+        finally:
+            for sig in signals:
+                self.loop.remove_signal_handler(sig)
+            self.ready.clear()
+            server.close()
+            await server.wait_closed()
+            try:
+                unlink(self.socket_path)
+            except OSError:
+                pass
+        return 0
+
+    async def handle(self, reader, writer):
+        self.stats['clients'] += 1
+        try:
+            while True:
+                try:
+                    request = await read_message(reader)
+                except asyncio.IncompleteReadError:
+                    break
+                except ServiceError as e:
+                    # the stream can't be trusted anymore
+                    writer.write(encode({'ok': False, 'error': str(e)}))
+                    break
+                writer.write(encode(await self.dispatch(request)))
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def dispatch(self, request):
+        self.stats['requests'] += 1
+        op = self.__ops.get(request.get('op'))
+        try:
+            if op is None:
+                raise ServiceError('unknown op "{}"'.format(request.get('op')))
+            ret = await op(self.policy, **request.get('args', {}))
+        except (ServiceError, ConfigException, LookupError, TypeError, ValueError) as e:
+            return {'ok': False, 'error': str(e)}
+        ret['ok'] = True
+        return ret
+
+    async def op_status(self, policy):
+        ret = dict(policy.status)
+        ret['hashes'] = policy.hashes
+        ret['errors'] = policy.errors
+        return ret
+
+    async def op_match(self, policy, paths, submodule='wxprot', policy_name='config'):
+        matcher = policy.matcher(submodule, policy_name)
+        flags = await self.loop.run_in_executor(None, policy.match, matcher, paths)
+        to_text = self.__submodules[submodule].Config.flags_to_text
+        return {'results': [[f, None if f is None else to_text(f)] for f in flags]}
+
+    async def op_reload(self, policy, load=False, force=False):
+        policy = await self.reload(load=load, force=force)
+        return {'loaded': policy.loaded,
+                'hashes': policy.hashes,
+                'errors': policy.errors}
+
+    async def op_diff(self, policy, submodule='wxprot', paths=None):
+        return await self.loop.run_in_executor(None, policy.diff, submodule, paths)
+
+    async def op_xattr_encode(self, policy, submodule, value, filename=None):
+        value = await self.loop.run_in_executor(None, policy.loader.xattr_encode,
+                                                submodule, value, filename)
+        return {'value': value}
+
+    async def op_xattr_decode(self, policy, xattr_name, value):
+        return {'value': policy.loader.xattr_decode(xattr_name, value)}
+
+
+class Client(object):
+    def __init__(self, path=SOCKET, timeout=None):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(timeout)
+        try:
+            self.sock.connect(path)
+        except OSError:
+            self.sock.close()
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.sock.close()
+
+    def __recv(self, size):
+        chunks = []
+        while size:
+            chunk = self.sock.recv(min(size, 1 << 20))
+            if not chunk:
+                raise ServiceError('connection closed')
+            chunks.append(chunk)
+            size -= len(chunk)
+        return b''.join(chunks)
+
+    def request(self, op, **args):
+        self.sock.sendall(encode({'op': op, 'args': args}))
+        size, = HEADER.unpack(self.__recv(HEADER.size))
+        ret = decode(self.__recv(size))
+        if not ret.pop('ok', False):
+            raise ServiceError(ret.get('error'))
+        return ret
+
+    def status(self):
+        return self.request('status')
+
+    def match(self, paths, submodule='wxprot', policy='config'):
+        return self.request('match', paths=list(paths), submodule=submodule,
+                            policy_name=policy)['results']
+
+    def reload(self, load=False, force=False):
+        return self.request('reload', load=load, force=force)
+
+    def diff(self, submodule='wxprot', paths=None):
+        return self.request('diff', submodule=submodule, paths=paths)
+
+    def xattr_encode(self, submodule, value, filename=None):
+        return self.request('xattr_encode', submodule=submodule, value=value,
+                            filename=filename)['value']
+
+    def xattr_decode(self, xattr_name, value):
+        return self.request('xattr_decode', xattr_name=xattr_name, value=value)['value']
@@ -21,22 +21,43 @@ from glob import iglob
 from hashlib import sha1
 from os.path import join, isdir, realpath
 from re import sub
-from shlex import quote, split
 
+from sara.SecurityFS import open_securityfs
+from sara.Tracer import tracer as default_tracer
+from sara.lexer import split_line
 from sara.submodules.BaseConfig import ConfigException
 from sara.submodules import submodules
 
 
+# Config lines that can be read more than once: a lazy config reads
+# them a first time for its hash and again only if it gets compiled.
+class ConfigSource(object):
+    def __init__(self, reader, *args):
+        self.reader = reader
+        self.args = args
+
+    def __iter__(self):
+        return iter(self.reader(*self.args))
+
+
 class SubModLoader(object):
-    def __init__(self, config_path, sysfs_path):
+    def __init__(self, config_path, sysfs_path, cache_dir=None, tracer=None, store_dir=None):
         self.config_path = config_path
-        self.sysfs_path = join(sysfs_path, 'sara')
+        self.cache_dir = cache_dir
+        self.tracer = tracer if tracer is not None else default_tracer
+        self.store = None
+        if store_dir is not None:
+            from sara.ArtifactStore import ArtifactStore
+            self.store = ArtifactStore(store_dir, self.tracer)
+        self.securityfs = open_securityfs(sysfs_path, self.tracer)
+        self.sysfs_path = self.securityfs.path
         if not isdir(self.sysfs_path):
             raise Exception('S.A.R.A. is not available at "{}".'.format(self.sysfs_path))
         self.main_options = {'sara_enabled': 0,
                              'sara_locked': 0}
         self.__submodules = []
         self.__config_objects = {}
+        self.__parse_caches = {}
         for sm in submodules:
             if not isdir(join(self.sysfs_path, sm.sysfs_name)):
                 continue
@@ -52,8 +73,10 @@ class SubModLoader(object):
             d['extra_files'] = sm.extra_files
             d['xattr_name'] = sm.xattr_name
             d['startup'] = sm.startup
+            d['feature_profile'] = sm.feature_profile
             d['config'] = sm.Config
             self.__submodules.append(d)
+        self.__main_defaults = dict(self.main_options)
 
     def get_submodules_names(self):
         return ['main'] + [s['config_name'] for s in self.__submodules]
@@ -75,18 +98,22 @@ class SubModLoader(object):
 
     @property
     def is_locked(self):
-        return bool(int(self.__get_flag('main', 'locked').strip()))
+        return bool(int(self.__get_flag('main', 'locked')))
 
     def call_startup(self):
         for d in self.__submodules:
             d['startup']()
 
-    def load_config(self, force=False, config=None, skip_main=False):
+    def load_config(self, force=False, config=None, skip_main=False, recheck=False):
+        with self.tracer.span('loader.load_config', force=force, recheck=recheck):
+            return self.__load_config(force, config, skip_main, recheck)
+
+    def __load_config(self, force, config, skip_main, recheck):
         if self.is_locked:
             logging.error('configuration is locked.')
             return False
         self.__load_main_config()
-        self.__load_config_objects(config)
+        self.__load_config_objects(config, lazy=True)
         if not skip_main:
             for k, v in self.main_options.items():
                 if k == 'sara_enabled':
@@ -103,15 +130,31 @@ class SubModLoader(object):
                     if v == 0:
                         self.disable(k[:-8])
         for k, v in self.__config_objects.items():
-            if not force:
-                if v.xhash == self.__get_flag(k, 'hash').strip():
+            with self.tracer.span('loader.submodule', submodule=k) as span:
+                uptodate = not force and v.xhash == self.__get_flag(k, 'hash')
+                span.set(hash=v.xhash, uptodate=uptodate)
+                # The text didn't change, but the files it names could have:
+                # a recheck compiles it again and compares the tables.
+                if uptodate and not recheck:
                     continue
-            lf = join(self.sysfs_path, k, '.load')
-            try:
-                with open(lf, 'wb') as fd:
-                    fd.write(v.binary)
-            except IOError:
-                pass
+                try:
+                    binary = None
+                    if not recheck:
+                        binary = self.__stored_binary(k, v)
+                    if binary is None:
+                        binary = v.binary
+                except ConfigException as e:
+                    logging.warning(e)
+                    continue
+                if uptodate and binary == self.__read_dump(k):
+                    continue
+                try:
+                    self.securityfs.write(join(k, '.load'), binary)
+                except IOError:
+                    pass
+                else:
+                    span.set(loaded=True)
+                    logging.info('{} config loaded ({}).'.format(k, v.xhash))
         if not skip_main:
             for k, v in self.main_options.items():
                 if k == 'sara_enabled':
@@ -140,6 +183,7 @@ class SubModLoader(object):
                     obj = None
                     logging.warning(e)
                 if obj:
+                    from shlex import quote, split
                     if filename is None:
                         filename = '/xattr '
                     else:
@@ -157,14 +201,49 @@ class SubModLoader(object):
     def xattr_names(self):
         return {sm['config_name']: sm['xattr_name'] for sm in self.__submodules}
 
-    def get_config_binaries(self, config=None, extras=None):
-        ret = {}
+    def watched_paths(self):
+        ret = []
+        for v in self.__config_objects.values():
+            if v is not None:
+                ret.extend(v.watched_paths())
+        return ret
+
+    def get_config_objects(self, config=None, extras=None, lazy=False):
         self.__load_main_config()
-        self.__load_config_objects(config, extras)
-        for k, v in self.__config_objects.items():
+        self.__load_config_objects(config, extras, lazy=lazy)
+        return self.config_objects()
+
+    # the objects used by the last load, without reading the config again
+    def config_objects(self):
+        return dict(self.__config_objects)
+
+    def get_config_binaries(self, config=None, extras=None, publish=False):
+        ret = {}
+        for k, v in self.get_config_objects(config, extras).items():
             ret[k] = v.binary
+            if publish and self.store is not None:
+                path = self.store.put(k, v.xhash, self.__feature_profile(k, v), ret[k])
+                logging.info('{} config published to "{}".'.format(k, path))
         return ret
 
+    def __feature_profile(self, name, config):
+        for d in self.__submodules:
+            if d['sysfs_name'] == name:
+                return d['feature_profile'](config.main_options, config.extra_files)
+
+    # A policy published by whoever compiled the same config for the
+    # same kernel features saves compiling it again.
+    def __stored_binary(self, name, config):
+        if self.store is None:
+            return None
+        binary = self.store.get(name, config.xhash, self.__feature_profile(name, config))
+        if binary is not None:
+            logging.debug('{} config found in the store.'.format(name))
+        return binary
+
+    def get_loaded_binaries(self):
+        return {d['sysfs_name']: self.__read_dump(d['sysfs_name']) for d in self.__submodules}
+
     def get_extras(self):
         ret = {'main': {}}
         for f in ('enabled', 'locked'):
@@ -201,10 +280,8 @@ class SubModLoader(object):
         for k, v in self.__config_objects.items():
             oldv[k] = (extras[k]['hash'], sha1(v.binary).digest())
         for k, v in self.__config_objects.items():
-            lf = join(self.sysfs_path, k, '.load')
             try:
-                with open(lf, 'wb') as fd:
-                    fd.write(v.binary)
+                self.securityfs.write(join(k, '.load'), v.binary)
             except IOError:
                 return False
         self.__load_config_objects_binary()
@@ -227,37 +304,22 @@ class SubModLoader(object):
         return True
 
     def __get_flag(self, subname, flag_name):
-        df = join(self.sysfs_path, subname, flag_name)
-        try:
-            with open(df, 'r', encoding='ascii') as fd:
-                return fd.read().strip()
-        except IOError:
-            return None
-        except FileNotFoundError:
-            return None
+        return self.securityfs.get(join(subname, flag_name))
 
     def __write_flag(self, subname, flag_name, value):
-        df = join(self.sysfs_path, subname, flag_name)
         try:
-            with open(df, 'w', encoding='ascii') as fd:
-                fd.write('{}\n'.format(value))
+            self.securityfs.write(join(subname, flag_name), '{}\n'.format(value))
         except IOError:
             pass
-        except PermissionError:
-            pass
 
-    def __load_config_objects(self, config=None, extras=None):
+    def __load_config_objects(self, config=None, extras=None, lazy=False):
         for d in self.__submodules:
             if config is not None and d['config_name'] in config:
-                cf = []
-                for line in config[d['config_name']].split('\n'):
-                    line = split(line, comments=True)
-                    if len(line):
-                        cf.append(('custom', line))
+                cf = ConfigSource(self.__parse_text, config[d['config_name']])
             elif config is not None:
                 continue
             else:
-                cf = self.__read_config(d['config_name'])
+                cf = ConfigSource(self.__read_config, d['config_name'])
             mopts = {k: v for k, v in self.main_options.items() if k in d['main_options']}
             exf = {}
             for f in d['extra_files']:
@@ -267,7 +329,9 @@ class SubModLoader(object):
             try:
                 obj = d['config'](config_lines=cf,
                                   main_options=mopts,
-                                  extra_files=exf)
+                                  extra_files=exf,
+                                  lazy=lazy,
+                                  tracer=self.tracer)
             except ConfigException as e:
                 obj = None
                 logging.warning(e)
@@ -279,12 +343,7 @@ class SubModLoader(object):
             if binaries is not None and d['sysfs_name'] in binaries:
                 binary = binaries[d['sysfs_name']]
             else:
-                bf = join(self.sysfs_path, d['sysfs_name'], '.dump')
-                try:
-                    with open(bf, 'rb') as fd:
-                        binary = fd.read()
-                except IOError:
-                    binary = b''
+                binary = self.__read_dump(d['sysfs_name'])
             mopts = {k: v for k, v in self.main_options.items() if k in d['main_options']}
             exf = {}
             for f in d['extra_files']:
@@ -292,14 +351,24 @@ class SubModLoader(object):
             try:
                 obj = d['config'](binary=binary,
                                   main_options=mopts,
-                                  extra_files=exf)
+                                  extra_files=exf,
+                                  tracer=self.tracer)
             except ConfigException as e:
                 obj = None
                 logging.warning(e)
             self.__config_objects[d['sysfs_name']] = obj
 
+    def __read_dump(self, subname):
+        return self.securityfs.read(join(subname, '.dump')) or b''
+
     def __load_main_config(self):
+        with self.tracer.span('loader.main_config'):
+            self.__read_main_config()
+
+    def __read_main_config(self):
         cf = join(self.config_path, 'main.conf')
+        self.main_options.clear()
+        self.main_options.update(self.__main_defaults)
         try:
             with open(cf, 'r', encoding='ascii') as fd:
                 for ln, line in enumerate(fd, 1):
@@ -317,21 +386,21 @@ class SubModLoader(object):
             pass
 
     def __read_config(self, config_name):
+        from sara.ParseCache import ParseCache
         cf = join(self.config_path, '{}.conf'.format(config_name))
         cd = join(self.config_path, '{}.conf.d'.format(config_name), '*.conf')
-        ret = self.__parse_file(cf)
-        for f in sorted(iglob(cd)):
-            ret += self.__parse_file(f)
-        return ret
+        pc = self.__parse_caches.get(config_name)
+        if pc is None:
+            cache = None
+            if self.cache_dir is not None:
+                cache = join(self.cache_dir, '{}.parse'.format(config_name))
+            pc = self.__parse_caches[config_name] = ParseCache(cache, tracer=self.tracer)
+        yield from pc.parse_files([cf] + sorted(iglob(cd)))
+        logging.debug('{} parse cache: {hits} hits, {misses} misses'.format(config_name, **pc.stats))
 
-    def __parse_file(self, cf):
-        ret = []
-        try:
-            with open(cf, 'r', encoding='utf8') as fd:
-                for ln, line in enumerate(fd, 1):
-                    line = split(line, comments=True)
-                    if line:
-                        ret.append(('{}:{}'.format(cf, ln), line))
-        except IOError:
-            pass
-        return ret
+    @staticmethod
+    def __parse_text(text):
+        for line in text.split('\n'):
+            line = split_line(line)
+            if len(line):
+                yield 'custom', line
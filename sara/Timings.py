@@ -0,0 +1,51 @@
+"""
+    saractl - S.A.R.A.'s userspace utilities.
+    Copyright (C) 2017  Salvatore Mesoraca <s.mesoraca16@gmail.com>
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from threading import Lock
+
+
+# Tracer sink that adds up the wall-clock time of the spans with the
+# same name, for --timings. Spans nest, so a phase includes the time
+# of the ones it calls, and the same phase can run in several threads
+# at once: its time is the sum.
+class Timings(object):
+    def __init__(self):
+        self.phases = {}
+        self.__lock = Lock()
+
+    def emit(self, span):
+        self.add(span.name, span.duration)
+
+    def add(self, name, seconds):
+        with self.__lock:
+            p = self.phases.get(name)
+            if p is None:
+                self.phases[name] = [1, seconds]
+            else:
+                p[0] += 1
+                p[1] += seconds
+
+    def reset(self):
+        with self.__lock:
+            self.phases.clear()
+
+    def report(self):
+        lines = ['{:>10} {:>8}  {}'.format('seconds', 'calls', 'phase')]
+        for name, (calls, seconds) in sorted(self.phases.items(), key=lambda i: -i[1][1]):
+            lines.append('{:>10.4f} {:>8}  {}'.format(seconds, calls, name))
+        return '\n'.join(lines)
@@ -0,0 +1,156 @@
+"""
+    saractl - S.A.R.A.'s userspace utilities.
+    Copyright (C) 2017  Salvatore Mesoraca <s.mesoraca16@gmail.com>
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from itertools import count
+from threading import Lock, current_thread, local
+from time import perf_counter, time
+
+
+class _NoopSpan(object):
+    __slots__ = ()
+    id = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def set(self, **attrs):
+        pass
+
+
+NOOP = _NoopSpan()
+
+
+class Span(object):
+    __slots__ = ('tracer', 'name', 'id', 'parent', 'thread', 'attrs', 'start', 'duration', 'error', '_t')
+
+    def __init__(self, tracer, name, parent, attrs):
+        self.tracer = tracer
+        self.name = name
+        self.id = next(tracer.ids)
+        self.parent = parent
+        self.attrs = attrs
+        self.thread = None
+        self.start = None
+        self.duration = None
+        self.error = None
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def __enter__(self):
+        stack = self.tracer.stack()
+        if self.parent is None:
+            self.parent = stack[-1].id if stack else None
+        else:
+            self.parent = self.parent.id
+        stack.append(self)
+        self.thread = current_thread().name
+        self.start = time()
+        self._t = perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration = perf_counter() - self._t
+        if exc_type is not None:
+            self.error = exc_type.__name__
+        self.tracer.stack().pop()
+        self.tracer.emit(self)
+        return False
+
+    def to_dict(self):
+        d = {'name': self.name,
+             'id': self.id,
+             'parent': self.parent,
+             'thread': self.thread,
+             'start': self.start,
+             'duration': self.duration,
+             'attrs': self.attrs}
+        if self.error is not None:
+            d['error'] = self.error
+        return d
+
+
+# Nested spans with attributes, handed to every sink when they end, so
+# children come before their parents. A span's parent is the innermost
+# open span of the same thread, work handed to another thread names it
+# explicitly. Without sinks a span is a shared object that does nothing.
+class Tracer(object):
+    def __init__(self, sinks=()):
+        self.sinks = list(sinks)
+        self.ids = count(1)
+        self.__local = local()
+
+    @property
+    def enabled(self):
+        return bool(self.sinks)
+
+    def span(self, name, parent=None, **attrs):
+        if not self.sinks:
+            return NOOP
+        return Span(self, name, parent, attrs)
+
+    def stack(self):
+        try:
+            return self.__local.stack
+        except AttributeError:
+            self.__local.stack = []
+            return self.__local.stack
+
+    def current(self):
+        if not self.sinks:
+            return None
+        stack = self.stack()
+        return stack[-1] if stack else None
+
+    def emit(self, span):
+        for sink in self.sinks:
+            sink.emit(span)
+
+
+# objects built without a tracer use this one, without sinks by default
+tracer = Tracer()
+
+
+class MemorySink(object):
+    def __init__(self):
+        self.spans = []
+
+    def emit(self, span):
+        self.spans.append(span)
+
+    def find(self, name):
+        return [s for s in self.spans if s.name == name]
+
+
+# One JSON object per span and per line. Attributes that JSON doesn't
+# know are written as strings.
+class JSONLinesSink(object):
+    def __init__(self, fd):
+        # json is slow to import, only pay for it when tracing
+        from json import dumps
+        self.dumps = dumps
+        self.fd = fd
+        self.__lock = Lock()
+
+    def emit(self, span):
+        line = self.dumps(span.to_dict(), sort_keys=True, default=str) + '\n'
+        with self.__lock:
+            self.fd.write(line)
@@ -0,0 +1,260 @@
+"""
+    saractl - S.A.R.A.'s userspace utilities.
+    Copyright (C) 2017  Salvatore Mesoraca <s.mesoraca16@gmail.com>
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+
+from errno import EPIPE
+from heapq import heappop, heappush
+from os import O_NONBLOCK, O_RDONLY, close, open as os_open, read
+from re import compile as re_compile
+from select import select
+
+from sara.submodules import wxprot
+
+
+KMSG = '/dev/kmsg'
+VIOLATION = re_compile(r"WXP: (?P<msg>.*?) in '(?P<path>.*)' \((?P<pid>\d+)\)\.?\s*$")
+SUPPRESSED = re_compile(r'(?P<count>\d+) callbacks suppressed')
+KMSG_LINE = re_compile(r'^\d+,\d+,(?P<ts>\d+),[^;]*;(?P<msg>.*)$')
+PLAIN_TS = re_compile(r'\[\s*(?P<ts>\d+\.\d+)\]')
+
+# violation type: (keywords in the kernel message, flags to drop)
+TYPES = (('wxorx', ('W^X', 'W+X', 'WXORX'),
+          wxprot.SARA_WXP_WXORX | wxprot.SARA_WXP_MPROTECT |
+          wxprot.SARA_WXP_MMAP | wxprot.SARA_WXP_EMUTRAMP),
+         ('stack', ('stack',), wxprot.SARA_WXP_STACK),
+         ('heap', ('heap',), wxprot.SARA_WXP_HEAP),
+         ('mmap', ('mmap',), wxprot.SARA_WXP_MMAP),
+         ('other', (), wxprot.SARA_WXP_OTHER | wxprot.SARA_WXP_MMAP))
+TYPES_MASKS = {t: m for t, _, m in TYPES}
+
+
+def violation_type(msg):
+    for t, keywords, _ in TYPES:
+        if any(k in msg for k in keywords):
+            return t
+    return 'other'
+
+
+def suggest_flags(flags, types):
+    for t in types:
+        flags &= ~TYPES_MASKS[t]
+    if flags & wxprot.SARA_WXP_MPROTECT != wxprot.SARA_WXP_MPROTECT:
+        flags &= ~wxprot.SARA_WXP_EMUTRAMP
+    if not flags & (wxprot.SARA_WXP_MPROTECT |
+                    wxprot.SARA_WXP_WXORX |
+                    wxprot.SARA_WXP_MMAP):
+        flags &= ~(wxprot.SARA_WXP_COMPLAIN | wxprot.SARA_WXP_VERBOSE)
+    return flags
+
+
+# Each parser yields (timestamp in seconds or None, message).
+
+def parse_plain(lines):
+    for line in lines:
+        if isinstance(line, bytes):
+            line = line.decode('utf8', 'replace')
+        m = PLAIN_TS.search(line)
+        yield (float(m.group('ts')) if m else None), line.rstrip('\n')
+
+
+def parse_kmsg(records):
+    for r in records:
+        if isinstance(r, bytes):
+            r = r.decode('utf8', 'replace')
+        # continuation lines start with a space
+        m = KMSG_LINE.match(r.split('\n', 1)[0])
+        if m is not None:
+            yield int(m.group('ts')) / 1000000, m.group('msg')
+
+
+def parse_journal(fd):
+    ts = None
+    msg = None
+    while True:
+        line = fd.readline()
+        if not line or line == b'\n':
+            if msg is not None:
+                yield ts, msg
+            ts = msg = None
+            if not line:
+                return
+            continue
+        line = line.rstrip(b'\n')
+        if b'=' in line:
+            key, _, value = line.partition(b'=')
+        else:
+            # binary safe field: little endian 64 bit size and raw data
+            key = line
+            size = int.from_bytes(fd.read(8), 'little')
+            value = fd.read(size)
+            fd.read(1)
+        if key == b'MESSAGE':
+            msg = value.decode('utf8', 'replace')
+        elif key == b'__REALTIME_TIMESTAMP':
+            ts = int(value) / 1000000
+
+
+def read_kmsg(path=KMSG, follow=False):
+    fd = os_open(path, O_RDONLY | O_NONBLOCK)
+    try:
+        while True:
+            try:
+                r = read(fd, 8192)
+            except BlockingIOError:
+                if not follow:
+                    return
+                select([fd], [], [])
+                continue
+            except OSError as e:
+                # the oldest records have been overwritten
+                if e.errno == EPIPE:
+                    continue
+                raise
+            if not r:
+                return
+            yield r
+    finally:
+        close(fd)
+
+
+def detect_format(head):
+    if KMSG_LINE.match(head.decode('utf8', 'replace')):
+        return 'kmsg'
+    if head.startswith((b'__CURSOR=', b'__REALTIME_TIMESTAMP=', b'MESSAGE=')):
+        return 'journal'
+    return 'plain'
+
+
+def messages(path, fmt='auto', follow=False):
+    if path == KMSG:
+        yield from parse_kmsg(read_kmsg(path, follow))
+        return
+    with open(path, 'rb') as fd:
+        if fmt == 'auto':
+            fmt = detect_format(fd.peek(256)[:256].split(b'\n', 1)[0])
+        if fmt == 'kmsg':
+            yield from parse_kmsg(fd)
+        elif fmt == 'journal':
+            yield from parse_journal(fd)
+        else:
+            yield from parse_plain(fd)
+
+
+# Space-Saving heavy hitters: at most 'capacity' counters are kept, a new
+# key replaces the smallest one and inherits its count as error bound.
+class SpaceSaving(object):
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.counters = {}
+        self.__heap = []
+
+    def add(self, key, n=1):
+        c = self.counters.get(key)
+        if c is not None:
+            c[0] += n
+            return
+        if len(self.counters) < self.capacity:
+            self.counters[key] = [n, 0]
+            heappush(self.__heap, (n, key))
+            return
+        while True:
+            count, old = heappop(self.__heap)
+            c = self.counters.get(old)
+            if c is not None and c[0] == count:
+                break
+            if c is not None:
+                heappush(self.__heap, (c[0], old))
+        del self.counters[old]
+        self.counters[key] = [count + n, count]
+        heappush(self.__heap, (count + n, key))
+
+    def top(self, k):
+        return sorted(((key, c[0], c[1]) for key, c in self.counters.items()),
+                      key=lambda x: (-x[1], x[0]))[:k]
+
+
+class ViolationAggregator(object):
+    def __init__(self, capacity=1024):
+        self.counters = SpaceSaving(capacity)
+        self.total = 0
+        self.suppressed = 0
+        self.first = None
+        self.last = None
+        self.peak = 0
+        self.__minute = None
+        self.__minute_count = 0
+
+    def add(self, ts, msg):
+        m = VIOLATION.search(msg)
+        if m is None:
+            m = SUPPRESSED.search(msg)
+            if m is not None:
+                self.suppressed += int(m.group('count'))
+            return False
+        self.total += 1
+        self.counters.add((m.group('path'), violation_type(m.group('msg'))))
+        if ts is not None:
+            if self.first is None:
+                self.first = ts
+            self.last = ts
+            minute = int(ts // 60)
+            if minute != self.__minute:
+                self.__minute = minute
+                self.__minute_count = 0
+            self.__minute_count += 1
+            self.peak = max(self.peak, self.__minute_count)
+        return True
+
+    def feed(self, messages):
+        for ts, msg in messages:
+            self.add(ts, msg)
+        return self
+
+    @property
+    def duration(self):
+        if self.first is None:
+            return None
+        return self.last - self.first
+
+    def rate(self, count=None):
+        if count is None:
+            count = self.total
+        if not self.duration:
+            return None
+        return count / self.duration
+
+    def top(self, k=10):
+        return self.counters.top(k)
+
+    # Paths of the top violations with the flags that would have
+    # allowed them, starting from the current ones.
+    def suggestions(self, k=10, current=None):
+        types = {}
+        for (path, t), _, _ in self.top(k):
+            types.setdefault(path, set()).add(t)
+        ret = []
+        for path in sorted(types):
+            flags = wxprot.SARA_WXP_FULL
+            if current is not None:
+                flags = current(path)
+                if flags is None:
+                    flags = wxprot.SARA_WXP_FULL
+            new = suggest_flags(flags, sorted(types[path]))
+            if new != flags:
+                ret.append((path, flags, new))
+        return ret
@@ -0,0 +1,309 @@
+"""
+    saractl - S.A.R.A.'s userspace utilities.
+    Copyright (C) 2017  Salvatore Mesoraca <s.mesoraca16@gmail.com>
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import asyncio
+import logging
+import signal
+from ctypes import CDLL, c_char_p, c_int, c_uint32, get_errno
+from ctypes.util import find_library
+from glob import iglob
+from os import close, fsdecode, fsencode, lstat, read, scandir, strerror
+from os.path import basename, dirname, join, realpath
+from stat import S_ISDIR
+from struct import Struct
+
+from sara.submodules.BaseConfig import ConfigException
+
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+IN_MASK = IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | \
+    IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR
+EVENT = Struct('iIII')
+
+CONFIG = 1
+BINARY = 2
+
+
+# Both backends watch directories, not files: package managers and
+# editors replace files by renaming new ones over them.
+# The callback gets the directory and the name of the entry that
+# changed, None means that anything could have changed.
+class Inotify(object):
+    def __init__(self, callback):
+        libc = CDLL(find_library('c'), use_errno=True)
+        self.__add = libc.inotify_add_watch
+        self.__add.argtypes = (c_int, c_char_p, c_uint32)
+        self.__rm = libc.inotify_rm_watch
+        self.__rm.argtypes = (c_int, c_int)
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(get_errno(), strerror(get_errno()))
+        self.callback = callback
+        self.loop = None
+        self.__wds = {}
+        self.__dirs = {}
+
+    def start(self, loop):
+        self.loop = loop
+        loop.add_reader(self.fd, self.__read)
+
+    def close(self):
+        if self.loop is not None:
+            self.loop.remove_reader(self.fd)
+        close(self.fd)
+
+    def watch(self, dirs):
+        for d in set(self.__dirs) - set(dirs):
+            wd = self.__dirs.pop(d)
+            self.__wds[wd].discard(d)
+            if not self.__wds[wd]:
+                del self.__wds[wd]
+                self.__rm(self.fd, wd)
+        for d in dirs:
+            if d in self.__dirs:
+                continue
+            wd = self.__add(self.fd, fsencode(d), IN_MASK)
+            if wd < 0:
+                logging.debug("can't watch '{}': {}".format(d, strerror(get_errno())))
+                continue
+            self.__dirs[d] = wd
+            self.__wds.setdefault(wd, set()).add(d)
+
+    def __read(self):
+        try:
+            data = read(self.fd, 65536)
+        except BlockingIOError:
+            return
+        i = 0
+        while i + EVENT.size <= len(data):
+            wd, mask, _, size = EVENT.unpack_from(data, i)
+            i += EVENT.size
+            name = data[i:i + size].rstrip(b'\0')
+            i += size
+            if mask & IN_Q_OVERFLOW:
+                self.callback(None, None)
+                continue
+            dirs = self.__wds.get(wd, ())
+            if mask & IN_IGNORED:
+                # the directory is gone, it's re-added on the next reload
+                self.__wds.pop(wd, None)
+                for d in dirs:
+                    self.__dirs.pop(d, None)
+            for d in dirs:
+                self.callback(d, fsdecode(name) if name else None)
+
+
+class Poller(object):
+    def __init__(self, callback, interval=2.0):
+        self.callback = callback
+        self.interval = interval
+        self.task = None
+        self.__dirs = {}
+        self.__state = {}
+
+    def start(self, loop):
+        self.task = loop.create_task(self.__run())
+
+    def close(self):
+        if self.task is not None:
+            self.task.cancel()
+
+    def watch(self, dirs):
+        self.__dirs = dict(dirs)
+        self.__state = {d: self.__state.get(d) or self.__snapshot(d, names)
+                        for d, names in self.__dirs.items()}
+
+    @staticmethod
+    def __stat(path):
+        try:
+            st = lstat(path)
+        except OSError:
+            return None
+        # like inotify, don't report what happens inside subdirectories
+        if S_ISDIR(st.st_mode):
+            return st.st_ino, st.st_mode
+        return st.st_ino, st.st_mode, st.st_size, st.st_mtime_ns, st.st_ctime_ns
+
+    @classmethod
+    def __snapshot(cls, d, names):
+        if names is not None:
+            return {n: cls.__stat(join(d, n)) for n in names}
+        try:
+            return {e.name: cls.__stat(e.path) for e in scandir(d)}
+        except OSError:
+            return {}
+
+    async def __run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            for d, names in self.__dirs.items():
+                old = self.__state.get(d, {})
+                new = self.__state[d] = self.__snapshot(d, names)
+                for n in set(old) | set(new):
+                    if old.get(n) != new.get(n):
+                        self.callback(d, n)
+
+
+# Keeps the loaded policy in sync with the config files and with the
+# binaries named by exact rules. Bursts of events are merged: a reload
+# starts once nothing happened for `debounce` seconds, or `max_delay`
+# seconds after the first event at most.
+# Reloads go through the same SubModLoader every time, so tokenized
+# files and ELF metadata are reused, and a reload only writes a policy
+# whose hash or tables changed.
+class Watcher(object):
+    def __init__(self, loader, debounce=1.0, max_delay=30.0, poll=False, interval=2.0):
+        self.loader = loader
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.poll = poll
+        self.interval = interval
+        self.config_dir = realpath(loader.config_path)
+        self.stats = {'events': 0, 'reloads': 0}
+        self.pending = 0
+        self.__conf_d = set()
+        self.__files = {}
+        self.__dirs = None
+        self.__first = None
+        self.__last = None
+        self.__wake = None
+        self.__stopped = False
+
+    def classify(self, d, name):
+        if d is None:
+            return CONFIG | BINARY
+        kind = 0
+        if d == self.config_dir:
+            if name is None or name.endswith(('.conf', '.conf.d')):
+                kind |= CONFIG
+        elif d in self.__conf_d:
+            if name is None or name.endswith('.conf'):
+                kind |= CONFIG
+        names = self.__files.get(d)
+        if names is not None and (name is None or name in names):
+            kind |= BINARY
+        return kind
+
+    def notify(self, d, name):
+        kind = self.classify(d, name)
+        if not kind:
+            return
+        self.stats['events'] += 1
+        self.__last = asyncio.get_running_loop().time()
+        if not self.pending:
+            self.__first = self.__last
+        self.pending |= kind
+        self.__wake.set()
+
+    def stop(self):
+        self.__stopped = True
+        if self.__wake is not None:
+            self.__wake.set()
+
+    def reload(self, kind):
+        logging.info('reloading: {} changed.'.format(
+            ' and '.join(n for k, n in ((CONFIG, 'config'), (BINARY, 'binaries')) if kind & k)))
+        try:
+            # someone else could have changed the kernel state meanwhile
+            self.loader.securityfs.snapshot()
+            if not self.loader.load_config(recheck=bool(kind & BINARY)):
+                logging.error('config load failed.')
+            self.__dirs = self.watch_set()
+        except (ValueError, ConfigException, OSError) as e:
+            # a broken edit mustn't stop the watch: the next one can fix it
+            logging.error('config load failed: {}'.format(e))
+            if self.__dirs is None:
+                self.__dirs = {d: None for d in {self.config_dir} | self.__conf_d}
+        return self.__dirs
+
+    def watch_set(self):
+        self.__conf_d = {realpath(d) for d in iglob(join(self.config_dir, '*.conf.d'))}
+        files = {}
+        for path in self.loader.watched_paths():
+            for p in {path, realpath(path)}:
+                name = basename(p)
+                if name:
+                    files.setdefault(realpath(dirname(p)), set()).add(name)
+        self.__files = files
+        dirs = {d: set(names) for d, names in files.items()}
+        for d in {self.config_dir} | self.__conf_d:
+            dirs[d] = None
+        return dirs
+
+    def backend(self):
+        if not self.poll:
+            try:
+                return Inotify(self.notify)
+            except (OSError, AttributeError) as e:
+                logging.warning('inotify not available ({}), polling every {}s.'.format(e, self.interval))
+        return Poller(self.notify, self.interval)
+
+    def run(self):
+        return asyncio.run(self.main())
+
+    async def main(self):
+        loop = asyncio.get_running_loop()
+        self.__wake = asyncio.Event()
+        self.__stopped = False
+        backend = self.backend()
+        signals = []
+        for sig, handler in ((signal.SIGINT, self.stop),
+                             (signal.SIGTERM, self.stop),
+                             (signal.SIGHUP, lambda: self.notify(None, None))):
+            try:
+                loop.add_signal_handler(sig, handler)
+            except (ValueError, RuntimeError):
+                continue
+            signals.append(sig)
+        backend.start(loop)
+        try:
+            kind = CONFIG
+            while not self.__stopped:
+                backend.watch(await loop.run_in_executor(None, self.reload, kind))
+                self.stats['reloads'] += 1
+                kind = await self.__next()
+        finally:
+            backend.close()
+            for sig in signals:
+                loop.remove_signal_handler(sig)
+        return 0
+
+    async def __next(self):
+        loop = asyncio.get_running_loop()
+        while not self.__stopped:
+            await self.__wake.wait()
+            self.__wake.clear()
+            while self.pending and not self.__stopped:
+                delay = min(self.__last + self.debounce,
+                            self.__first + self.max_delay) - loop.time()
+                if delay <= 0:
+                    kind, self.pending = self.pending, 0
+                    return kind
+                await asyncio.sleep(delay)
+        return 0
@@ -16,5 +16,12 @@
     along with this program.  If not, see <http://www.gnu.org/licenses/>.
 """
 
-import sara.Sara
-import sara.main
+from importlib import import_module
+
+
+# Submodules are imported on first use: importing the package (and so
+# any of its modules) must stay cheap for short-lived commands.
+def __getattr__(name):
+    if name in ('Sara', 'main'):
+        return import_module('sara.' + name)
+    raise AttributeError("module 'sara' has no attribute '{}'".format(name))
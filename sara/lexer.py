@@ -0,0 +1,37 @@
+"""
+    saractl - S.A.R.A.'s userspace utilities.
+    Copyright (C) 2017  Salvatore Mesoraca <s.mesoraca16@gmail.com>
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+
+from re import compile as re_compile
+
+
+# Characters that make str.split() disagree with shlex: quotes, escapes
+# and the whitespace characters that shlex doesn't consider as such.
+SLOW_PATH = re_compile('[\'"\\\\\x0b\x0c\x1c-\x1f\x85\xa0\u1680\u2000-\u200a'
+                       '\u2028\u2029\u202f\u205f\u3000]')
+
+
+# Same tokens as shlex.split(line, comments=True), but lines without
+# quotes or escapes (almost all of them) never reach shlex.
+def split_line(line):
+    head, sep, tail = line.partition('#')
+    if SLOW_PATH.search(head) is not None or \
+       (sep and '\n' in tail.rstrip('\n')):
+        from shlex import split
+        return split(line, comments=True)
+    return head.split()
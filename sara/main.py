@@ -27,7 +27,7 @@ def _main(argv):
         cli = CLI_xattr(argv)
     else:
         cli = CLI(argv)
-    return cli.do_cmd()
+    return cli.run()
 
 def main():
     return _main(argv)
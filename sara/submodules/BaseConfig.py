@@ -18,9 +18,12 @@
 
 import logging
 from abc import ABC, abstractmethod
+from collections.abc import Iterator
 from hashlib import sha1
 from operator import itemgetter
 
+from sara.Tracer import tracer as default_tracer
+
 
 class ConfigException(Exception):
     ERR_FMT = "generic error at line '{location}': {description}."
@@ -45,6 +48,20 @@ class BinaryException(Exception):
         return self.ERR_FMT.format(description=self.description)
 
 
+class Location(object):
+    __slots__ = ('file', 'line')
+
+    def __init__(self, file, line):
+        self.file = file
+        self.line = line
+
+    def __str__(self):
+        return '{}:{}'.format(self.file, self.line)
+
+    def __format__(self, spec):
+        return format(str(self), spec)
+
+
 class BaseConfig(ABC):
     WARN = "config have been simplified"
 
@@ -53,7 +70,10 @@ class BaseConfig(ABC):
                  binary=None,
                  xattr=False,
                  main_options=None,
-                 extra_files=None):
+                 extra_files=None,
+                 lazy=False,
+                 tracer=None):
+        self.tracer = tracer if tracer is not None else default_tracer
         if not xattr:
             assert config_lines is None or binary is None
             assert config_lines is not None or binary is not None
@@ -67,21 +87,52 @@ class BaseConfig(ABC):
             self.extra_files = extra_files
         self.dicts = []
         self._binary = b''
+        self._digest = None
+        self._compiled = True
         self.config_lines = []
         if not xattr:
             if config_lines is not None:
-                self.config_lines = config_lines
-                self.build_dicts_from_config_lines()
-                if self.extra_dicts_stuff():
-                    logging.warning(self.WARN)
-                self.build_binary()
+                # Config lines coming from a re-iterable source (e.g. a
+                # ConfigSource) are read again whenever needed and never
+                # kept. A one-shot iterator would be empty the second
+                # time, e.g. when the hash is read before compiling.
+                if isinstance(config_lines, Iterator):
+                    config_lines = list(config_lines)
+                if isinstance(config_lines, list):
+                    self.config_lines = config_lines
+                else:
+                    self.config_lines = None
+                self._config_source = config_lines
+                self._compiled = False
+                # A lazy config is compiled only when its binary is
+                # needed, its hash just needs the tokenized lines.
+                if not lazy:
+                    self.compile()
             else:
                 self._binary = binary
                 self.build_dicts_from_binary()
                 self.build_config_lines()
 
+    def compile(self):
+        if self._compiled:
+            return
+        self._compiled = True
+        with self.tracer.span('config.compile'):
+            self.build_dicts_from_config_lines()
+            if self.extra_dicts_stuff():
+                logging.warning(self.WARN)
+            self.build_binary()
+
     def __hash(self):
-        return sha1(self.config.encode('utf8'))
+        if self._digest is None:
+            h = sha1()
+            lines = self.config_lines
+            if lines is None:
+                lines = self._config_source
+            for _, line in lines:
+                h.update((' '.join(line) + '\n').encode('utf8'))
+            self._digest = h
+        return self._digest.copy()
 
     @property
     def xhash(self):
@@ -93,14 +144,29 @@ class BaseConfig(ABC):
 
     @property
     def binary(self):
+        self.compile()
         return self._binary
 
     @property
     def config(self):
+        if self.config_lines is None:
+            return None
         g = itemgetter(1)
         return ''.join(
             [' '.join(g(l)) + '\n' for l in self.config_lines])
 
+    def iter_config_lines(self):
+        h = sha1()
+        for location, line in self._config_source:
+            h.update((' '.join(line) + '\n').encode('utf8'))
+            yield location, line
+        self._digest = h
+
+    # Files, other than the config itself, whose changes can alter the
+    # compiled binary.
+    def watched_paths(self):
+        return []
+
     @abstractmethod
     def build_dicts_from_config_lines(self):
         pass
@@ -0,0 +1,99 @@
+"""
+    saractl - S.A.R.A.'s userspace utilities.
+    Copyright (C) 2017  Salvatore Mesoraca <s.mesoraca16@gmail.com>
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from array import array
+
+
+class Rule(object):
+    __slots__ = ('path', 'exact', 'flags')
+
+    def __init__(self, path, exact, flags):
+        self.path = path
+        self.exact = exact
+        self.flags = flags
+
+    def __getitem__(self, key):
+        return getattr(self, key)
+
+    def __eq__(self, other):
+        return self.path == other['path'] and \
+            self.exact == other['exact'] and \
+            self.flags == other['flags']
+
+    def __repr__(self):
+        return 'Rule({!r}, {!r}, {!r})'.format(self.path, self.exact, self.flags)
+
+
+# Columnar storage for path rules: directories are stored only once and
+# every rule keeps just its basename, its flags and its exact bit.
+class RuleStore(object):
+    def __init__(self):
+        self.__dirs = []
+        self.__dirs_ids = {}
+        self.__dir = array('I')
+        self.__names = []
+        self.__flags = array('I')
+        self.__exact = bytearray()
+        self.__index = {}
+
+    def add(self, path, exact, flags):
+        head, sep, name = path.rpartition('/')
+        head += sep
+        i = self.__dirs_ids.get(head)
+        if i is None:
+            i = self.__dirs_ids[head] = len(self.__dirs)
+            self.__dirs.append(head)
+        key = i * 2 + int(exact)
+        keys = self.__index.get(name)
+        if keys is None:
+            self.__index[name] = key
+        elif keys == key or (isinstance(keys, set) and key in keys):
+            return False
+        elif isinstance(keys, set):
+            keys.add(key)
+        else:
+            self.__index[name] = {keys, key}
+        self.__dir.append(i)
+        self.__names.append(name)
+        self.__flags.append(flags)
+        self.__exact.append(int(exact))
+        return True
+
+    def seal(self):
+        self.__index = {}
+
+    def __len__(self):
+        return len(self.__names)
+
+    def __getitem__(self, i):
+        return Rule(self.__dirs[self.__dir[i]] + self.__names[i],
+                    bool(self.__exact[i]),
+                    self.__flags[i])
+
+    def __iter__(self):
+        for path, flags, exact in self.iter_tuples():
+            yield Rule(path, exact, flags)
+
+    def __eq__(self, other):
+        return len(self) == len(other) and \
+            all(a == b for a, b in zip(self, other))
+
+    def iter_tuples(self):
+        dirs = self.__dirs
+        for d, name, flags, exact in zip(self.__dir, self.__names, self.__flags, self.__exact):
+            yield dirs[d] + name, flags, bool(exact)
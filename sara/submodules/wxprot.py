@@ -16,29 +16,32 @@
     along with this program.  If not, see <http://www.gnu.org/licenses/>.
 """
 
+from collections import deque
 from functools import total_ordering
+from os import cpu_count
 from os.path import isfile, islink, realpath
 from struct import pack, unpack
-from re import sub
+from re import compile as re_compile
 
 import logging
 
-try:
-    from elftools.elf.elffile import ELFFile
-    from elftools.elf.descriptions import describe_p_type, describe_p_flags
-    from elftools.common.exceptions import ELFError
-except ImportError:
-    ELFFile = None
-
-from sara.DFA import DFA
 from sara.submodules.BaseConfig import BaseConfig, ConfigException, BinaryException
+from sara.submodules.RuleStore import RuleStore
+from sara.Tracer import tracer as default_tracer
 
+# The ELF parser, the path resolver, the scanner and the thread pools
+# are imported by the functions that use them: listing the submodules
+# must stay cheap.
 
 config_name = 'wxprot'
 long_name = 'WX Protection'
 sysfs_name = config_name
 default_value = 'default_flags'
-main_options = [('wxprot_emutramp_missing_default', 'MPROTECT')]
+main_options = [('wxprot_emutramp_missing_default', 'MPROTECT'),
+                ('wxprot_parse_jobs', 0),
+                ('wxprot_parse_pool', 'thread'),
+                ('wxprot_check_prefix_rules', 0),
+                ('wxprot_check_prefix_timeout', 10)]
 extra_files = ['emutramp_available', 'xattr_enabled', 'xattr_user_allowed']
 xattr_name = 'wxp'
 
@@ -47,6 +50,16 @@ def startup():
     pass
 
 
+# What, besides the config, the compiled policy depends on.
+def feature_profile(main_options, extra_files):
+    from sara.DFA import SARA_DFA_VERSION
+    emuavail = extra_files.get('emutramp_available')
+    emudef = main_options.get('wxprot_emutramp_missing_default')
+    return {'dfa_version': SARA_DFA_VERSION,
+            'emutramp_available': int(not (emuavail is None or emuavail.strip() == '0')),
+            'emutramp_missing_default': str(emudef or 'MPROTECT').strip().upper()}
+
+
 class WXPConfigException(ConfigException):
     ERR_FMT = "WX protection confinguration error at line '{location}': {description}."
 
@@ -74,6 +87,178 @@ SARA_WXP_ALL = SARA_WXP_FULL | \
                SARA_WXP_TRANSFER
 
 
+# parent is the span of the rule, when this runs in another thread
+def check_rule(path, exact, flags, resolver=None, graph=None, tracer=default_tracer, parent=None):
+    warnings = []
+    error = None
+    if resolver is not None:
+        islink_, realpath_ = resolver.islink, resolver.realpath
+    else:
+        islink_, realpath_ = islink, realpath
+    if len(path) > 0:
+        with tracer.span('wxprot.realpath', parent, path=path):
+            if islink_(path):
+                warnings.append("'{}' is a symlink, its target will be used.".format(path))
+            if path[-1] == '/' and len(path) > 1:
+                path = realpath_(path) + '/'
+            else:
+                path = realpath_(path)
+    if exact and isfile(path) and not flags & SARA_WXP_COMPLAIN:
+        from sara.ELF import elf_cache
+        with tracer.span('wxprot.elf', parent, path=path) as span:
+            info, hit = elf_cache.lookup(path)
+            span.set(cache='hit' if hit else 'miss', elf=info is not None)
+            if info is not None:
+                error = elf_incompatibility(path, info, flags, graph)
+                if error is None:
+                    warning = elf_warning(info, flags)
+                    if warning is not None:
+                        warnings.append("'{}' {}".format(path, warning))
+    return path, warnings, error
+
+
+def elf_incompatibility(path, info, flags, graph=None):
+    if flags & SARA_WXP_WXORX and \
+       not (flags & SARA_WXP_EMUTRAMP):
+        if info.execstack:
+            return "WXORX protection is incompaible with GNU executable stack marking. Did you forget EMUTRAMP?"
+        if graph is None:
+            from sara.ELF import LibraryGraph
+            graph = LibraryGraph()
+        lib = graph.execstack_library(path, info)
+        if lib is not None:
+            return "WXORX protection is incompatible with '{}', a shared library with " \
+                   "GNU executable stack marking. Did you forget EMUTRAMP?".format(lib)
+    if flags & SARA_WXP_MMAP and not info.relro:
+        return "MMAP restriction is incompaible with binaries missing a RELRO section."
+    if flags & SARA_WXP_MMAP and info.dlopen:
+        return "MMAP restriction is incompaible with binaries using dlopen(3)."
+    return None
+
+
+def check_elf(path, flags, graph=None):
+    from sara.ELF import elf_info
+    info = elf_info(path)
+    if info is None:
+        return None
+    return elf_incompatibility(path, info, flags, graph)
+
+
+def elf_warning(info, flags):
+    if not flags & (SARA_WXP_WXORX | SARA_WXP_OTHER):
+        return None
+    jit = info.jit + tuple(sorted(info.imports & {'mprotect', 'pkey_mprotect'}))
+    if jit:
+        return "may generate code at runtime ({}), WXORX protection could break it.".format(', '.join(jit))
+    return None
+
+
+_worker_resolver = None
+_worker_graph = None
+
+
+def check_rule_in_worker(path, exact, flags):
+    global _worker_resolver, _worker_graph
+    if _worker_resolver is None:
+        from sara.ELF import LibraryGraph
+        from sara.PathResolver import PathResolver
+        _worker_resolver = PathResolver()
+        _worker_graph = LibraryGraph()
+    return check_rule(path, exact, flags, _worker_resolver, _worker_graph)
+
+
+class FlagCompiler(object):
+    ALLOWED_FLAGS = frozenset(('FULL',
+                               'VERBOSE',
+                               'WXORX',
+                               'STACK',
+                               'HEAP',
+                               'COMPLAIN',
+                               'OTHER',
+                               'MPROTECT',
+                               'EMUTRAMP',
+                               'EMUTRAMP_OR_MPROTECT',
+                               'EMUTRAMP_OR_NONE',
+                               'TRANSFER',
+                               'MMAP',
+                               'NONE'))
+    EMUTRAMP_FLAGS = frozenset(('EMUTRAMP',
+                                'EMUTRAMP_OR_MPROTECT',
+                                'EMUTRAMP_OR_NONE'))
+    FLAGS_VALUES = {'FULL': SARA_WXP_FULL,
+                    'VERBOSE': SARA_WXP_VERBOSE,
+                    'WXORX': SARA_WXP_WXORX,
+                    'STACK': SARA_WXP_STACK | SARA_WXP_WXORX,
+                    'HEAP': SARA_WXP_HEAP | SARA_WXP_WXORX,
+                    'COMPLAIN': SARA_WXP_COMPLAIN,
+                    'OTHER': SARA_WXP_OTHER | SARA_WXP_WXORX,
+                    'EMUTRAMP': SARA_WXP_EMUTRAMP,
+                    'MPROTECT': SARA_WXP_MPROTECT | SARA_WXP_WXORX,
+                    'TRANSFER': SARA_WXP_TRANSFER,
+                    'MMAP': SARA_WXP_MMAP | SARA_WXP_OTHER | SARA_WXP_WXORX,
+                    'NONE': SARA_WXP_NONE}
+    MAX_TEXTS = 4096
+    SPACES = re_compile(r'\s+')
+    COMMAS = re_compile(r',+')
+    __compilers = {}
+
+    @classmethod
+    def get(cls, emuavail, emudef):
+        key = (emuavail, emudef)
+        c = cls.__compilers.get(key)
+        if c is None:
+            c = cls.__compilers.setdefault(key, cls(emuavail, emudef))
+        return c
+
+    def __init__(self, emuavail, emudef):
+        self.emuavail = emuavail
+        self.emudef = emudef
+        self.__table = {}
+        self.__texts = {}
+
+    # Returns (flags, error, early). Early errors must be reported
+    # before the ones about the rule's path.
+    def compile(self, text):
+        r = self.__texts.get(text)
+        if r is None:
+            tokens = frozenset(self.COMMAS.sub(',', self.SPACES.sub('', text)).upper().split(','))
+            r = self.__table.get(tokens)
+            if r is None:
+                r = self.__table.setdefault(tokens, self.__compile(tokens))
+            if len(self.__texts) < self.MAX_TEXTS:
+                self.__texts[text] = r
+        return r
+
+    def __compile(self, flags):
+        if not flags <= self.ALLOWED_FLAGS:
+            return None, 'invalid flag', True
+        if 'NONE' in flags and not flags <= {'NONE', 'TRANSFER'}:
+            return None, 'invalid flags', True
+        emutramp = flags & self.EMUTRAMP_FLAGS
+        if len(emutramp) > 1:
+            return None, 'can\'t use more the one version of the EMUTRAMP flag', False
+        if emutramp:
+            flags = flags - emutramp
+            if not self.emuavail:
+                if 'EMUTRAMP_OR_NONE' in emutramp:
+                    emudo = 'NONE'
+                elif 'EMUTRAMP_OR_MPROTECT' in emutramp:
+                    emudo = 'MPROTECT'
+                    flags = flags | {'MPROTECT'}
+                else:
+                    emudo = self.emudef
+                if emudo == 'NONE':
+                    flags = flags & {'TRANSFER'}
+            else:
+                flags = flags | {'EMUTRAMP'}
+        value = 0
+        for f in flags:
+            value |= self.FLAGS_VALUES[f]
+        if not Config.are_flags_valid(value):
+            return None, 'invalid flags', False
+        return value, None, False
+
+
 class Config(BaseConfig):
     WARN = "WX protection config has been simplified"
 
@@ -82,26 +267,49 @@ class Config(BaseConfig):
                  binary=None,
                  xattr=False,
                  main_options=None,
-                 extra_files=None):
+                 extra_files=None,
+                 lazy=False,
+                 tracer=None):
+        self._resolver = None
+        self._graph = None
+        self._compiler = None
         super().__init__(config_lines=config_lines,
                          binary=binary,
                          xattr=xattr,
                          main_options=main_options,
-                         extra_files=extra_files)
+                         extra_files=extra_files,
+                         lazy=lazy,
+                         tracer=tracer)
         self.emudef = 'MPROTECT'
         self.emuavail = False
 
     def build_dicts_from_config_lines(self):
+        with self.tracer.span('wxprot.rules') as span:
+            self.__build_dicts()
+            span.set(rules=len(self.dicts))
+
+    def __build_dicts(self):
+        from sara.ELF import LibraryGraph, elf_cache
+        from sara.PathResolver import PathResolver
         self.load_emudef()
-        seen = set()
-        for location, line in self.config_lines:
-            d = self.parse_line(location, line)
-            s = (d['path'], d['exact'])
-            if s in seen:
+        self._resolver = PathResolver()
+        self._graph = LibraryGraph()
+        self.dicts = RuleStore()
+        for location, line, d, warnings, error in self.parse_lines(self.iter_config_lines()):
+            for w in warnings:
+                logging.warning(w)
+            if error is not None:
+                raise WXPConfigException(location, error)
+            if not self.dicts.add(d['path'], d['exact'], d['flags']):
                 logging.warning("'{}' will be skipped because already present (is it a symlink?).".format(line[0]))
-                continue
-            seen.add(s)
-            self.dicts.append(d)
+        self.dicts.seal()
+        if str(self.main_options.get('wxprot_check_prefix_rules', 0)).strip() not in ('', '0'):
+            with self.tracer.span('wxprot.prefix_rules'):
+                self.check_prefix_rules()
+        logging.debug(self._resolver.summary())
+        logging.debug('ELF cache: {hits} hits, {misses} misses'.format(**elf_cache.stats))
+        self._resolver = None
+        self._graph = None
 
     def load_emudef(self):
         emudef = self.main_options['wxprot_emutramp_missing_default']
@@ -120,210 +328,222 @@ class Config(BaseConfig):
             self.emuavail = False
         else:
             self.emuavail = True
+        self._compiler = FlagCompiler.get(self.emuavail, self.emudef)
 
-    def parse_line(self, location, line):
+    def parse_rule(self, location, line):
         if len(line) < 2:
             raise WXPConfigException(location, 'not enough fields')
         path = line[0]
-        flags = ' '.join(line[1:])
-        flags = list(set(sub(r',+', ',', sub(r'\s+', '', flags)).upper().split(',')))
-        allowed_flags = ('FULL',
-                         'VERBOSE',
-                         'WXORX',
-                         'STACK',
-                         'HEAP',
-                         'COMPLAIN',
-                         'OTHER',
-                         'MPROTECT',
-                         'EMUTRAMP',
-                         'EMUTRAMP_OR_MPROTECT',
-                         'EMUTRAMP_OR_NONE',
-                         'TRANSFER',
-                         'MMAP',
-                         'NONE')
-        if any([f not in allowed_flags for f in flags]):
-            raise WXPConfigException(location, 'invalid flag')
-        if not (('NONE' in flags and len(flags) == 1) or
-                ('NONE' in flags and len(flags) == 2 and 'TRANSFER' in flags) or
-                'NONE' not in flags):
-            raise WXPConfigException(location, 'invalid flags')
+        flags, error, early = self._compiler.compile(' '.join(line[1:]))
+        if early:
+            raise WXPConfigException(location, error)
         if (len(path) - (1 if path[-1] == '*' else 0)) > SARA_PATH_MAX:
             raise WXPConfigException(location, 'path too long')
         if path[0] != '/' and path != '*':
             raise WXPConfigException(location, 'path is not absolute')
-        ef = 0
-        if 'EMUTRAMP' in flags:
-            ef += 1
-        if 'EMUTRAMP_OR_MPROTECT' in flags:
-            ef += 1
-        if 'EMUTRAMP_OR_NONE' in flags:
-            ef += 1
-        if ef > 1:
-            raise WXPConfigException(location, 'can\'t use more the one version of the EMUTRAMP flag')
-        if not self.emuavail and ef == 1:
-            if 'EMUTRAMP_OR_NONE' in flags:
-                flags.remove('EMUTRAMP_OR_NONE')
-                emudo = 'NONE'
-            elif 'EMUTRAMP_OR_MPROTECT' in flags:
-                flags.remove('EMUTRAMP_OR_MPROTECT')
-                emudo = 'MPROTECT'
-                flags.append('MPROTECT')
-            elif 'EMUTRAMP' in flags:
-                flags.remove('EMUTRAMP')
-                emudo = self.emudef
-            if emudo == 'NONE':
-                try:
-                    flags.remove('MPROTECT')
-                except ValueError:
-                    pass
-                try:
-                    flags.remove('HEAP')
-                except ValueError:
-                    pass
-                try:
-                    flags.remove('OTHER')
-                except ValueError:
-                    pass
-                try:
-                    flags.remove('STACK')
-                except ValueError:
-                    pass
-                try:
-                    flags.remove('WXORX')
-                except ValueError:
-                    pass
-                try:
-                    flags.remove('MMAP')
-                except ValueError:
-                    pass
-                try:
-                    flags.remove('COMPLAIN')
-                except ValueError:
-                    pass
-                try:
-                    flags.remove('VERBOSE')
-                except ValueError:
-                    pass
-                try:
-                    flags.remove('FULL')
-                except ValueError:
-                    pass
-        elif self.emuavail and ef == 1:
-            if 'EMUTRAMP_OR_NONE' in flags:
-                flags.remove('EMUTRAMP_OR_NONE')
-                flags.append('EMUTRAMP')
-            elif 'EMUTRAMP_OR_MPROTECT' in flags:
-                flags.remove('EMUTRAMP_OR_MPROTECT')
-                flags.append('EMUTRAMP')
-        d = {}
+        if error is not None:
+            raise WXPConfigException(location, error)
         if path[-1] == '*':
-            d['path'] = path[:-1]
-            d['exact'] = False
-        else:
-            d['path'] = path
-            d['exact'] = True
-        if len(d['path']) > 0:
-            if islink(d['path']):
-                logging.warning("'{}' is a symlink, its target will be used.".format(d['path']))
-            if d['path'][-1] == '/' and len(d['path']) > 1:
-                d['path'] = realpath(d['path']) + '/'
-            else:
-                d['path'] = realpath(d['path'])
-        d['flags'] = 0
-        for f in flags:
-            if f == 'FULL':
-                d['flags'] |= SARA_WXP_FULL
-            elif f == 'VERBOSE':
-                d['flags'] |= SARA_WXP_VERBOSE
-            elif f == 'WXORX':
-                d['flags'] |= SARA_WXP_WXORX
-            elif f == 'STACK':
-                d['flags'] |= SARA_WXP_STACK | SARA_WXP_WXORX
-            elif f == 'HEAP':
-                d['flags'] |= SARA_WXP_HEAP | SARA_WXP_WXORX
-            elif f == 'COMPLAIN':
-                d['flags'] |= SARA_WXP_COMPLAIN
-            elif f == 'OTHER':
-                d['flags'] |= SARA_WXP_OTHER | SARA_WXP_WXORX
-            elif f == 'EMUTRAMP':
-                d['flags'] |= SARA_WXP_EMUTRAMP
-            elif f == 'MPROTECT':
-                d['flags'] |= SARA_WXP_MPROTECT | SARA_WXP_WXORX
-            elif f == 'TRANSFER':
-                d['flags'] |= SARA_WXP_TRANSFER
-            elif f == 'MMAP':
-                d['flags'] |= SARA_WXP_MMAP | SARA_WXP_OTHER | SARA_WXP_WXORX
-        if not Config.are_flags_valid(d['flags']):
-            raise WXPConfigException(location, 'invalid flags')
-        if d['exact'] and isfile(d['path']) and not d['flags'] & SARA_WXP_COMPLAIN:
-            if d['flags'] & SARA_WXP_WXORX and \
-	       not (d['flags'] & SARA_WXP_EMUTRAMP) and \
-	       self.execstack_check(d['path']):
-                raise WXPConfigException(location,
-			"WXORX protection is incompaible with GNU executable stack marking. Did you forget EMUTRAMP?")
-            if d['flags'] & SARA_WXP_MMAP and self.relro_check(d['path']):
-                raise WXPConfigException(location,
-			"MMAP restriction is incompaible with binaries missing a RELRO section.")
-            if d['flags'] & SARA_WXP_MMAP and self.dlopen_check(d['path']):
-                raise WXPConfigException(location,
-			"MMAP restriction is incompaible with binaries using dlopen(3).")
+            return {'path': path[:-1], 'exact': False, 'flags': flags}
+        return {'path': path, 'exact': True, 'flags': flags}
+
+    def parse_line(self, location, line):
+        d = self.parse_rule(location, line)
+        d['path'], warnings, error = check_rule(d['path'], d['exact'], d['flags'],
+                                                self._resolver, self._graph, self.tracer)
+        for w in warnings:
+            logging.warning(w)
+        if error is not None:
+            raise WXPConfigException(location, error)
         return d
 
+    def parse_jobs(self):
+        jobs = self.main_options.get('wxprot_parse_jobs', 0)
+        try:
+            jobs = int(jobs)
+        except ValueError:
+            raise WXPConfigException('main', 'wrong value for "wxprot_parse_jobs"')
+        if jobs <= 0:
+            jobs = min(32, (cpu_count() or 1) + 4)
+        return jobs
+
+    def parse_lines(self, config_lines):
+        jobs = self.parse_jobs()
+        tracer = self.tracer
+        if jobs == 1:
+            for location, line in config_lines:
+                with tracer.span('wxprot.rule', location=location, rule=line[0]) as span:
+                    d = self.parse_rule(location, line)
+                    span.set(flags=d['flags'])
+                    d['path'], warnings, error = check_rule(d['path'], d['exact'], d['flags'],
+                                                            self._resolver, self._graph, tracer)
+                yield location, line, d, warnings, error
+            return
+        pool = str(self.main_options.get('wxprot_parse_pool', 'thread')).strip().lower()
+        if pool == 'thread':
+            from concurrent.futures import ThreadPoolExecutor
+            executor = ThreadPoolExecutor(max_workers=jobs)
+            args = (self._resolver, self._graph, tracer)
+            check = check_rule
+        elif pool == 'process':
+            # multiprocessing is expensive to import, only do it if needed
+            from concurrent.futures import ProcessPoolExecutor
+            # Every worker process keeps its own path cache. Spans
+            # don't cross processes, only the rules are traced.
+            executor = ProcessPoolExecutor(max_workers=jobs)
+            args = None
+            check = check_rule_in_worker
+        else:
+            raise WXPConfigException('main', 'wrong value for "wxprot_parse_pool"')
+        # Results are consumed in submission order, so warnings, errors and
+        # the first-wins deduplication behave exactly as in the serial case.
+        pending = deque()
+        try:
+            exc = None
+            for location, line in config_lines:
+                with tracer.span('wxprot.rule', location=location, rule=line[0]) as span:
+                    try:
+                        d = self.parse_rule(location, line)
+                    except ConfigException as e:
+                        exc = e
+                        break
+                    span.set(flags=d['flags'])
+                if args is None:
+                    future = executor.submit(check, d['path'], d['exact'], d['flags'])
+                else:
+                    future = executor.submit(check, d['path'], d['exact'], d['flags'], *args, parent=span)
+                pending.append((location, line, d, future))
+                if len(pending) >= jobs * 4:
+                    yield self.__collect(pending.popleft())
+            while pending:
+                yield self.__collect(pending.popleft())
+            if exc is not None:
+                raise exc
+        finally:
+            # what's still queued is not needed any more
+            for item in pending:
+                item[3].cancel()
+            executor.shutdown(wait=True)
+
+    def watched_paths(self):
+        lines = self.config_lines
+        if lines is None:
+            lines = self._config_source or ()
+        return [line[0] for _, line in lines
+                if line[0].startswith('/') and not line[0].endswith('*')]
+
+    @staticmethod
+    def __collect(item):
+        location, line, d, future = item
+        d['path'], warnings, error = future.result()
+        return location, line, d, warnings, error
+
+    # Prefix rules can cover hundreds of binaries: every executable is
+    # checked against the most specific rule that matches it, within
+    # a time budget.
+    def check_prefix_rules(self):
+        try:
+            timeout = float(self.main_options.get('wxprot_check_prefix_timeout', 10))
+        except ValueError:
+            raise WXPConfigException('main', 'wrong value for "wxprot_check_prefix_timeout"')
+        exact = set()
+        prefixes = {}
+        for path, flags, is_exact in self.dicts.iter_tuples():
+            if is_exact:
+                exact.add(path)
+            elif len(path) > 0:
+                prefixes[path] = flags
+        if not prefixes:
+            return
+        from concurrent.futures import ThreadPoolExecutor, TimeoutError
+        from sara.Scanner import Scanner
+        scanner = Scanner(self.parse_jobs(), timeout if timeout > 0 else None)
+        executor = ThreadPoolExecutor(max_workers=scanner.jobs)
+        pending = deque()
+        checked = 0
+        try:
+            for path in scanner.scan(prefixes):
+                if path in exact:
+                    continue
+                prefix = self.longest_prefix(path, prefixes)
+                flags = prefixes[prefix]
+                if flags & SARA_WXP_COMPLAIN:
+                    continue
+                pending.append((path, prefix,
+                                executor.submit(check_elf, path, flags, self._graph)))
+                while len(pending) >= scanner.jobs * 4 or \
+                        (pending and pending[0][2].done()):
+                    self.__report_prefix(*pending.popleft())
+                    checked += 1
+            while pending and not scanner.expired():
+                path, prefix, future = pending.popleft()
+                try:
+                    future.result(scanner.remaining())
+                except TimeoutError:
+                    scanner.complete = False
+                    break
+                self.__report_prefix(path, prefix, future)
+                checked += 1
+        finally:
+            # binaries still queued when time is up aren't checked
+            for item in pending:
+                item[2].cancel()
+            executor.shutdown(wait=True)
+        if not scanner.complete:
+            logging.warning('prefix rules validation incomplete: time budget of {}s '
+                            'exhausted after {} binaries.'.format(timeout, checked))
+        logging.debug('prefix rules validation: {} binaries checked, '
+                      '{dirs} directories scanned.'.format(checked, **scanner.stats))
+
+    @staticmethod
+    def longest_prefix(path, prefixes):
+        for i in range(len(path), 0, -1):
+            if path[:i] in prefixes:
+                return path[:i]
+        return None
+
+    @staticmethod
+    def __report_prefix(path, prefix, future):
+        error = future.result()
+        if error is not None:
+            logging.warning("'{}' is covered by '{}*': {}".format(path, prefix, error))
+
     def extra_dicts_stuff(self):
         pass
 
     @staticmethod
     def execstack_check(path):
-        if ELFFile is not None:
-            try:
-                with open(path, 'rb') as f:
-                    elffile = ELFFile(f)
-                    for segment in elffile.iter_segments():
-                        if describe_p_type(segment['p_type']) == 'GNU_STACK':
-                            return describe_p_flags(segment['p_flags']) == 'RWE'
-            except (IOError, TypeError, ELFError):
-                pass
-        return False
+        from sara.ELF import elf_info
+        info = elf_info(path)
+        return info is not None and info.execstack
 
     @staticmethod
     def relro_check(path):
-        if ELFFile is not None:
-            try:
-                with open(path, 'rb') as f:
-                    elffile = ELFFile(f)
-                    for segment in elffile.iter_segments():
-                        if describe_p_type(segment['p_type']) == 'GNU_RELRO':
-                            return False
-            except (IOError, TypeError, ELFError):
-                pass
-            return True
-        return False
+        from sara.ELF import elf_info
+        info = elf_info(path)
+        return info is not None and not info.relro
 
     @staticmethod
     def dlopen_check(path):
-        if ELFFile is not None:
-            try:
-                with open(path, 'rb') as f:
-                    elffile = ELFFile(f)
-                    for segment in elffile.iter_segments():
-                        if describe_p_type(segment['p_type']) == 'DYNAMIC':
-                            for tag in segment.iter_tags():
-                                if tag.entry.d_tag == 'DT_NEEDED' and \
-                                   tag.needed.startswith(b'libdl.so'):
-                                    return True
-            except (IOError, TypeError, ELFError):
-                pass
-        return False
+        from sara.ELF import elf_info
+        info = elf_info(path)
+        return info is not None and info.dlopen
+
+    @staticmethod
+    def jit_check(path):
+        from sara.ELF import elf_info
+        info = elf_info(path)
+        return info is not None and bool(info.jit)
 
     def build_binary(self):
-        t = []
-        for rule in self.dicts:
-            t.append((rule['path'].encode('utf8'),
-                      rule['flags'],
-                      not rule['exact']))
-        d = DFA()
-        d.build(t)
-        self._binary = d.serialize(self.bhash)
+        from sara.DFA import DFA
+        with self.tracer.span('wxprot.build_binary') as span:
+            t = [(path.encode('utf8'), flags, not exact)
+                 for path, flags, exact in self.dicts.iter_tuples()]
+            d = DFA(tracer=self.tracer)
+            d.build(t)
+            self._binary = d.serialize(self.bhash)
+            span.set(rules=len(t), bytes=len(self._binary))
 
     def build_dicts_from_binary(self):
         pass
@@ -373,6 +593,11 @@ class Config(BaseConfig):
         #return Config.flags_to_text(int(f.strip(), 16))
         return Config.flags_to_text(int(f.strip(), 10))
 
+    @staticmethod
+    def rule_to_text(path, exact, flags):
+        from shlex import quote
+        return '{}{} {}'.format(quote(path), '' if exact else '*', Config.flags_to_text(flags))
+
     @staticmethod
     def flags_to_text(f):
         line = ''
@@ -18,28 +18,41 @@
 
 
 def c_array(data):
-    s = []
-    for i, b in enumerate(data, 1):
-        if i % 8:
-            s.append('0x{:02X}, '.format(b))
-        else:
-            s.append('0x{:02X},\n\t\t\t\t'.format(b))
-    s[-1] = s[-1].strip('\n\t, ')
-    return ''.join(s)
+    lines = []
+    for i in range(0, len(data), 8):
+        lines.append(', '.join('0x{:02X}'.format(b) for b in data[i:i+8]))
+    return ',\n\t\t\t\t'.join(lines)
+
+
+# The two variants of a policy only differ in the flags at the end of
+# the tables, when they differ at all: what they have in common is
+# shipped once. The head is cut at a multiple of align bytes.
+def split_common(a, b, align=1):
+    n = 0
+    for x, y in zip(a, b):
+        if x != y:
+            break
+        n += 1
+    n -= n % align
+    return a[:n], a[n:], b[n:]
 
 
 SH_TEMPLATE = """#!/bin/sh
 SECFS="{sysfs_path}"
 
+WXPROTH="{wxprot_head}"
 WXPROT="{wxprot}"
 WXPROTN="{wxprot_noemutramp}"
 
 if [ -f "${{SECFS}}/sara/wxprot/emutramp_available" ] && \\
    [ "`cat "${{SECFS}}/sara/wxprot/emutramp_available"`" -eq 1 ]; then
-    echo "${{WXPROT}}" | base64 -d | dd of="${{SECFS}}/sara/wxprot/.load" iflag=fullblock bs="$(echo "${{WXPROT}}" | base64 -d|wc -c |cut -d' ' -f1)" 2>/dev/null
+    WXPROTT="${{WXPROT}}"
+    WXPROTS={wxprot_size}
 else
-    echo "${{WXPROTN}}" | base64 -d | dd of="${{SECFS}}/sara/wxprot/.load" iflag=fullblock bs="$(echo "${{WXPROTN}}" | base64 -d|wc -c |cut -d' ' -f1)" 2>/dev/null
+    WXPROTT="${{WXPROTN}}"
+    WXPROTS={wxprot_noemutramp_size}
 fi
+echo "${{WXPROTH}}${{WXPROTT}}" | base64 -d | dd of="${{SECFS}}/sara/wxprot/.load" iflag=fullblock bs="${{WXPROTS}}" count=1 2>/dev/null
 
 echo "{wxprot_xattr_enabled}" > "${{SECFS}}/sara/wxprot/xattr_enabled"
 echo "{wxprot_xattr_user_allowed}" > "${{SECFS}}/sara/wxprot/xattr_user_allowed"
@@ -51,10 +64,11 @@ exit 0
 """
 
 C_TEMPLATE = """#include <stdio.h>
+#include <string.h>
 
 #define SECFS "{sysfs_path}"
 
-unsigned char WXPROT[] =\t{{{wxprot}}};
+unsigned char WXPROT[{wxprot_size_max}] =\t{{{wxprot}}};
 unsigned char WXPROTN[] =\t{{{wxprot_noemutramp}}};
 
 int main()
@@ -69,9 +83,11 @@ int main()
         f = fopen(SECFS "/sara/wxprot/.load", "wb");
         if (f != NULL) {{
             if (buf == '1')
-                fwrite(WXPROT, sizeof(WXPROT), 1, f);
-            else
-                fwrite(WXPROTN, sizeof(WXPROTN), 1, f);
+                fwrite(WXPROT, {wxprot_size}, 1, f);
+            else {{
+                memcpy(WXPROT + {wxprot_head_size}, WXPROTN, {wxprot_noemutramp_tail_size});
+                fwrite(WXPROT, {wxprot_noemutramp_size}, 1, f);
+            }}
             fclose(f);
         }}
     }}
@@ -103,3 +119,56 @@ int main()
     return 0;
 }}
 """
+
+# Same as C_TEMPLATE without stdio: every file gets a single write(2),
+# which is what .load wants, and the binary can be linked statically
+# into a tiny initramfs helper.
+C_WRITE_TEMPLATE = """#include <fcntl.h>
+#include <string.h>
+#include <unistd.h>
+
+#define SECFS "{sysfs_path}"
+
+unsigned char WXPROT[{wxprot_size_max}] =\t{{{wxprot}}};
+unsigned char WXPROTN[] =\t{{{wxprot_noemutramp}}};
+
+/* a policy written in pieces is rejected: a short write is a failure */
+static int write_file(const char *path, const void *data, size_t size)
+{{
+    int fd;
+    ssize_t ret;
+
+    fd = open(path, O_WRONLY);
+    if (fd < 0)
+        return 0;
+    ret = write(fd, data, size);
+    close(fd);
+    return ret != (ssize_t) size;
+}}
+
+int main()
+{{
+    int fd;
+    int ret = 0;
+    char buf = 0;
+
+    fd = open(SECFS "/sara/wxprot/emutramp_available", O_RDONLY);
+    if (fd >= 0) {{
+        if (read(fd, &buf, 1) != 1)
+            buf = 0;
+        close(fd);
+        if (buf == '1')
+            ret |= write_file(SECFS "/sara/wxprot/.load", WXPROT, {wxprot_size});
+        else {{
+            memcpy(WXPROT + {wxprot_head_size}, WXPROTN, {wxprot_noemutramp_tail_size});
+            ret |= write_file(SECFS "/sara/wxprot/.load", WXPROT, {wxprot_noemutramp_size});
+        }}
+    }}
+    ret |= write_file(SECFS "/sara/wxprot/xattr_enabled", "{wxprot_xattr_enabled}", 1);
+    ret |= write_file(SECFS "/sara/wxprot/xattr_user_allowed", "{wxprot_xattr_user_allowed}", 1);
+    ret |= write_file(SECFS "/sara/wxprot/enabled", "{wxprot_enabled}", 1);
+    ret |= write_file(SECFS "/sara/main/enabled", "{sara_enabled}", 1);
+    //ret |= write_file(SECFS "/sara/main/locked", "{sara_locked}", 1);
+    return ret;
+}}
+"""
@@ -33,10 +33,10 @@ setup(name='saractl',
                                         'sara-xattr = sara.main:main [xattr]']},
       long_description=long_description,
       platforms='Linux',
+      python_requires='>=3.7',
       keywords='linux lsm linux-security-module sara security w^x',
       packages=['sara', 'sara.submodules'],
-      extras_require={'elfcheck':  ["pyelftools"],
-                      'capabilities': ["pythonprctl"],
+      extras_require={'capabilities': ["pythonprctl"],
                       'xattr': ["pyxattr"]},
       data_files=[('/etc/sara/', ['config/main.conf']),
                   ('/etc/sara/wxprot.conf.d/', ['config/99_wxprot.conf']),
@@ -53,7 +53,12 @@ setup(name='saractl',
                    'Operating System :: POSIX :: Linux',
                    'License :: OSI Approved :: GNU General Public License v3 or later (GPLv3+)',
                    'Programming Language :: Python :: 3',
-                   'Programming Language :: Python :: 3.4',
+                   'Programming Language :: Python :: 3.7',
+                   'Programming Language :: Python :: 3.8',
+                   'Programming Language :: Python :: 3.9',
+                   'Programming Language :: Python :: 3.10',
+                   'Programming Language :: Python :: 3.11',
+                   'Programming Language :: Python :: 3.12',
                    'Programming Language :: Python :: 3 :: Only',
                    'Topic :: Security',
                    'Topic :: System :: Monitoring',
@@ -1,3 +1,21 @@
 import tests.test_meta
 import tests.test_dfa
 import tests.test_wxprot
+import tests.test_pathresolver
+import tests.test_elf
+import tests.test_generator
+import tests.test_audit
+import tests.test_ruleanalyzer
+import tests.test_violations
+import tests.test_securityfs
+import tests.test_lexer
+import tests.test_parsecache
+import tests.test_watcher
+import tests.test_service
+import tests.test_cli
+import tests.test_emulator
+import tests.test_templates
+import tests.test_metrics
+import tests.test_timings
+import tests.test_tracer
+import tests.test_store
@@ -0,0 +1,72 @@
+from io import StringIO
+from json import loads
+from os import chmod, mkdir, setxattr
+from os.path import join, realpath
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+from sara.Audit import Auditor, USER_XATTR_NAME, XATTR_NAME, read_xattr
+from sara.DFA import DFA, Matcher
+
+
+class TestAudit(TestCase):
+
+    def setUp(self):
+        self.tmp = TemporaryDirectory()
+        self.dir = realpath(self.tmp.name)
+        for d in ('bin', 'bin/sub', 'other'):
+            mkdir(join(self.dir, d))
+        for name in ('bin/a', 'bin/b', 'bin/sub/c', 'other/d', 'other/noexec'):
+            path = join(self.dir, name)
+            with open(path, 'w') as f:
+                f.write('#!/bin/sh\n')
+            chmod(path, 0o644 if name.endswith('noexec') else 0o755)
+        rules = [(join(self.dir, 'bin/').encode('utf8'), 79, True),
+                 (join(self.dir, 'bin/b').encode('utf8'), 15, False),
+                 (join(self.dir, 'bin/sub/').encode('utf8'), 0, True)]
+        d = DFA()
+        d.build(rules)
+        self.matcher = Matcher.from_binary(d.serialize(b'\0'*20))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_records(self):
+        a = Auditor(self.matcher, roots=[self.dir], jobs=2, xattr=False, default='NONE')
+        records = sorted(a.records())
+        self.assertEqual(records, [(join(self.dir, 'bin/a'), 79, 'rule'),
+                                   (join(self.dir, 'bin/b'), 15, 'rule'),
+                                   (join(self.dir, 'bin/sub/c'), 0, 'rule'),
+                                   (join(self.dir, 'other/d'), None, 'default')])
+        self.assertEqual(a.stats, {'files': 4, 'rule': 3, 'xattr': 0, 'default': 1})
+        self.assertIsNone(read_xattr(join(self.dir, 'bin/a')))
+
+    def test_write(self):
+        a = Auditor(self.matcher, roots=[join(self.dir, 'bin')], xattr=False)
+        out = StringIO()
+        a.write(out, 'csv')
+        lines = out.getvalue().splitlines()
+        self.assertEqual(lines[0], 'path,flags,text,source')
+        self.assertIn('{},15,"MPROTECT, WXORX",rule'.format(join(self.dir, 'bin/b')), lines)
+        out = StringIO()
+        a.write(out, 'jsonl')
+        records = [loads(l) for l in out.getvalue().splitlines()]
+        self.assertEqual(len(records), 3)
+        self.assertIn({'path': join(self.dir, 'bin/a'), 'flags': 79, 'text': 'FULL', 'source': 'rule'}, records)
+
+    def test_xattr_precedence(self):
+        a, b = join(self.dir, 'bin/a'), join(self.dir, 'bin/b')
+        try:
+            setxattr(a, XATTR_NAME, b'0x4f')
+            setxattr(a, USER_XATTR_NAME, b'0')
+            setxattr(b, USER_XATTR_NAME, b'8')
+        except OSError:
+            self.skipTest('xattrs are not supported here')
+        self.assertEqual(read_xattr(b, USER_XATTR_NAME), 8)
+
+        def flags(**kwargs):
+            return {p: (f, s) for p, f, s in Auditor(self.matcher, roots=[join(self.dir, 'bin')],
+                                                      **kwargs).records() if p in (a, b)}
+        self.assertEqual(flags(xattr=True), {a: (79, 'xattr'), b: (15, 'rule')})
+        self.assertEqual(flags(xattr=True, user_xattr=True), {a: (79, 'xattr'), b: (8, 'xattr')})
+        self.assertEqual(flags(xattr=False, user_xattr=True), {a: (79, 'rule'), b: (15, 'rule')})
@@ -0,0 +1,83 @@
+"""
+    saractl - S.A.R.A.'s userspace utilities.
+    Copyright (C) 2017  Salvatore Mesoraca <s.mesoraca16@gmail.com>
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import sys
+from json import loads
+from os import makedirs
+from os.path import abspath, dirname, join
+from subprocess import PIPE, run
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+from tests.test_securityfs import FILES
+
+# Modules that a plain "saractl status" must not need.
+HEAVY = ('asyncio', 'concurrent.futures', 'ctypes', 'mmap', 'multiprocessing', 'json',
+         'shlex', 'tempfile', 'sara.Audit', 'sara.DFA', 'sara.ELF', 'sara.Generator',
+         'sara.ParseCache', 'sara.PathResolver', 'sara.RuleAnalyzer', 'sara.Scanner',
+         'sara.Service', 'sara.Violations', 'sara.Watcher', 'sara.templates')
+
+SCRIPT = '''
+import sys
+from sara.main import _main
+ret = _main(sys.argv[1:])
+sys.stdout.flush()
+print(' '.join(sorted(sys.modules)), file=sys.stderr)
+sys.exit(ret)
+'''
+
+
+class TestCLI(TestCase):
+
+    def setUp(self):
+        self.tmp = TemporaryDirectory()
+        for name, value in FILES.items():
+            makedirs(join(self.tmp.name, 'sara', name.split('/')[0]), exist_ok=True)
+            with open(join(self.tmp.name, 'sara', name), 'w') as f:
+                f.write(value)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def saractl(self, *args):
+        p = run([sys.executable, '-c', SCRIPT, 'saractl',
+                 '-c', self.tmp.name, '-S', self.tmp.name] + list(args),
+                cwd=dirname(dirname(abspath(__file__))),
+                stdout=PIPE, stderr=PIPE, universal_newlines=True)
+        return p.returncode, p.stdout, set(p.stderr.split())
+
+    def test_status_imports(self):
+        ret, out, modules = self.saractl('status')
+        self.assertEqual(ret, 0)
+        self.assertIn('WX Protection: enabled', out)
+        self.assertIn('sara.Sara', modules)
+        self.assertEqual(modules & set(HEAVY), set())
+
+    def test_status_json(self):
+        ret, out, modules = self.saractl('-s', 'wxprot', 'status', '--format', 'json')
+        self.assertEqual(ret, 0)
+        status = loads(out)
+        self.assertEqual(status['default_values'], {'wxprot': 'FULL'})
+        self.assertEqual(status['extras']['wxprot']['emutramp_available'], '1')
+        self.assertNotIn('main', status['extras'])
+
+    def test_offline_imports(self):
+        ret, out, modules = self.saractl('-S', join(self.tmp.name, 'missing'),
+                                         'generate', join(self.tmp.name, 'sara'))
+        self.assertEqual(ret, 0)
+        self.assertNotIn('sara.Sara', modules)
+        self.assertNotIn('sara.SubModLoader', modules)
@@ -1,7 +1,7 @@
 from itertools import chain
 from unittest import TestCase
 
-from sara.DFA import DFA, TEST_SETS
+from sara.DFA import DFA, Matcher, TEST_SETS
 
 
 class TestDFA(TestCase):
@@ -42,3 +42,13 @@ class TestDFA(TestCase):
     def test_serialization(self):
         for t in TEST_SETS:
             self.__test_serialization(t)
+
+    def test_matcher(self):
+        for t in TEST_SETS:
+            d = DFA()
+            d.build(t)
+            m = Matcher.from_binary(d.serialize(b'\xAA'*20))
+            for k in chain.from_iterable(r[3] for r in t):
+                r = d.match_compressed_tables(k[0])
+                self.assertEqual(m.match(k[0]), r[1] if r[0] else None)
+                self.assertEqual(m.match(k[0][1:], m.walk(k[0][:1])), m.match(k[0]))
@@ -0,0 +1,173 @@
+from os import chmod, mkdir
+from os.path import join, realpath
+from struct import pack
+from sys import executable
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+from sara.ELF import ELFCache, ELFError, LibraryGraph, parse_elf
+from sara.submodules import wxprot
+
+
+def make_elf(needed=(), imports=(), execstack=False, relro=True, runpath=None, interp=None):
+    strtab = b'\0'
+    offsets = {}
+    for s in list(needed) + list(imports) + ([runpath] if runpath else []) + ([interp] if interp else []):
+        if s not in offsets:
+            offsets[s] = len(strtab)
+            strtab += s.encode('utf8') + b'\0'
+    phnum = 3 + int(relro) + int(interp is not None)
+    data_off = 64 + 56 * phnum
+    strtab_off = data_off
+    symtab_off = strtab_off + len(strtab)
+    symtab = b'\0' * 24
+    for s in imports:
+        symtab += pack('<IBBHQQ', offsets[s], 0x12, 0, 0, 0, 0)
+    hash_off = symtab_off + len(symtab)
+    gnu_hash = pack('<IIIIQI', 1, 1 + len(imports), 1, 0, 0, 0)
+    dyn_off = hash_off + len(gnu_hash)
+    dyn = b''
+    for s in needed:
+        dyn += pack('<qQ', 1, offsets[s])
+    if runpath:
+        dyn += pack('<qQ', 29, offsets[runpath])
+    dyn += pack('<qQ', 5, strtab_off) + pack('<qQ', 10, len(strtab))
+    dyn += pack('<qQ', 6, symtab_off) + pack('<qQ', 11, 24)
+    dyn += pack('<qQ', 0x6ffffef5, hash_off) + pack('<qQ', 0, 0)
+    size = dyn_off + len(dyn)
+    ph = pack('<IIQQQQQQ', 1, 5, 0, 0, 0, size, size, 0x1000)
+    ph += pack('<IIQQQQQQ', 2, 6, dyn_off, dyn_off, dyn_off, len(dyn), len(dyn), 8)
+    ph += pack('<IIQQQQQQ', 0x6474e551, 7 if execstack else 6, 0, 0, 0, 0, 0, 16)
+    if relro:
+        ph += pack('<IIQQQQQQ', 0x6474e552, 4, dyn_off, dyn_off, dyn_off, len(dyn), len(dyn), 1)
+    if interp is not None:
+        ph += pack('<IIQQQQQQ', 3, 4, strtab_off + offsets[interp], 0, 0, len(interp) + 1, len(interp) + 1, 1)
+    ehdr = b'\x7fELF\x02\x01\x01' + b'\0' * 9
+    ehdr += pack('<HHIQQQIHHHHHH', 3, 62, 1, 0, 64, 0, 0, 64, 56, phnum, 64, 0, 0)
+    return ehdr + ph + strtab + symtab + gnu_hash + dyn
+
+
+class TestELF(TestCase):
+
+    def setUp(self):
+        self.tmp = TemporaryDirectory()
+        self.dir = realpath(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, name, data):
+        path = join(self.dir, name)
+        with open(path, 'wb') as f:
+            f.write(data)
+        return path
+
+    def test_parse(self):
+        path = self.write('bin', make_elf(needed=('libc.so.6', 'libLLVM-15.so'),
+                                          imports=('dlopen', 'printf', 'mprotect'),
+                                          execstack=True, relro=False,
+                                          runpath='$ORIGIN/../lib:/opt/lib',
+                                          interp='/lib/ld.so'))
+        info = parse_elf(path)
+        self.assertEqual(info.needed, ('libc.so.6', 'libLLVM-15.so'))
+        self.assertEqual(info.imports, {'dlopen', 'mprotect'})
+        self.assertEqual(info.runpath, ('$ORIGIN/../lib', '/opt/lib'))
+        self.assertEqual(info.interp, '/lib/ld.so')
+        self.assertEqual(info.jit, ('libLLVM-15.so',))
+        self.assertTrue(info.execstack)
+        self.assertFalse(info.relro)
+        self.assertTrue(info.dlopen)
+        self.assertTrue(info.executable)
+
+    def test_libdl(self):
+        info = parse_elf(self.write('bin', make_elf(needed=('libdl.so.2',))))
+        self.assertTrue(info.dlopen)
+        self.assertFalse(info.execstack)
+        self.assertTrue(info.relro)
+        self.assertFalse(info.executable)
+
+    def test_not_elf(self):
+        with self.assertRaises(ELFError):
+            parse_elf(self.write('script', b'#!/bin/sh\n'))
+        with self.assertRaises(ELFError):
+            parse_elf(self.write('empty', b''))
+        with self.assertRaises(ELFError):
+            parse_elf(self.write('truncated', make_elf(imports=('dlopen',))[:200]))
+
+    def test_real_binary(self):
+        info = parse_elf(executable)
+        self.assertTrue(info.executable)
+
+    def test_cache(self):
+        c = ELFCache()
+        path = self.write('bin', make_elf())
+        self.assertIsNotNone(c.get(path))
+        self.assertIsNotNone(c.get(path))
+        self.assertIsNone(c.get(self.write('script', b'#!/bin/sh\n')))
+        self.assertEqual(c.stats, {'hits': 1, 'misses': 2})
+
+    def test_wxprot_checks(self):
+        def check(line, **kwargs):
+            path = self.write('bin', make_elf(**kwargs))
+            c = wxprot.Config(xattr=True,
+                              main_options={'wxprot_emutramp_missing_default': 'MPROTECT'},
+                              extra_files={'emutramp_available': '1'})
+            return c.build_xattr_from_single_line([path] + line)
+        self.assertEqual(check(['FULL']), 79)
+        with self.assertRaises(wxprot.WXPConfigException):
+            check(['FULL'], imports=('dlopen',))
+        with self.assertRaises(wxprot.WXPConfigException):
+            check(['FULL'], relro=False)
+        with self.assertRaises(wxprot.WXPConfigException):
+            check(['MPROTECT'], execstack=True)
+        self.assertEqual(check(['MPROTECT,EMUTRAMP'], execstack=True), 271)
+        self.assertEqual(check(['MPROTECT'], imports=('dlopen',)), 15)
+        self.assertEqual(check(['FULL,COMPLAIN'], imports=('dlopen',)), 95)
+
+    def test_execstack_closure(self):
+        lib1 = self.write('libone.so.1', make_elf(needed=('libtwo.so.1',), runpath='$ORIGIN'))
+        lib2 = self.write('libtwo.so.1', make_elf(execstack=True))
+        path = self.write('bin', make_elf(needed=('libone.so.1', 'libmissing.so'),
+                                          runpath='$ORIGIN', interp='/lib/ld.so'))
+        g = LibraryGraph(ld_so_cache=join(self.dir, 'missing'))
+        self.assertEqual([l for l, _ in g.closure(path)], [lib1, lib2])
+        self.assertEqual(g.execstack_library(path), lib2)
+        self.assertIsNone(g.execstack_library(lib2))
+        c = wxprot.Config(xattr=True,
+                          main_options={'wxprot_emutramp_missing_default': 'MPROTECT'},
+                          extra_files={'emutramp_available': '1'})
+        with self.assertRaises(wxprot.WXPConfigException):
+            c.build_xattr_from_single_line([path, 'MPROTECT'])
+        self.assertEqual(c.build_xattr_from_single_line([path, 'MPROTECT,EMUTRAMP']), 271)
+        self.assertEqual(c.build_xattr_from_single_line([path, 'NONE']), 0)
+
+    def test_prefix_rules(self):
+        for d in ('bin', 'bin/sub', 'bin/lib'):
+            mkdir(join(self.dir, d))
+        for name, kwargs in (('bin/ok', {}),
+                             ('bin/bad', {'relro': False}),
+                             ('bin/sub/deep', {'execstack': True}),
+                             ('bin/special', {'relro': False}),
+                             ('bin/lib/other', {'imports': ('dlopen',)}),
+                             ('bin/noexec', {'relro': False})):
+            path = self.write(name, make_elf(**kwargs))
+            if name != 'bin/noexec':
+                chmod(path, 0o755)
+        config_lines = [('a', [join(self.dir, 'bin/*'), 'FULL']),
+                        ('b', [join(self.dir, 'bin/special'), 'MPROTECT']),
+                        ('c', [join(self.dir, 'bin/lib/*'), 'MPROTECT']),
+                        ('d', ['*', 'FULL'])]
+        options = {'wxprot_emutramp_missing_default': 'MPROTECT',
+                   'wxprot_check_prefix_rules': '1'}
+        with self.assertLogs(level='WARNING') as logs:
+            wxprot.Config(config_lines=config_lines,
+                          main_options=options,
+                          extra_files={'emutramp_available': '1'})
+        covered = sorted(l.split("'")[1] for l in logs.output)
+        self.assertEqual(covered, [join(self.dir, 'bin/bad'), join(self.dir, 'bin/sub/deep')])
+        options['wxprot_check_prefix_timeout'] = '0.000001'
+        with self.assertLogs(level='WARNING') as logs:
+            wxprot.Config(config_lines=config_lines,
+                          main_options=options,
+                          extra_files={'emutramp_available': '1'})
+        self.assertIn('incomplete', logs.output[-1])
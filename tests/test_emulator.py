@@ -0,0 +1,97 @@
+"""
+    saractl - S.A.R.A.'s userspace utilities.
+    Copyright (C) 2017  Salvatore Mesoraca <s.mesoraca16@gmail.com>
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from errno import EACCES, EINVAL, EPERM
+from os.path import join
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+from sara.DFA import DFA, MALFORMED_TESTS, TEST_SETS, dfa_kernel_test, dfa_malformed_test, dfa_stress_test
+from sara.EmulatedSecurityFS import EmulatedSecurityFS
+from sara.Sara import Sara
+
+
+class TestEmulator(TestCase):
+
+    def setUp(self):
+        self.tmp = TemporaryDirectory()
+        self.fs = EmulatedSecurityFS.create(join(self.tmp.name, 'sara'))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_dfa(self):
+        self.assertTrue(dfa_kernel_test(self.fs))
+        for b in MALFORMED_TESTS:
+            self.assertTrue(dfa_malformed_test(self.fs, b))
+        for t in TEST_SETS:
+            d = DFA()
+            d.build(t)
+            self.assertFalse(dfa_malformed_test(self.fs, d.serialize(b'\xAA' * 20)))
+
+    def test_stress(self):
+        with self.assertLogs(level='INFO') as logs:
+            self.assertTrue(dfa_stress_test(self.fs, 3001, rules=20, sets=3, seed=1))
+        self.assertIn('3001 probes', logs.output[0])
+
+    def test_stress_mismatch(self):
+        channel = self.fs.channel
+
+        class Wrong(object):
+            def __init__(self, c):
+                self.ask = lambda p: b'4294967295' if p.startswith(b'/') else c.ask(p)
+
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *args):
+                pass
+
+        self.fs.channel = lambda q, a: Wrong(channel(q, a))
+        with self.assertLogs(level='ERROR'):
+            self.assertFalse(dfa_stress_test(self.fs, 1000, rules=20, sets=1, seed=1))
+
+    def test_files(self):
+        self.assertIsNone(self.fs.read('wxprot/.load', fresh=True))
+        with self.assertRaises(OSError) as e:
+            self.fs.write('wxprot/version', '2')
+        self.assertEqual(e.exception.errno, EACCES)
+        with self.assertRaises(OSError) as e:
+            self.fs.write('wxprot/enabled', '2')
+        self.assertEqual(e.exception.errno, EINVAL)
+        self.fs.write('wxprot/enabled', '0')
+        self.assertEqual(self.fs.get('wxprot/enabled'), '0')
+        self.fs.write('main/locked', '1')
+        with self.assertRaises(OSError) as e:
+            self.fs.write('main/locked', '0')
+        self.assertEqual(e.exception.errno, EPERM)
+
+    def test_sara(self):
+        with open(join(self.tmp.name, 'wxprot.conf'), 'w') as f:
+            f.write('/opt/a FULL\n/opt/b/* NONE\n')
+        s = Sara(self.tmp.name, 'emu:' + self.tmp.name)
+        self.assertTrue(s.load())
+        config = s.config_object('wxprot')
+        self.assertEqual(self.fs.get('wxprot/hash'), config.xhash)
+        self.assertEqual(s.policy_binary('wxprot', loaded=True), config.binary)
+        self.assertTrue(s.test())
+        s.lock()
+        self.assertTrue(s.is_locked)
+        with self.assertLogs(level='ERROR'):
+            self.assertFalse(Sara(self.tmp.name, 'emu:' + self.tmp.name).load(force=True))
+        with self.assertRaises(OSError):
+            self.fs.write('wxprot/.load', config.binary)
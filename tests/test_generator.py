@@ -0,0 +1,77 @@
+"""
+    saractl - S.A.R.A.'s userspace utilities.
+    Copyright (C) 2017  Salvatore Mesoraca <s.mesoraca16@gmail.com>
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from os import chmod, mkdir
+from os.path import join, realpath
+from shlex import split
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+from sara.Generator import Generator
+from sara.submodules import wxprot
+from tests.test_elf import make_elf
+
+
+class TestGenerator(TestCase):
+
+    def setUp(self):
+        self.tmp = TemporaryDirectory()
+        self.dir = realpath(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, name, data):
+        path = join(self.dir, name)
+        with open(path, 'wb') as f:
+            f.write(data)
+        return path
+
+    def test_generate(self):
+        for d in ('bin', 'bin/full', 'bin/full/sub', 'bin/mixed'):
+            mkdir(join(self.dir, d))
+        binaries = {'bin/full/a': ({}, 79),
+                    'bin/full/sub/b': ({}, 79),
+                    'bin/mixed/dl': ({'imports': ('dlopen',)}, 15),
+                    'bin/mixed/stack': ({'execstack': True}, 335),
+                    'bin/mixed/ok': ({}, 79),
+                    'bin/mixed/ok2': ({}, 79),
+                    'bin/mixed/jit': ({'needed': ('libv8.so',)}, 0),
+                    'bin/mixed/lib.so': ({'interp': None}, None)}
+        for name, (kwargs, _) in binaries.items():
+            kwargs.setdefault('interp', '/lib/ld.so')
+            chmod(self.write(name, make_elf(**kwargs)), 0o755)
+        g = Generator([join(self.dir, 'bin')], jobs=2, collapse='none')
+        results = g.scan()
+        self.assertEqual(results, {join(self.dir, k): v[1] for k, v in binaries.items() if v[1] is not None})
+        self.assertEqual(g.rules(results), sorted((p, True, f) for p, f in results.items()))
+        g.collapse = 'uniform'
+        self.assertEqual(g.rules(results)[:2], [(join(self.dir, 'bin/full/'), False, 79),
+                                                (join(self.dir, 'bin/mixed/dl'), True, 15)])
+        g.collapse = 'majority'
+        self.assertEqual(g.rules(results), [(join(self.dir, 'bin/full/'), False, 79),
+                                            (join(self.dir, 'bin/mixed/'), False, 79),
+                                            (join(self.dir, 'bin/mixed/dl'), True, 15),
+                                            (join(self.dir, 'bin/mixed/jit'), True, 0),
+                                            (join(self.dir, 'bin/mixed/stack'), True, 335)])
+        c = wxprot.Config(xattr=True,
+                          main_options={'wxprot_emutramp_missing_default': 'MPROTECT'},
+                          extra_files={'emutramp_available': '1'})
+        for line, rule in zip(g.lines(), g.rules(results)):
+            line = split(line)
+            self.assertEqual(line[0], rule[0] + ('' if rule[1] else '*'))
+            self.assertEqual(c.build_xattr_from_single_line(line), rule[2])
@@ -0,0 +1,40 @@
+from random import Random
+from shlex import split
+from unittest import TestCase
+
+from sara.lexer import split_line
+
+
+ALPHABET = ['a', 'b', '/', '*', ',', '.', '-', ' ', ' ', '\t', '\r', '#',
+            '"', "'", '\\', '\x0b', '\x0c', '\x1c', '\x85', '\xa0', '　',
+            '\xe8', '\0', '\n']
+
+
+class TestLexer(TestCase):
+
+    def check(self, line):
+        try:
+            expected = split(line, comments=True)
+        except ValueError:
+            with self.assertRaises(ValueError):
+                split_line(line)
+            return
+        self.assertEqual(split_line(line), expected, repr(line))
+
+    def test_common(self):
+        for line in ('/usr/bin/ls FULL\n',
+                     '/usr/bin/* MPROTECT, EMUTRAMP # comment\n',
+                     '   # only a comment\n',
+                     '\n',
+                     '/usr/bin/foo#bar NONE',
+                     "'/usr/bin/with space' NONE\n",
+                     '/usr/bin/with\\ space NONE\n',
+                     '/a FULL # it\'s a comment\n',
+                     '/a\xa0b FULL\n',
+                     '/a FULL #\n/b NONE\n'):
+            self.check(line)
+
+    def test_differential(self):
+        r = Random(0)
+        for _ in range(20000):
+            self.check(''.join(r.choice(ALPHABET) for _ in range(r.randint(0, 20))))
@@ -0,0 +1,75 @@
+"""
+    saractl - S.A.R.A.'s userspace utilities.
+    Copyright (C) 2017  Salvatore Mesoraca <s.mesoraca16@gmail.com>
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from hashlib import sha1
+from os import listdir, stat
+from os.path import join
+from stat import S_IMODE
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+from sara.Metrics import Exporter, Sample, render
+from sara.SubModLoader import SubModLoader
+
+
+class TestMetrics(TestCase):
+
+    def setUp(self):
+        self.tmp = TemporaryDirectory()
+        self.write('wxprot.conf', '/opt/a FULL\n')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, name, text):
+        with open(join(self.tmp.name, name), 'w') as f:
+            f.write(text)
+
+    def read(self, name):
+        with open(join(self.tmp.name, name)) as f:
+            return f.read()
+
+    def test_render(self):
+        text = render([Sample('a', 1, x='1'), Sample('b', 0), Sample('a', 2, x='q"\\\n')])
+        self.assertEqual(text, '# HELP a a.\n'
+                               '# TYPE a gauge\n'
+                               'a{x="1"} 1\n'
+                               'a{x="q\\"\\\\\\n"} 2\n'
+                               '# HELP b b.\n'
+                               '# TYPE b gauge\n'
+                               'b 0\n')
+
+    def test_export(self):
+        sml = SubModLoader(self.tmp.name, 'emu:' + self.tmp.name)
+        e = Exporter(sml, join(self.tmp.name, 'sara.prom'))
+        e.export()
+        text = self.read('sara.prom')
+        self.assertIn('\nsara_policy_loaded{submodule="wxprot"} 0\n', text)
+        self.assertIn('\nsara_policy_size_bytes{submodule="wxprot"} 0\n', text)
+        self.assertIn('\nsara_wxprot_emutramp_available 1\n', text)
+        self.assertIn('\nsara_exporter_read_errors 0\n', text)
+        self.assertEqual(S_IMODE(stat(join(self.tmp.name, 'sara.prom')).st_mode), 0o644)
+        SubModLoader(self.tmp.name, 'emu:' + self.tmp.name).load_config()
+        e.export()
+        e.export()
+        self.assertEqual(e.stats, {'runs': 3, 'dumps': 2})
+        text = self.read('sara.prom')
+        h = sha1(b'/opt/a FULL\n').hexdigest()
+        self.assertIn('sara_submodule_info{{default="FULL",hash="{}",submodule="wxprot",version="1"}} 1\n'.format(h), text)
+        self.assertIn('\nsara_policy_loaded{submodule="wxprot"} 1\n', text)
+        self.assertNotIn('\nsara_policy_size_bytes{submodule="wxprot"} 0\n', text)
+        self.assertEqual([f for f in listdir(self.tmp.name) if f.startswith('.saractl')], [])
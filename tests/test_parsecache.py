@@ -0,0 +1,58 @@
+from os import chmod, mkdir, utime
+from os.path import join
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+from sara.ParseCache import ParseCache
+
+
+class TestParseCache(TestCase):
+
+    def setUp(self):
+        self.tmp = TemporaryDirectory()
+        self.cache = join(self.tmp.name, 'cache', 'wxprot.parse')
+        mkdir(join(self.tmp.name, 'conf.d'))
+        self.files = [self.write('main.conf', '/usr/bin/* FULL\n# comment\n\n/usr/bin/a NONE\n')]
+        for i in range(20):
+            self.files.append(self.write('conf.d/{:02}.conf'.format(i), "'/opt/{} x' MPROTECT # c\n".format(i)))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, name, text):
+        path = join(self.tmp.name, name)
+        with open(path, 'w') as f:
+            f.write(text)
+        return path
+
+    def parse(self, files=None):
+        pc = ParseCache(self.cache, jobs=4)
+        lines = [(str(l), t) for l, t in pc.parse_files(files or self.files)]
+        return lines, pc.stats
+
+    def test_cache(self):
+        expected, stats = self.parse()
+        self.assertEqual(stats, {'hits': 0, 'misses': 21})
+        self.assertEqual(expected[:3], [(self.files[0] + ':1', ['/usr/bin/*', 'FULL']),
+                                        (self.files[0] + ':4', ['/usr/bin/a', 'NONE']),
+                                        (self.files[1] + ':1', ['/opt/0 x', 'MPROTECT'])])
+        self.assertEqual(len(expected), 22)
+        self.assertEqual(self.parse(), (expected, {'hits': 21, 'misses': 0}))
+        self.write('conf.d/05.conf', "'/opt/5 y' NONE\n")
+        expected[7] = (self.files[6] + ':1', ['/opt/5 y', 'NONE'])
+        self.assertEqual(self.parse(), (expected, {'hits': 20, 'misses': 1}))
+        self.assertEqual(self.parse(self.files[:2]), (expected[:3], {'hits': 2, 'misses': 0}))
+        self.assertEqual(self.parse()[1], {'hits': 2, 'misses': 19})
+        chmod(self.cache, 0o666)
+        self.assertEqual(self.parse()[1], {'hits': 0, 'misses': 21})
+
+    def test_error(self):
+        self.parse()
+        self.write('conf.d/03.conf', "'/opt/3 MPROTECT\n")
+        utime(self.files[4], ns=(0, 0))
+        lines = []
+        with self.assertRaises(ValueError):
+            for l in ParseCache(self.cache).parse_files(self.files):
+                lines.append(l)
+        self.assertEqual(len(lines), 5)
+        self.assertEqual(ParseCache(None).stats, {'hits': 0, 'misses': 0})
@@ -0,0 +1,55 @@
+from os import makedirs, symlink
+from os.path import islink, join, realpath
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+from sara.PathResolver import PathResolver
+
+
+class TestPathResolver(TestCase):
+
+    def setUp(self):
+        self.tmp = TemporaryDirectory()
+        self.root = realpath(self.tmp.name)
+        makedirs(join(self.root, 'usr/lib/x86_64'))
+        makedirs(join(self.root, 'opt/app/bin'))
+        open(join(self.root, 'usr/lib/x86_64/libc.so'), 'w').close()
+        open(join(self.root, 'opt/app/bin/app'), 'w').close()
+        symlink('usr/lib', join(self.root, 'lib'))
+        symlink(join(self.root, 'lib/x86_64'), join(self.root, 'lib64'))
+        symlink('../../lib64/libc.so', join(self.root, 'opt/app/libc.so'))
+        symlink('bin/app', join(self.root, 'opt/app/run'))
+        symlink('loop2', join(self.root, 'loop1'))
+        symlink('loop1', join(self.root, 'loop2'))
+        symlink('missing/file', join(self.root, 'dangling'))
+        self.paths = ['', '/', '//', '/.', '/..', '/../..',
+                      'usr/lib', 'lib', 'lib/', 'lib/.', 'lib/..', 'lib/../lib64',
+                      'lib64', 'lib64/', 'lib64/libc.so', 'lib64/../x86_64/libc.so',
+                      'opt/app/libc.so', 'opt/app/run', 'opt/app/run/',
+                      'opt//app/./bin/../bin/app', 'loop1', 'loop1/x', 'loop2',
+                      'dangling', 'dangling/x', 'nonexistent/a/../b']
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_realpath(self):
+        r = PathResolver()
+        for _ in range(2):
+            for p in self.paths:
+                p = self.root + '/' + p
+                self.assertEqual(realpath(p), r.realpath(p), p)
+        self.assertEqual(realpath('relative/path'), r.realpath('relative/path'))
+
+    def test_islink(self):
+        r = PathResolver()
+        for _ in range(2):
+            for p in self.paths:
+                p = self.root + '/' + p
+                self.assertEqual(islink(p), r.islink(p), p)
+
+    def test_syscalls_saved(self):
+        r = PathResolver()
+        for _ in range(10):
+            r.realpath(join(self.root, 'lib64/libc.so'))
+        self.assertTrue(r.stats['saved'] > r.stats['lstat'])
+        self.assertEqual(r.stats['readlink'], 2)
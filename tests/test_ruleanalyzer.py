@@ -0,0 +1,56 @@
+from os import chmod, mkdir
+from os.path import join, realpath
+from shlex import split
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+from sara.RuleAnalyzer import RuleAnalyzer, MISSING, REDUNDANT, UNREACHED
+from sara.submodules import wxprot
+
+
+class TestRuleAnalyzer(TestCase):
+
+    def setUp(self):
+        self.tmp = TemporaryDirectory()
+        self.dir = realpath(self.tmp.name)
+        for d in ('bin', 'lib'):
+            mkdir(join(self.dir, d))
+        for name in ('bin/a', 'bin/b', 'bin/data', 'lib/x'):
+            path = join(self.dir, name)
+            with open(path, 'w') as f:
+                f.write('#!/bin/sh\n')
+            chmod(path, 0o755 if name in ('bin/a', 'bin/b') else 0o644)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_analyze(self):
+        rules = [('bin/*', 'FULL'),
+                 ('bin/a', 'FULL'),
+                 ('bin/b', 'MPROTECT'),
+                 ('gone', 'MPROTECT'),
+                 ('bin/data', 'MPROTECT'),
+                 ('lib/*', 'MPROTECT'),
+                 ('nothere/*', 'FULL'),
+                 ('bi*', 'MPROTECT')]
+        config_lines = [('test', [join(self.dir, p), f]) for p, f in rules]
+        config_lines.append(('test', ['*', 'NONE']))
+        c = wxprot.Config(config_lines=config_lines,
+                          main_options={'wxprot_emutramp_missing_default': 'MPROTECT'},
+                          extra_files={'emutramp_available': '1'})
+        ra = RuleAnalyzer(c, jobs=2)
+        reasons = ra.analyze()
+        self.assertTrue(ra.complete)
+        self.assertEqual(reasons, {1: REDUNDANT, 3: MISSING, 4: UNREACHED,
+                                   5: UNREACHED, 6: MISSING, 7: UNREACHED})
+        removed = {i for i, r in reasons.items() if r != UNREACHED}
+        s = ra.savings(removed)
+        self.assertEqual(s['rules'], (9, 6))
+        self.assertLess(s['states'][1], s['states'][0])
+        self.assertLess(s['bytes'][1], s['bytes'][0])
+        lines = list(ra.lines(ra.pruned(removed)))
+        self.assertEqual(lines[0], '{}* FULL'.format(join(self.dir, 'bin/')))
+        pruned = wxprot.Config(config_lines=[('pruned', split(l)) for l in lines],
+                               main_options={'wxprot_emutramp_missing_default': 'MPROTECT'},
+                               extra_files={'emutramp_available': '1'})
+        self.assertEqual(len(pruned.dicts), 6)
@@ -0,0 +1,99 @@
+import logging
+from hashlib import sha1
+from os import makedirs
+from os.path import join
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+from sara.SecurityFS import SecurityFS
+from sara.SubModLoader import SubModLoader
+
+
+FILES = {'main/enabled': '1\n',
+         'main/locked': '0\n',
+         'wxprot/enabled': '1\n',
+         'wxprot/hash': '0' * 40 + '\n',
+         'wxprot/version': '1\n',
+         'wxprot/default_flags': '79\n',
+         'wxprot/emutramp_available': '1\n',
+         'wxprot/xattr_enabled': '0\n',
+         'wxprot/xattr_user_allowed': '0\n',
+         'wxprot/.load': '',
+         'wxprot/.dump': 'SARADFAT'}
+
+
+class TestSecurityFS(TestCase):
+
+    def setUp(self):
+        self.tmp = TemporaryDirectory()
+        self.sara = join(self.tmp.name, 'sara')
+        for name, value in FILES.items():
+            makedirs(join(self.sara, name.split('/')[0]), exist_ok=True)
+            with open(join(self.sara, name), 'w') as f:
+                f.write(value)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_snapshot(self):
+        fs = SecurityFS(self.sara)
+        self.assertEqual(fs.get('wxprot/default_flags'), '79')
+        self.assertEqual(fs.stats['reads'], 9)
+        self.assertEqual(fs.get('main/locked'), '0')
+        self.assertIsNone(fs.get('wxprot/missing'))
+        self.assertIsNone(fs.get('wxprot/missing'))
+        self.assertEqual(fs.stats['reads'], 10)
+        self.assertEqual(fs.read('wxprot/.dump'), b'SARADFAT')
+        self.assertEqual(fs.stats['reads'], 11)
+        fs.write('main/enabled', '0\n')
+        self.assertEqual(fs.get('main/enabled'), '0')
+        self.assertEqual(fs.get('main/locked'), '0')
+        self.assertEqual(fs.stats['reads'], 12)
+        fs.write('wxprot/.load', b'binary')
+        fs.get('main/locked')
+        fs.get('wxprot/hash')
+        fs.read('wxprot/.dump')
+        self.assertEqual(fs.stats, {'reads': 14, 'writes': 2})
+        with self.assertRaises(OSError):
+            fs.write('nothere/enabled', '1\n')
+
+    def test_channel(self):
+        fs = SecurityFS(self.sara)
+        with fs.channel('wxprot/.load', 'wxprot/.dump') as c:
+            self.assertEqual(c.ask(b'x'), b'SARADFAT')
+        with open(join(self.sara, 'wxprot/.load'), 'rb') as f:
+            self.assertEqual(f.read(), b'x')
+        self.assertEqual(c.fds, [])
+        with self.assertRaises(OSError):
+            fs.channel('wxprot/.load', 'wxprot/missing')
+
+    def test_loader(self):
+        sml = SubModLoader(self.tmp.name, self.tmp.name)
+        extras = sml.get_extras()
+        self.assertEqual(extras['main'], {'enabled': '1', 'locked': '0'})
+        self.assertEqual(extras['wxprot']['emutramp_available'], '1')
+        self.assertEqual(sml.get_default_values(), {'wxprot': 'FULL'})
+        for _ in range(3):
+            self.assertFalse(sml.is_locked)
+        self.assertEqual(sml.securityfs.stats['reads'], 9)
+        sml.lock()
+        self.assertTrue(sml.is_locked)
+        self.assertEqual(sml.securityfs.stats, {'reads': 10, 'writes': 1})
+
+    def test_lazy_load(self):
+        with open(join(self.tmp.name, 'wxprot.conf'), 'w') as f:
+            f.write('relative FULL\n')
+        sml = SubModLoader(self.tmp.name, self.tmp.name)
+        with self.assertLogs(level='WARNING'):
+            sml.load_config()
+        with open(join(self.sara, 'wxprot/hash'), 'w') as f:
+            f.write(sha1(b'relative FULL\n').hexdigest() + '\n')
+        sml = SubModLoader(self.tmp.name, self.tmp.name)
+        with self.assertLogs(level='WARNING') as logs:
+            self.assertTrue(sml.load_config())
+            logging.warning('sentinel')
+        self.assertEqual(logs.output, ['WARNING:root:sentinel'])
+        with self.assertLogs(level='WARNING'):
+            sml.load_config(force=True)
+        with open(join(self.sara, 'wxprot/.load'), 'rb') as f:
+            self.assertEqual(f.read(), b'')
@@ -0,0 +1,119 @@
+"""
+    saractl - S.A.R.A.'s userspace utilities.
+    Copyright (C) 2017  Salvatore Mesoraca <s.mesoraca16@gmail.com>
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import socket
+from os import makedirs, stat
+from os.path import join, realpath
+from shutil import copyfile
+from stat import S_IMODE
+from tempfile import TemporaryDirectory
+from threading import Thread
+from unittest import TestCase
+from sara.Service import Client, HEADER, Service, ServiceError, decode
+from sara.submodules.wxprot import SARA_WXP_FULL, SARA_WXP_MPROTECT, SARA_WXP_NONE, SARA_WXP_WXORX
+from tests.test_securityfs import FILES
+
+MPROTECT = SARA_WXP_MPROTECT | SARA_WXP_WXORX
+
+
+class TestService(TestCase):
+
+    def setUp(self):
+        self.tmp = TemporaryDirectory()
+        self.dir = realpath(self.tmp.name)
+        self.sara = join(self.dir, 'sara')
+        for name, value in FILES.items():
+            makedirs(join(self.sara, name.split('/')[0]), exist_ok=True)
+            self.write(join('sara', name), value)
+        self.write('wxprot.conf', '/opt/a FULL\n/opt/b/* NONE\n/opt/b/c MPROTECT\n')
+        self.socket = join(self.dir, 'socket')
+        self.service = Service(self.dir, self.dir, self.socket)
+        self.thread = Thread(target=self.service.run)
+        self.thread.start()
+        if not self.service.ready.wait(5):
+            self.tearDown()
+            self.fail('the service didn\'t start')
+
+    def tearDown(self):
+        self.service.stop()
+        self.thread.join()
+        self.tmp.cleanup()
+
+    def write(self, name, text):
+        with open(join(self.dir, name), 'w') as f:
+            f.write(text)
+
+    def test_queries(self):
+        self.assertEqual(S_IMODE(stat(self.socket).st_mode) & 0o077, 0)
+        with Client(self.socket) as c, Client(self.socket) as c2:
+            status = c.status()
+            self.assertEqual(status['extras']['main']['enabled'], '1')
+            self.assertEqual(status['default_values'], {'wxprot': 'FULL'})
+            self.assertEqual(status['errors'], {})
+            paths = ['/opt/a', '/opt/b/x', '/opt/b/c', '/opt/b', '/usr/bin/z']
+            self.assertEqual(c2.match(paths), [[SARA_WXP_FULL, 'FULL'],
+                                               [SARA_WXP_NONE, 'NONE'],
+                                               [MPROTECT, 'MPROTECT, WXORX'],
+                                               [None, None],
+                                               [None, None]])
+            self.assertEqual(c.xattr_decode('wxp', '15'), 'MPROTECT, WXORX')
+            self.assertEqual(c.xattr_encode('wxprot', 'MPROTECT'), MPROTECT)
+            with self.assertRaisesRegex(ServiceError, 'no loaded policy'):
+                c.match(paths, policy='loaded')
+            with self.assertRaisesRegex(ServiceError, 'unknown op'):
+                c.request('nothing')
+            with self.assertRaises(ServiceError):
+                c.request('match', wrong=1)
+            # still usable after an error
+            self.assertEqual(c.match(['/opt/a']), [[SARA_WXP_FULL, 'FULL']])
+
+    def test_reload(self):
+        with Client(self.socket) as c:
+            ret = c.reload(load=True)
+            self.assertTrue(ret['loaded'])
+            with open(join(self.sara, 'wxprot/.load'), 'rb') as f:
+                self.assertTrue(f.read().startswith(b'SARADFAT'))
+            self.assertEqual(c.diff()['identical'], False)
+            # what the kernel would do
+            copyfile(join(self.sara, 'wxprot/.load'), join(self.sara, 'wxprot/.dump'))
+            self.write('sara/wxprot/hash', ret['hashes']['wxprot'] + '\n')
+            self.write('wxprot.conf', '/opt/a NONE\n/opt/b/* NONE\n/opt/b/c MPROTECT\n')
+            self.assertEqual(c.match(['/opt/a']), [[SARA_WXP_FULL, 'FULL']])
+            self.assertFalse(c.reload()['loaded'])
+            self.assertEqual(c.match(['/opt/a']), [[SARA_WXP_NONE, 'NONE']])
+            self.assertEqual(c.match(['/opt/a'], policy='loaded'), [[SARA_WXP_FULL, 'FULL']])
+            diff = c.diff()
+            self.assertFalse(diff['identical'])
+            self.assertEqual(diff['loaded_hash'], ret['hashes']['wxprot'])
+            self.assertEqual(diff['changes'], [['/opt/a', SARA_WXP_NONE, SARA_WXP_FULL]])
+            self.assertEqual(c.diff(paths=['/opt/b/d'])['changes'], [])
+            self.write('wxprot.conf', 'relative NONE\n')
+            self.assertIn('wxprot', c.reload()['errors'])
+            with self.assertRaisesRegex(ServiceError, 'no config policy'):
+                c.match(['/opt/a'])
+        self.assertEqual(self.service.stats['reloads'], 4)
+
+    def test_protocol(self):
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+            s.connect(self.socket)
+            s.sendall(HEADER.pack(3) + b'[1]')
+            data = s.recv(65536)
+            size, = HEADER.unpack(data[:HEADER.size])
+            self.assertEqual(decode(data[HEADER.size:HEADER.size + size]),
+                             {'ok': False, 'error': 'malformed message: not an object'})
+            self.assertEqual(s.recv(65536), b'')
@@ -0,0 +1,137 @@
+"""
+    saractl - S.A.R.A.'s userspace utilities.
+    Copyright (C) 2017  Salvatore Mesoraca <s.mesoraca16@gmail.com>
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from hashlib import sha1
+from os import chmod, listdir, stat, utime
+from os.path import exists, join
+from stat import S_IMODE
+from tempfile import TemporaryDirectory
+from time import time
+from unittest import TestCase
+from sara.ArtifactStore import ArtifactStore, profile_name
+from sara.DFA import DFA, SARA_DFA_VERSION
+from sara.Sara import Sara
+from sara.Tracer import MemorySink, Tracer
+
+PROFILE = {'dfa_version': SARA_DFA_VERSION, 'emutramp_available': 1, 'emutramp_missing_default': 'MPROTECT'}
+
+
+def policy(text):
+    xhash = sha1(text.encode('utf8')).hexdigest()
+    d = DFA()
+    d.build([(text.encode('utf8'), 15, False)])
+    return xhash, d.serialize(bytes.fromhex(xhash))
+
+
+class TestArtifactStore(TestCase):
+
+    def setUp(self):
+        self.tmp = TemporaryDirectory()
+        self.store = ArtifactStore(join(self.tmp.name, 'store'))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_put_get(self):
+        xhash, binary = policy('/a')
+        path = self.store.put('wxprot', xhash, PROFILE, binary)
+        self.assertEqual(path, join(self.tmp.name, 'store', 'wxprot', xhash,
+                                    'dfa_version=2,emutramp_available=1,emutramp_missing_default=MPROTECT'))
+        self.assertEqual(S_IMODE(stat(path).st_mode), 0o644)
+        self.assertEqual(self.store.get('wxprot', xhash, PROFILE), binary)
+        self.assertIsNone(self.store.get('wxprot', xhash, dict(PROFILE, emutramp_available=0)))
+        self.assertEqual(self.store.stats, {'hits': 1, 'misses': 1, 'invalid': 0})
+        self.assertEqual(listdir(join(self.tmp.name, 'store', 'wxprot', xhash)), [profile_name(PROFILE)])
+        self.assertEqual(profile_name({'a': '../b'}), 'a=..%2Fb')
+        self.assertEqual(profile_name({'.a': '%'}), '%2Ea=%25')
+
+    def test_verify(self):
+        xhash, binary = policy('/a')
+        other, _ = policy('/b')
+        self.assertTrue(ArtifactStore.verify(binary, xhash))
+        self.assertFalse(ArtifactStore.verify(binary, other))
+        self.assertFalse(ArtifactStore.verify(binary[:-4], xhash))
+        self.assertFalse(ArtifactStore.verify(binary + b'\0' * 4, xhash))
+        self.assertFalse(ArtifactStore.verify(b'SARADFAT', xhash))
+        with self.assertRaises(ValueError):
+            self.store.put('wxprot', other, PROFILE, binary)
+        path = self.store.put('wxprot', xhash, PROFILE, binary)
+        with open(path, 'wb') as f:
+            f.write(binary[:-4])
+        self.assertIsNone(self.store.get('wxprot', xhash, PROFILE))
+        with open(path, 'wb') as f:
+            f.write(binary)
+        chmod(path, 0o664)
+        with self.assertLogs(level='WARNING') as logs:
+            self.assertIsNone(self.store.get('wxprot', xhash, PROFILE))
+        self.assertIn('"{}" is writable'.format(path), logs.output[0])
+        chmod(path, 0o644)
+        # so are the directories it's in, up to the store itself
+        for d in (join(self.tmp.name, 'store', 'wxprot'), join(self.tmp.name, 'store')):
+            chmod(d, 0o777)
+            with self.assertLogs(level='WARNING') as logs:
+                self.assertIsNone(self.store.get('wxprot', xhash, PROFILE))
+            self.assertIn('"{}" is writable'.format(d), logs.output[0])
+            chmod(d, 0o755)
+        chmod(self.tmp.name, 0o777)
+        self.assertEqual(self.store.get('wxprot', xhash, PROFILE), binary)
+        self.assertEqual(self.store.stats, {'hits': 1, 'misses': 4, 'invalid': 1})
+
+    def test_gc(self):
+        now = time()
+        paths = []
+        for i, text in enumerate(('/a', '/b', '/c', '/d')):
+            xhash, binary = policy(text)
+            paths.append(self.store.put('wxprot', xhash, PROFILE, binary))
+            utime(paths[-1], (now - i * 86400, now - i * 86400))
+        size = stat(paths[0]).st_size
+        tmp = join(self.tmp.name, 'store', 'wxprot', '.saractl1234')
+        open(tmp, 'w').close()
+        self.assertEqual(self.store.gc(max_age=2.5 * 86400, now=now),
+                         {'removed': 1, 'freed': size, 'kept': 3, 'size': 3 * size})
+        self.assertTrue(exists(tmp))
+        utime(tmp, (now - 7200, now - 7200))
+        self.assertEqual(self.store.gc(max_size=2 * size, now=now),
+                         {'removed': 2, 'freed': size, 'kept': 2, 'size': 2 * size})
+        self.assertEqual([exists(p) for p in paths], [True, True, False, False])
+        self.assertFalse(exists(tmp))
+        self.assertEqual(len(listdir(join(self.tmp.name, 'store', 'wxprot'))), 2)
+
+    def test_load(self):
+        tmp = self.tmp.name
+        with open(join(tmp, 'wxprot.conf'), 'w') as f:
+            f.write('/opt/a FULL\n/opt/b/* MPROTECT\n')
+        store = join(tmp, 'store')
+        Sara(tmp, 'emu:' + tmp, store_dir=store).make_bin_config_files(join(tmp, 'output'))
+        xhash = sha1(b'/opt/a FULL\n/opt/b/* MPROTECT\n').hexdigest()
+        self.assertEqual(len(listdir(join(store, 'wxprot', xhash))), 2)
+        sink = MemorySink()
+        s = Sara(tmp, 'emu:' + tmp, tracer=Tracer([sink]), store_dir=store)
+        self.assertTrue(s.load())
+        self.assertEqual([span.attrs['hit'] for span in sink.find('store.get')], [True])
+        self.assertEqual(sink.find('dfa.build'), [])
+        with open(join(tmp, 'sara/wxprot/.dump'), 'rb') as f, \
+             open(join(tmp, 'output/wxprot'), 'rb') as g:
+            self.assertEqual(f.read(), g.read())
+        # a policy that can't be used is compiled again
+        with open(join(store, 'wxprot', xhash, profile_name(PROFILE)), 'wb') as f:
+            f.write(b'SARADFAT')
+        sink.spans.clear()
+        self.assertTrue(s.load(force=True))
+        self.assertEqual([span.attrs['hit'] for span in sink.find('store.get')], [False])
+        self.assertEqual(len(sink.find('dfa.build')), 1)
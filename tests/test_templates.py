@@ -0,0 +1,88 @@
+"""
+    saractl - S.A.R.A.'s userspace utilities.
+    Copyright (C) 2017  Salvatore Mesoraca <s.mesoraca16@gmail.com>
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from os.path import abspath, dirname, join
+from shutil import copyfile, which
+from subprocess import run
+from tempfile import TemporaryDirectory
+from unittest import TestCase, skipIf
+from sara.EmulatedSecurityFS import EmulatedSecurityFS
+from sara.Sara import Sara
+from sara.templates import c_array, split_common
+
+
+class TestTemplates(TestCase):
+
+    def test_c_array(self):
+        self.assertEqual(c_array(b'\x00\xab'), '0x00, 0xAB')
+        self.assertEqual(c_array(bytes(range(9))),
+                         '0x00, 0x01, 0x02, 0x03, 0x04, 0x05, 0x06, 0x07,\n\t\t\t\t0x08')
+
+    def test_split_common(self):
+        self.assertEqual(split_common(b'abcdefg', b'abcdxfg'), (b'abcd', b'efg', b'xfg'))
+        self.assertEqual(split_common(b'abcdefg', b'abcdxfg', 3), (b'abc', b'defg', b'dxfg'))
+        self.assertEqual(split_common(b'abc', b'abc'), (b'abc', b'', b''))
+
+    def make(self, tmp):
+        copyfile(join(dirname(dirname(abspath(__file__))), 'config/main.conf'),
+                 join(tmp, 'main.conf'))
+        with open(join(tmp, 'wxprot.conf'), 'w') as f:
+            f.write('/opt/a FULL\n/opt/b/* MPROTECT,EMUTRAMP_OR_NONE\n')
+        s = Sara(tmp, 'emu:' + tmp)
+        s.make_bin_config_files(join(tmp, 'binary'))
+        EmulatedSecurityFS.create(join(tmp, 'fake/sara'))
+        return s
+
+    # Runs cmd, which writes to the securityfs in tmp/fake, for kernels
+    # with and without trampoline emulation.
+    def check_load(self, tmp, cmd):
+        for available, name in (('1', 'wxprot'), ('0', 'wxprot_noemutramp')):
+            with open(join(tmp, 'fake/sara/wxprot/emutramp_available'), 'w') as f:
+                f.write(available + '\n')
+            open(join(tmp, 'fake/sara/wxprot/.load'), 'w').close()
+            run(cmd, check=True)
+            with open(join(tmp, 'fake/sara/wxprot/.load'), 'rb') as f, \
+                 open(join(tmp, 'binary', name), 'rb') as g:
+                self.assertEqual(f.read(), g.read())
+
+    def test_sh(self):
+        with TemporaryDirectory() as tmp:
+            s = self.make(tmp)
+            s.make_bin_config_sh(join(tmp, 'output.sh'))
+            with open(join(tmp, 'output.sh')) as f:
+                script = f.read().replace('SECFS="{}"'.format(tmp), 'SECFS="{}"'.format(join(tmp, 'fake')))
+            with open(join(tmp, 'output.sh'), 'w') as f:
+                f.write(script)
+            self.check_load(tmp, ['sh', join(tmp, 'output.sh')])
+            with open(join(tmp, 'binary/wxprot'), 'rb') as f, \
+                 open(join(tmp, 'binary/wxprot_noemutramp'), 'rb') as g:
+                self.assertNotEqual(f.read(), g.read())
+
+    @skipIf(which('cc') is None, 'no C compiler')
+    def test_c(self):
+        with TemporaryDirectory() as tmp:
+            s = self.make(tmp)
+            for single_write in (False, True):
+                s.make_bin_config_c(join(tmp, 'output.c'), single_write=single_write)
+                with open(join(tmp, 'output.c')) as f:
+                    source = f.read().replace('#define SECFS "{}"'.format(tmp),
+                                              '#define SECFS "{}"'.format(join(tmp, 'fake')))
+                with open(join(tmp, 'output.c'), 'w') as f:
+                    f.write(source)
+                run(['cc', '-o', join(tmp, 'output'), join(tmp, 'output.c')], check=True)
+                self.check_load(tmp, [join(tmp, 'output')])
@@ -0,0 +1,72 @@
+"""
+    saractl - S.A.R.A.'s userspace utilities.
+    Copyright (C) 2017  Salvatore Mesoraca <s.mesoraca16@gmail.com>
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from contextlib import redirect_stderr
+from io import StringIO
+from os.path import exists, join
+from pstats import Stats
+from tempfile import TemporaryDirectory
+from threading import Thread
+from unittest import TestCase
+from sara.CLI import CLI
+from sara.Timings import Timings
+from sara.Tracer import Tracer
+
+
+class TestTimings(TestCase):
+
+    def test_phases(self):
+        t = Timings()
+        tracer = Tracer([t])
+
+        def f():
+            with tracer.span('f'):
+                pass
+        with tracer.span('a'):
+            with tracer.span('b'):
+                f()
+        threads = [Thread(target=f) for _ in range(4)]
+        for th in threads:
+            th.start()
+        for th in threads:
+            th.join()
+        self.assertEqual({k: v[0] for k, v in t.phases.items()}, {'a': 1, 'b': 1, 'f': 5})
+        self.assertGreaterEqual(t.phases['a'][1], t.phases['b'][1])
+        self.assertEqual(t.report().splitlines()[1].split()[2], 'a')
+        t.reset()
+        self.assertEqual(t.phases, {})
+
+    def test_cli(self):
+        with TemporaryDirectory() as tmp:
+            with open(join(tmp, 'wxprot.conf'), 'w') as f:
+                f.write('/opt/a FULL\n/opt/b/* NONE\n')
+            err = StringIO()
+            with redirect_stderr(err):
+                ret = CLI(['saractl', '-c', tmp, '-S', 'emu:' + tmp, '--cache-dir', '',
+                           '--timings', '--trace-malloc', '--profile', join(tmp, 'prof'),
+                           'load']).run()
+            self.assertEqual(ret, 0)
+            report = err.getvalue()
+            for phase in ('config.read', 'wxprot.rules', 'dfa.simplify', 'dfa.compress',
+                          'securityfs.write', 'total'):
+                self.assertRegex(report, r'\n +[0-9.]+ +[0-9]+  {}\n'.format(phase))
+            self.assertRegex(report, r'securityfs: [1-9][0-9]* syscalls, [1-9][0-9]* bytes read, '
+                                     r'[1-9][0-9]* bytes written')
+            self.assertRegex(report, r'memory: [0-9.]+ KiB peak')
+            self.assertTrue(exists(join(tmp, 'prof')))
+            self.assertTrue(Stats(join(tmp, 'prof')).total_calls > 0)
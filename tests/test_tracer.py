@@ -0,0 +1,106 @@
+"""
+    saractl - S.A.R.A.'s userspace utilities.
+    Copyright (C) 2017  Salvatore Mesoraca <s.mesoraca16@gmail.com>
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import sys
+from io import StringIO
+from json import loads
+from os.path import join, realpath
+from tempfile import TemporaryDirectory
+from threading import Thread
+from unittest import TestCase
+from sara.Sara import Sara
+from sara.Tracer import JSONLinesSink, MemorySink, NOOP, Tracer
+
+
+class TestTracer(TestCase):
+
+    def test_noop(self):
+        tracer = Tracer()
+        self.assertFalse(tracer.enabled)
+        self.assertIs(tracer.span('a', x=1), NOOP)
+        self.assertIsNone(tracer.current())
+        with tracer.span('a') as span:
+            span.set(x=2)
+
+    def test_spans(self):
+        sink = MemorySink()
+        tracer = Tracer([sink])
+        with self.assertRaises(ValueError):
+            with tracer.span('a', x=1) as a:
+                self.assertIs(tracer.current(), a)
+                with tracer.span('b') as b:
+                    b.set(y=2)
+                th = Thread(target=lambda: tracer.span('c', a).__enter__().__exit__(None, None, None))
+                th.start()
+                th.join()
+                raise ValueError()
+        self.assertIsNone(tracer.current())
+        self.assertEqual([s.name for s in sink.spans], ['b', 'c', 'a'])
+        b, c, a = sink.spans
+        self.assertEqual((a.parent, b.parent, c.parent), (None, a.id, a.id))
+        self.assertEqual((a.attrs, b.attrs, a.error, b.error), ({'x': 1}, {'y': 2}, 'ValueError', None))
+        self.assertNotEqual(a.thread, c.thread)
+        self.assertGreaterEqual(a.duration, b.duration)
+
+    def test_jsonl(self):
+        fd = StringIO()
+        tracer = Tracer([JSONLinesSink(fd)])
+        with tracer.span('a', path=b'/x'):
+            with tracer.span('b'):
+                pass
+        b, a = [loads(line) for line in fd.getvalue().splitlines()]
+        self.assertEqual((a['name'], a['attrs'], a['parent']), ('a', {'path': "b'/x'"}, None))
+        self.assertEqual((b['name'], b['parent']), ('b', a['id']))
+        self.assertEqual(set(a), {'name', 'id', 'parent', 'thread', 'start', 'duration', 'attrs'})
+
+    def test_pipeline(self):
+        exe = realpath(sys.executable)
+        with TemporaryDirectory() as tmp:
+            with open(join(tmp, 'wxprot.conf'), 'w') as f:
+                f.write('{} NONE\n/opt/b/* MPROTECT\n'.format(exe))
+            sink = MemorySink()
+            s = Sara(tmp, 'emu:' + tmp, tracer=Tracer([sink]))
+            self.assertTrue(s.load(force=True))
+            self.assertTrue(s.load(force=True))
+        spans = {}
+        for span in sink.spans:
+            spans.setdefault(span.name, []).append(span)
+        ids = {span.id: span for span in sink.spans}
+
+        def parent(span):
+            return ids[span.parent].name
+
+        self.assertEqual(len(spans['sara.load']), 2)
+        self.assertEqual(parent(spans['loader.load_config'][0]), 'sara.load')
+        self.assertEqual(spans['config.read'][0].attrs['cache'], 'miss')
+        self.assertEqual([r.attrs['rule'] for r in spans['wxprot.rule'][:2]], [exe, '/opt/b/*'])
+        self.assertEqual(spans['wxprot.rule'][1].attrs['flags'], 15)
+        self.assertEqual([parent(r) for r in spans['wxprot.rule']], ['wxprot.rules'] * 4)
+        elf = spans['wxprot.elf']
+        self.assertEqual([e.attrs['path'] for e in elf], [exe, exe])
+        self.assertEqual(elf[1].attrs['cache'], 'hit')
+        self.assertEqual(parent(elf[0]), 'wxprot.rule')
+        self.assertEqual(spans['dfa.simplify'][0].attrs['states'], spans['dfa.add_strings'][0].attrs['states'])
+        self.assertGreater(spans['dfa.compress'][0].attrs['states'], 0)
+        self.assertEqual(parent(spans['dfa.build'][0]), 'wxprot.build_binary')
+        self.assertEqual(parent(spans['wxprot.build_binary'][0]), 'config.compile')
+        load = [w for w in spans['securityfs.write'] if w.attrs['file'] == 'wxprot/.load']
+        self.assertEqual(len(load), 2)
+        self.assertEqual(load[0].attrs['bytes'], spans['dfa.serialize'][0].attrs['bytes'])
+        self.assertEqual(parent(load[0]), 'loader.submodule')
+        self.assertTrue(spans['loader.submodule'][0].attrs['loaded'])
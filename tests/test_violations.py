@@ -0,0 +1,54 @@
+from os.path import dirname, join
+from unittest import TestCase
+
+from sara.Violations import SpaceSaving, ViolationAggregator, messages, suggest_flags
+from sara.submodules import wxprot
+
+
+FIXTURES = join(dirname(__file__), 'fixtures')
+
+
+class TestViolations(TestCase):
+
+    def aggregate(self, name, fmt='auto', capacity=1024):
+        return ViolationAggregator(capacity).feed(messages(join(FIXTURES, name), fmt))
+
+    def test_formats(self):
+        for name, offset in (('violations.log', 0),
+                             ('violations.kmsg', 0),
+                             ('violations.export', 1000000000)):
+            a = self.aggregate(name)
+            self.assertEqual(a.total, 5)
+            self.assertEqual(a.suppressed, 7)
+            self.assertEqual(a.first, offset + 101)
+            self.assertEqual(a.duration, 60)
+            self.assertEqual(a.peak, 4)
+            self.assertAlmostEqual(a.rate(), 5 / 60)
+            self.assertEqual(a.top(2), [(('/usr/bin/node', 'wxorx'), 2, 0),
+                                        (('/opt/app/bin/app', 'other'), 1, 0)])
+        a = self.aggregate('violations.kmsg', fmt='plain')
+        self.assertEqual(a.total, 5)
+        self.assertIsNone(a.duration)
+
+    def test_suggestions(self):
+        a = self.aggregate('violations.log')
+        s = a.suggestions(10)
+        self.assertEqual(s, [('/opt/app/bin/app', 79, 11),
+                             ('/usr/bin/legacy tool', 79, 77),
+                             ('/usr/bin/node', 79, 0)])
+        for _, _, flags in s:
+            self.assertTrue(wxprot.Config.are_flags_valid(flags))
+        s = a.suggestions(10, current={'/usr/bin/node': 0}.get)
+        self.assertEqual([p for p, _, _ in s], ['/opt/app/bin/app', '/usr/bin/legacy tool'])
+        self.assertEqual(suggest_flags(79 | wxprot.SARA_WXP_EMUTRAMP | wxprot.SARA_WXP_VERBOSE, ['stack']),
+                         77 | wxprot.SARA_WXP_VERBOSE)
+        self.assertEqual(suggest_flags(wxprot.SARA_WXP_MMAP | wxprot.SARA_WXP_OTHER | wxprot.SARA_WXP_WXORX |
+                                       wxprot.SARA_WXP_COMPLAIN, ['wxorx']), 0)
+
+    def test_space_saving(self):
+        s = SpaceSaving(2)
+        for k in 'aababcccc':
+            s.add(k)
+        self.assertEqual(len(s.counters), 2)
+        self.assertEqual(s.top(1), [('c', 6, 2)])
+        self.assertEqual(s.top(2)[1], ('a', 3, 0))
@@ -0,0 +1,154 @@
+"""
+    saractl - S.A.R.A.'s userspace utilities.
+    Copyright (C) 2017  Salvatore Mesoraca <s.mesoraca16@gmail.com>
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import asyncio
+from hashlib import sha1
+from os import makedirs, symlink, unlink
+from os.path import join, realpath
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+from sara.SubModLoader import SubModLoader
+from sara.Watcher import BINARY, CONFIG, Watcher
+from tests.test_securityfs import FILES
+
+
+class TestWatcher(TestCase):
+
+    def setUp(self):
+        self.tmp = TemporaryDirectory()
+        self.dir = realpath(self.tmp.name)
+        self.sara = join(self.dir, 'sara')
+        for name, value in FILES.items():
+            makedirs(join(self.sara, name.split('/')[0]), exist_ok=True)
+            self.write(join('sara', name), value)
+        makedirs(join(self.dir, 'bin'))
+        self.prog = self.write('bin/prog', 'prog\n')
+        self.write('bin/other', 'other\n')
+        self.rules = [[self.prog, 'FULL']]
+        self.write('wxprot.conf', '{} FULL\n'.format(self.prog))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, name, text):
+        path = join(self.dir, name)
+        with open(path, 'w') as f:
+            f.write(text)
+        return path
+
+    def kernel(self):
+        # what the kernel would do after a successful .load
+        with open(join(self.sara, 'wxprot/.load'), 'rb') as f:
+            binary = f.read()
+        with open(join(self.sara, 'wxprot/.dump'), 'wb') as f:
+            f.write(binary)
+        open(join(self.sara, 'wxprot/.load'), 'w').close()
+        h = sha1()
+        for line in self.rules:
+            h.update((' '.join(line) + '\n').encode('utf8'))
+        self.write('sara/wxprot/hash', h.hexdigest() + '\n')
+        return binary
+
+    def loaded(self):
+        with open(join(self.sara, 'wxprot/.load'), 'rb') as f:
+            return f.read()
+
+    async def until(self, w, reloads):
+        for _ in range(500):
+            if w.stats['reloads'] >= reloads:
+                return
+            await asyncio.sleep(0.01)
+        self.fail('no reload')
+
+    async def scenario(self, w):
+        task = asyncio.ensure_future(w.main())
+        await self.until(w, 1)
+        self.assertTrue(self.kernel().startswith(b'SARADFAT'))
+        # a burst of changes is a single reload
+        makedirs(join(self.dir, 'wxprot.conf.d'))
+        for i in range(20):
+            rule = ['{}/opt/{}'.format(self.dir, i), 'MPROTECT']
+            self.rules.append(rule)
+            self.write('wxprot.conf.d/{:02}.conf'.format(i), ' '.join(rule) + '\n')
+        await self.until(w, 2)
+        await asyncio.sleep(w.debounce * 3)
+        self.assertEqual(w.stats['reloads'], 2)
+        self.assertTrue(self.kernel().startswith(b'SARADFAT'))
+        # same text, nothing to write
+        self.write('wxprot.conf', '{}  FULL\n'.format(self.prog))
+        await self.until(w, 3)
+        self.assertEqual(self.loaded(), b'')
+        # ignored files
+        self.write('wxprot.conf.d/00.conf.swp', 'x')
+        self.write('bin/unrelated', 'x')
+        await asyncio.sleep(w.debounce * 3)
+        self.assertEqual(w.stats['reloads'], 3)
+        # the binary changed, but the policy didn't
+        self.write('bin/prog', 'new prog\n')
+        await self.until(w, 4)
+        self.assertEqual(self.loaded(), b'')
+        # the rule now resolves to another file
+        unlink(self.prog)
+        symlink('other', self.prog)
+        with self.assertLogs(level='WARNING'):
+            await self.until(w, 5)
+        self.assertTrue(self.loaded().startswith(b'SARADFAT'))
+        w.stop()
+        self.assertEqual(await task, 0)
+
+    def run_scenario(self, poll):
+        w = Watcher(SubModLoader(self.dir, self.dir),
+                    debounce=0.1, max_delay=5, poll=poll, interval=0.02)
+        asyncio.run(self.scenario(w))
+
+    def test_inotify(self):
+        self.run_scenario(False)
+
+    def test_poll(self):
+        self.run_scenario(True)
+
+    async def broken_scenario(self, w):
+        task = asyncio.ensure_future(w.main())
+        with self.assertLogs(level='ERROR'):
+            await self.until(w, 1)
+        self.assertFalse(task.done())
+        self.write('wxprot.conf', '{} FULL\n'.format(self.prog))
+        await self.until(w, 2)
+        self.assertTrue(self.loaded().startswith(b'SARADFAT'))
+        w.stop()
+        self.assertEqual(await task, 0)
+
+    def test_broken_config(self):
+        self.write('wxprot.conf', '"{} FULL\n'.format(self.prog))
+        w = Watcher(SubModLoader(self.dir, self.dir), debounce=0.1, max_delay=5)
+        asyncio.run(self.broken_scenario(w))
+
+    def test_classify(self):
+        w = Watcher(SubModLoader(self.dir, self.dir))
+        dirs = w.watch_set()
+        self.assertEqual(dirs, {self.dir: None})
+        w.loader.load_config()
+        dirs = w.watch_set()
+        self.assertEqual(dirs, {self.dir: None, join(self.dir, 'bin'): {'prog'}})
+        self.assertEqual(w.classify(self.dir, 'main.conf'), CONFIG)
+        self.assertEqual(w.classify(self.dir, 'wxprot.conf.d'), CONFIG)
+        self.assertEqual(w.classify(self.dir, 'wxprot.conf~'), 0)
+        self.assertEqual(w.classify(join(self.dir, 'bin'), 'prog'), BINARY)
+        self.assertEqual(w.classify(join(self.dir, 'bin'), 'other'), 0)
+        self.assertEqual(w.classify(join(self.dir, 'bin'), None), BINARY)
+        self.assertEqual(w.classify(None, None), CONFIG | BINARY)
@@ -5,6 +5,7 @@ from unittest import TestCase
 import logging
 
 from sara.submodules import wxprot
+from sara.submodules.RuleStore import RuleStore
 
 
 OK_FLAGS = {0: {'NONE'},
@@ -430,3 +431,76 @@ class TestWXProt(TestCase):
             #self.assertTrue(e[0] == c.config_lines[i][0])
             #self.assertTrue(e[1][0] == c.config_lines[i][1][0])
             #self.assertTrue(e[1][1] == c.config_lines[i][1][1])
+
+    def test_parallel_parse_is_deterministic(self):
+        config_lines = []
+        for i in range(40):
+            config_lines.append(('location{}'.format(i), ['/file{}'.format(i % 30), 'mprotect']))
+            config_lines.append(('location{}'.format(i), ['/dir{}/*'.format(i % 25), 'full']))
+        results = []
+        for jobs, pool in ((1, 'thread'), (8, 'thread'), (2, 'process')):
+            with self.assertLogs(level='WARNING') as cm:
+                c = wxprot.Config(config_lines=config_lines,
+                                  main_options={'wxprot_emutramp_missing_default': 'MPROTECT',
+                                                'wxprot_parse_jobs': jobs,
+                                                'wxprot_parse_pool': pool},
+                                  extra_files={'emutramp_available': '1'})
+            results.append((c.dicts, c.binary, cm.output))
+        self.assertEqual(len(results[0][0]), 55)
+        for r in results[1:]:
+            self.assertEqual(results[0], r)
+
+    def test_parallel_parse_first_error_wins(self):
+        config_lines = [('location{}'.format(i), ['/file{}'.format(i), 'mprotect']) for i in range(100)]
+        config_lines[40] = ('bad1', ['file', 'mprotect'])
+        config_lines[70] = ('bad2', ['/file', 'invalid'])
+        for jobs in (1, 4):
+            with self.assertRaises(wxprot.WXPConfigException) as cm:
+                wxprot.Config(config_lines=config_lines,
+                              main_options={'wxprot_emutramp_missing_default': 'MPROTECT',
+                                            'wxprot_parse_jobs': jobs},
+                              extra_files={'emutramp_available': '1'})
+            self.assertEqual(cm.exception.location, 'bad1')
+
+    def test_streamed_config_lines(self):
+        config_lines = [('location', ['/file', 'mprotect']),
+                        ('location', ['/file2/*', 'mprotect']),
+                        ('location', ['/file2/', 'wxorx']),
+                        ('location', ['/file', 'full'])]
+        with self.assertLogs(level='WARNING') as cm1:
+            c1 = wxprot.Config(config_lines=config_lines,
+                               main_options={'wxprot_emutramp_missing_default': 'MPROTECT'},
+                               extra_files={'emutramp_available': '1'})
+        with self.assertLogs(level='WARNING') as cm2:
+            c2 = wxprot.Config(config_lines=iter(config_lines),
+                               main_options={'wxprot_emutramp_missing_default': 'MPROTECT'},
+                               extra_files={'emutramp_available': '1'})
+        self.assertEqual(cm1.output, cm2.output)
+        self.assertEqual(c1.dicts, c2.dicts)
+        self.assertEqual(c1.xhash, c2.xhash)
+        self.assertEqual(c1.binary, c2.binary)
+        self.assertEqual(c1.config, c2.config)
+        # the hash can be read before the lines are compiled
+        c3 = wxprot.Config(config_lines=iter(config_lines),
+                           main_options={'wxprot_emutramp_missing_default': 'MPROTECT'},
+                           extra_files={'emutramp_available': '1'},
+                           lazy=True)
+        self.assertEqual(c3.xhash, c1.xhash)
+        with self.assertLogs(level='WARNING'):
+            self.assertEqual(c3.binary, c1.binary)
+
+    def test_rule_store(self):
+        rules = [('/usr/bin/ls', True, 15), ('/usr/bin/', False, 79),
+                 ('/usr/bin/', True, 8), ('/', False, 0), ('', False, 0),
+                 ('/ls', True, 512)]
+        s = RuleStore()
+        for r in rules:
+            self.assertTrue(s.add(*r))
+        self.assertFalse(s.add('/usr/bin/ls', True, 79))
+        self.assertTrue(s.add('/usr/bin/ls', False, 79))
+        s.seal()
+        self.assertEqual(len(s), len(rules) + 1)
+        for i, r in enumerate(rules):
+            self.assertEqual((s[i].path, s[i].exact, s[i].flags), r)
+            self.assertEqual(s[i], {'path': r[0], 'exact': r[1], 'flags': r[2]})
+        self.assertEqual(list(s.iter_tuples())[-1], ('/usr/bin/ls', 79, False))